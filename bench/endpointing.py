@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+录音端点检测离线基准
+
+对一个目录下标注好的 WAV 录音，按录音循环的节奏（每帧 512 个采样）
+依次送进各个端点检测引擎，统计：
+- 端点延迟：判定说完的时刻 - 标注的说话结束时刻
+- 截断率：在标注的说话结束之前就判定说完的比例（用户话没说完就被打断）
+- 漏检率：录音结束（含追加的静音）仍未判定说完的比例
+- 每秒音频的 VAD 计算耗时
+Silero 额外对比逐路推理和把多条录音放在 batch 维度一起推理的耗时。
+
+标注文件为目录下的 labels.csv，每行：文件名,说话结束时刻（毫秒）
+    001.wav,2350
+    002.wav,1870
+录音需为 16kHz 单声道（其他格式会先转换），末尾会追加 --tail-ms 毫秒静音。
+
+用法：
+    python bench/endpointing.py <目录> [--engines snowboy,webrtc,silero]
+        [--hangover-ms 600] [--tail-ms 3000] [--batch 16]
+"""
+import argparse
+import csv
+import os
+import statistics
+import sys
+import time
+import wave
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot import VAD
+from robot.AudioEngine import Resampler
+
+FRAME_SAMPLES = 512
+FRAME_BYTES = FRAME_SAMPLES * VAD.SAMPLE_WIDTH
+
+
+def load(directory, tail_ms):
+    samples = []
+    with open(os.path.join(directory, "labels.csv"), encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            with wave.open(os.path.join(directory, row[0]), "rb") as w:
+                pcm = Resampler(
+                    w.getframerate(), w.getnchannels(), w.getsampwidth(), VAD.SAMPLE_RATE, 1
+                ).process(w.readframes(w.getnframes()))
+            pcm += b"\0" * (VAD.SAMPLE_RATE * VAD.SAMPLE_WIDTH * tail_ms // 1000)
+            pcm = pcm[: len(pcm) - len(pcm) % FRAME_BYTES]
+            samples.append((row[0], pcm, float(row[1])))
+    return samples
+
+
+def snowboy_status(pcm):
+    """用 snowboy 的静音判断给每一帧打上 RunDetection 的返回值"""
+    from snowboy import snowboydecoder, snowboydetect
+    from robot import config, constants
+
+    detector = snowboydetect.SnowboyDetect(
+        resource_filename=snowboydecoder.RESOURCE_FILE.encode(),
+        model_str=constants.getHotwordModel(config.get("hotword", "wukong.pmdl")).encode(),
+    )
+    return [
+        detector.RunDetection(pcm[i : i + FRAME_BYTES]) for i in range(0, len(pcm), FRAME_BYTES)
+    ]
+
+
+class ReplayVAD(VAD.AbstractVAD):
+    """回放预先算好的逐帧判断结果"""
+
+    def __init__(self, decisions):
+        self.decisions = decisions
+        self.index = 0
+
+    def reset(self):
+        self.index = 0
+
+    def is_speech(self, data, status=None):
+        speech = self.decisions[self.index]
+        self.index += 1
+        return speech
+
+
+def silero_decisions(model, samples, batch, threshold):
+    """
+    把多条录音放在 batch 维度一起推理
+
+    :returns: (每条录音的逐帧判断, 推理耗时)
+    """
+    decisions = []
+    elapsed = 0
+    for start in range(0, len(samples), batch):
+        group = samples[start : start + batch]
+        frames = max(len(pcm) // FRAME_BYTES for _, pcm, _ in group)
+        audio = np.zeros((len(group), frames * FRAME_SAMPLES), dtype=np.float32)
+        for row, (_, pcm, _) in enumerate(group):
+            data = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768
+            audio[row, : len(data)] = data
+        state = model.initial_state(len(group))
+        probs = np.zeros((len(group), frames), dtype=np.float32)
+        t = time.process_time()
+        for i in range(frames):
+            probs[:, i], state = model.run(
+                audio[:, i * FRAME_SAMPLES : (i + 1) * FRAME_SAMPLES], state
+            )
+        elapsed += time.process_time() - t
+        for row, (_, pcm, _) in enumerate(group):
+            decisions.append(list(probs[row, : len(pcm) // FRAME_BYTES] > threshold))
+    return decisions, elapsed
+
+
+def endpoint(endpointer, pcm, statuses=None):
+    """
+    :returns: 判定说完的时刻（毫秒），未判定返回 None
+    """
+    endpointer.reset(len(pcm) * 1000 / (VAD.SAMPLE_RATE * VAD.SAMPLE_WIDTH))
+    for n, i in enumerate(range(0, len(pcm), FRAME_BYTES)):
+        status = statuses[n] if statuses else None
+        if endpointer.process(pcm[i : i + FRAME_BYTES], status):
+            return (n + 1) * FRAME_SAMPLES * 1000 / VAD.SAMPLE_RATE
+    return None
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def report(name, samples, endpoints, cpu):
+    audio_s = sum(len(pcm) for _, pcm, _ in samples) / (VAD.SAMPLE_RATE * VAD.SAMPLE_WIDTH)
+    latencies = [e - label for (_, _, label), e in zip(samples, endpoints) if e is not None]
+    truncated = sum(1 for lat in latencies if lat < 0)
+    missed = sum(1 for e in endpoints if e is None)
+    late = [lat for lat in latencies if lat >= 0] or [float("nan")]
+    print(
+        f"{name:>14s}: 延迟 p50 {percentile(late, 50):7.1f} ms, p90 {percentile(late, 90):7.1f} ms, "
+        f"平均 {statistics.mean(late):7.1f} ms, 截断率 {truncated / len(samples):6.1%}, "
+        f"漏检率 {missed / len(samples):6.1%}, VAD 耗时 {cpu / audio_s * 1000:6.2f} ms/音频秒"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录音端点检测离线基准")
+    parser.add_argument("directory", help="包含 WAV 和 labels.csv 的目录")
+    parser.add_argument("--engines", default="snowboy,webrtc,silero", help="要对比的引擎")
+    parser.add_argument("--hangover-ms", type=float, default=600, help="说完后的静音时长")
+    parser.add_argument("--min-speech-ms", type=float, default=90, help="判定开口的最短语音")
+    parser.add_argument("--tail-ms", type=int, default=3000, help="每条录音末尾追加的静音")
+    parser.add_argument("--webrtc-level", type=int, default=2, help="WebRTC VAD 激进程度")
+    parser.add_argument("--silero-threshold", type=float, default=0.5, help="Silero 语音概率阈值")
+    parser.add_argument("--batch", type=int, default=16, help="Silero batch 推理的录音条数")
+    opts = parser.parse_args()
+
+    samples = load(opts.directory, opts.tail_ms)
+    print(f"录音 {len(samples)} 条，hangover={opts.hangover_ms:.0f}ms")
+
+    def make(vad):
+        return VAD.Endpointer(vad, opts.hangover_ms, opts.min_speech_ms)
+
+    for engine in opts.engines.split(","):
+        try:
+            if engine == "snowboy":
+                statuses = [snowboy_status(pcm) for _, pcm, _ in samples]
+                endpointer = make(VAD.SnowboyVAD())
+                t = time.process_time()
+                endpoints = [
+                    endpoint(endpointer, pcm, s) for (_, pcm, _), s in zip(samples, statuses)
+                ]
+                report(engine, samples, endpoints, time.process_time() - t)
+            elif engine == "webrtc":
+                endpointer = make(VAD.WebRTCVAD(opts.webrtc_level))
+                t = time.process_time()
+                endpoints = [endpoint(endpointer, pcm) for _, pcm, _ in samples]
+                report(engine, samples, endpoints, time.process_time() - t)
+            elif engine == "silero":
+                model = VAD.SileroModel(VAD.constants.getData("silero_vad.onnx"))
+                endpointer = make(VAD.SileroVAD(model, opts.silero_threshold))
+                t = time.process_time()
+                endpoints = [endpoint(endpointer, pcm) for _, pcm, _ in samples]
+                report(engine, samples, endpoints, time.process_time() - t)
+                decisions, cpu = silero_decisions(
+                    model, samples, opts.batch, opts.silero_threshold
+                )
+                endpoints = [
+                    endpoint(make(ReplayVAD(d)), pcm) for (_, pcm, _), d in zip(samples, decisions)
+                ]
+                report(f"silero batch{opts.batch}", samples, endpoints, cpu)
+            else:
+                print(f"{engine:>14s}: 未知的引擎")
+        except Exception as e:
+            print(f"{engine:>14s}: 不可用（{e}）")
+
+
+if __name__ == "__main__":
+    main()
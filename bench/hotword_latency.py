@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+唤醒词检测延迟基准
+
+模拟 snowboy 的采集和检测链路：采集线程按麦克风节奏把 PCM 写入
+AudioCapture（和 PortAudio 回调一样，每块音频在最后一个采样录完时才送达），
+检测循环把数据交给一个假的 RunDetection，音频流里随机位置埋有唤醒词，
+处理到唤醒词结尾的采样时返回命中。统计从唤醒词说完到 detected_callback
+被调用的延迟分布，以及检测循环每秒被唤醒的次数：
+- 轮询：2048 帧回调，取出全部数据，为空时 sleep 30ms（改造前）
+- 阻塞：512 帧回调，订阅者的 read() 阻塞到一帧数据就绪（改造后，超时 100ms）
+
+用法：
+    python bench/hotword_latency.py [--seconds 30] [--hotwords 60]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot import AudioCapture
+from snowboy.snowboydecoder import COUNT_FRAMES, FRAMES_PER_BUFFER
+
+RATE = 16000
+WIDTH = 2
+
+
+class FakeDetector(object):
+    """按已处理的采样数判断是否命中唤醒词"""
+
+    def __init__(self, hotwords):
+        self.hotwords = list(hotwords)  # 唤醒词结尾的采样位置，升序
+        self.position = 0
+
+    def RunDetection(self, data):
+        self.position += len(data) // WIDTH
+        if self.hotwords and self.position >= self.hotwords[0]:
+            while self.hotwords and self.position >= self.hotwords[0]:
+                self.hotwords.pop(0)
+            return 1
+        return -2
+
+
+def capture(mic, frames, total_frames, start, stop):
+    chunk = b"\0" * (frames * WIDTH)
+    sent = 0
+    while sent < total_frames and not stop.is_set():
+        sent += frames
+        # 一块音频要等最后一个采样录完才会送达
+        time.sleep(max(0, start + sent / RATE - time.perf_counter()))
+        mic.write(chunk)
+    stop.set()
+
+
+def run(mode, seconds, hotwords):
+    total_frames = int(seconds * RATE)
+    # 唤醒词之间至少间隔 0.3 秒
+    positions = sorted(random.sample(range(RATE, total_frames - RATE, RATE * 3 // 10), hotwords))
+    detector = FakeDetector(positions)
+    mic = AudioCapture.AudioCapture(buffer_seconds=5)
+    buf = mic.subscribe()
+    stop = threading.Event()
+    frames = COUNT_FRAMES if mode == "poll" else FRAMES_PER_BUFFER
+    frame_bytes = FRAMES_PER_BUFFER * WIDTH
+    start = time.perf_counter()
+    latencies = []
+    wakeups = 0
+    threading.Thread(
+        target=capture, args=(mic, frames, total_frames, start, stop), daemon=True
+    ).start()
+    while not stop.is_set() or len(buf):
+        wakeups += 1
+        if mode == "poll":
+            data = buf.read(len(buf), timeout=0) if len(buf) else b""
+            if len(data) == 0:
+                time.sleep(0.03)
+                continue
+        else:
+            data = buf.read(frame_bytes, timeout=0.1)
+            if len(data) == 0:
+                continue
+        pending = detector.hotwords[0] if detector.hotwords else None
+        if detector.RunDetection(data) > 0:
+            # detected_callback 被调用的时刻
+            latencies.append((time.perf_counter() - start - pending / RATE) * 1000)
+    return latencies, wakeups / seconds
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="唤醒词检测延迟基准")
+    parser.add_argument("--seconds", type=float, default=30, help="模拟的音频时长")
+    parser.add_argument("--hotwords", type=int, default=60, help="埋入的唤醒词个数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    opts = parser.parse_args()
+
+    print(f"audio={opts.seconds:.0f}s hotwords={opts.hotwords} rate={RATE}")
+    for name, mode in [("轮询", "poll"), ("阻塞", "block")]:
+        random.seed(opts.seed)
+        latencies, wakeups = run(mode, opts.seconds, opts.hotwords)
+        print(
+            f"{name}: 命中 {len(latencies)}, p50 {percentile(latencies, 50):6.1f} ms, "
+            f"p90 {percentile(latencies, 90):6.1f} ms, p99 {percentile(latencies, 99):6.1f} ms, "
+            f"max {max(latencies):6.1f} ms, 循环唤醒 {wakeups:5.1f} 次/秒"
+        )
+
+
+if __name__ == "__main__":
+    main()
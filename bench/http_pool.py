@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 连接池基准
+
+在本机启动一个模拟 GPT-SoVITS /tts 接口的 HTTP/1.1 服务，按句子逐条请求，
+分别测量每次新建连接（模块级 requests.post）和使用 HttpClient 共享连接池时
+每句的合成延迟，并统计服务端接受的 TCP 连接数。
+
+用法：
+    python bench/http_pool.py [--sentences 50] [--parallel 5] [--delay-ms 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot.sdk import HttpClient
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay_ms, size):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.delay = delay_ms / 1000
+        self.body = b"\0" * size
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Content-Length", str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(server, post, sentences, parallel):
+    url = f"http://127.0.0.1:{server.server_port}/tts"
+    payload = {"text": "今天天气不错，适合出去走走", "text_lang": "zh", "prompt_lang": "ja"}
+    server.connections = 0
+
+    def synth(_):
+        start = time.perf_counter()
+        r = post(url, json=payload, timeout=10)
+        r.raise_for_status()
+        r.content
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        latencies = list(pool.map(synth, range(sentences)))
+    return latencies, server.connections
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 连接池基准")
+    parser.add_argument("--sentences", type=int, default=50, help="请求的句子数")
+    parser.add_argument("--parallel", type=int, default=5, help="并行合成数（tts_parallel）")
+    parser.add_argument("--delay-ms", type=float, default=20, help="模拟服务端合成耗时")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="每句返回的音频字节数")
+    opts = parser.parse_args()
+
+    server = StubServer(opts.delay_ms, opts.size)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    session = HttpClient.build_session(dict(HttpClient.DEFAULT_OPTIONS, pool_maxsize=opts.parallel))
+    print(
+        f"sentences={opts.sentences} parallel={opts.parallel} "
+        f"delay={opts.delay_ms:.0f}ms size={opts.size}B"
+    )
+    for name, post in [("requests.post", requests.post), ("pooled", session.post)]:
+        latencies, connections = run(server, post, opts.sentences, opts.parallel)
+        print(
+            f"{name:>14s}: 平均 {statistics.mean(latencies):7.2f} ms/句, "
+            f"p50 {percentile(latencies, 50):7.2f} ms, p95 {percentile(latencies, 95):7.2f} ms, "
+            f"TCP 连接 {connections}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
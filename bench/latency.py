@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+对话链路延迟基准
+
+用本地桩引擎（见 stubs.py）代替 ASR、NLU、对话机器人和 TTS，音频写进
+虚拟的输出引擎，直接调用 Conversation.doResponse（文字指令）和
+Conversation.doConverse（语音指令）。按“输入方式 × 机器人是否流式 ×
+TTS 是否流式”组合成多个场景，每个场景重复若干次，统计：
+- ttfa_ms：从会话开始到第一段语音开始播放（time to first audio）
+- total_ms：从会话开始到回复播放完成
+- cpu_ms：每次对话消耗的进程 CPU 时间（包含后台的合成和播放线程）
+- peak_rss_mb：每次对话结束时进程的内存峰值
+的 p50/p95/p99，以及 LatencyMonitor 记录的各阶段延迟。结果保存为 JSON，
+用 --compare 指定另一次的结果即可对比两个版本。
+
+--speed 只加快虚拟播放的时间线，桩引擎的延迟不变；total_ms 中播放
+所占的部分会按倍数缩短。
+
+用法：
+    python wukong.py bench [--repeat 10] [--speed 10] [--output 结果.json]
+    python bench/latency.py [--repeat 10] [--scenarios text/robot/tts,voice/robot-stream/tts]
+        [--asr-latency 0.3] [--nlu-latency 0.05] [--robot-latency 0.5]
+        [--token-latency 0.03] [--tts-latency 0.2] [--compare 上次的结果.json]
+"""
+import argparse
+import json
+import os
+import platform
+import struct
+import sys
+import tempfile
+import time
+import uuid
+import wave
+
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 添加项目路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from robot import AudioEngine, config, constants, logging, utils
+from robot.LatencyMonitor import get_monitor, summarize
+from robot.TTSCache import TTSCache
+
+import stubs
+
+logger = logging.getLogger(__name__)
+
+INPUTS = ("text", "voice")
+METRICS = ("ttfa_ms", "total_ms", "cpu_ms", "peak_rss_mb")
+
+DEFAULTS = {
+    "repeat": 10,
+    "warmup": 1,
+    "speed": 10,
+    "timeout": 30,
+    "scenarios": None,
+    "query": "今天天气怎么样",
+    "asr_latency": 0.3,
+    "asr_stream_latency": 0.1,
+    "nlu_latency": 0.05,
+    "robot_latency": 0.5,
+    "token_latency": 0.03,
+    "tts_latency": 0.2,
+    "tts_char_latency": 0.01,
+    "output": None,
+    "compare": None,
+}
+
+
+def all_scenarios():
+    """全部场景名，形如 voice/robot-stream/tts"""
+    return [
+        f"{source}/{robot}/{tts}"
+        for source in INPUTS
+        for robot in ("robot", "robot-stream")
+        for tts in ("tts", "tts-stream")
+    ]
+
+
+def parse_scenario(name):
+    source, robot, tts = name.split("/")
+    if source not in INPUTS or robot not in ("robot", "robot-stream") or tts not in ("tts", "tts-stream"):
+        raise ValueError(f"未知的场景：{name}")
+    return source, robot == "robot-stream", tts == "tts-stream"
+
+
+def peak_rss_mb():
+    """进程的内存峰值（MB），平台不支持时返回 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 的单位是 KB，macOS 是字节
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def make_recording(seconds=1.5, rate=16000):
+    """
+    生成一段假的录音（doConverse 结束后会删除）
+
+    :returns: (录音路径, PCM 数据)
+    """
+    n = int(seconds * rate)
+    pcm = struct.pack(f"<{n}h", *((i * 7919) % 2001 - 1000 for i in range(n)))
+    fp = os.path.join(constants.TEMP_PATH, f"bench-{uuid.uuid4().hex}.wav")
+    with wave.open(fp, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return fp, pcm
+
+
+def setup_scenario(conversation, name, opts, cache_dir):
+    """
+    按场景切换桩引擎的流式开关并重新初始化对话
+
+    每个场景使用单独的空 TTS 缓存，避免命中其他场景或真实缓存里的语音
+    """
+    _, robot_streaming, tts_streaming = parse_scenario(name)
+    tts_args = {
+        "latency": opts["tts_latency"],
+        "char_latency": opts["tts_char_latency"],
+        "streaming": tts_streaming,
+    }
+    stubs.merge_config(
+        {
+            stubs.StubRobot.SLUG: {"streaming": robot_streaming},
+            stubs.StubTTS.SLUG: tts_args,
+        }
+    )
+    stubs.use_stub_voice(**tts_args)
+    conversation.reInit()
+    conversation.tts_cache = TTSCache(path=os.path.join(cache_dir, name.replace("/", "_")))
+
+
+def interact(conversation, source, opts):
+    """
+    进行一次对话并等待回复播放完成
+
+    :returns: 会话的 LatencyTracker，超时返回 None
+    """
+    if source == "text":
+        session_id = str(uuid.uuid1())
+        conversation.doResponse(opts["query"], session_id)
+    else:
+        fp, pcm = make_recording()
+        # 流式识别在录音期间就收到了音频
+        asr_stream = conversation.createASRStream()
+        if asr_stream:
+            for i in range(0, len(pcm), 3200):
+                asr_stream.feed(pcm[i : i + 3200])
+        conversation.doConverse(fp, asr_stream=asr_stream)
+        session_id = conversation.current_session_id
+    monitor = get_monitor()
+    deadline = time.time() + opts["timeout"]
+    while time.time() < deadline:
+        tracker = monitor.get_session(session_id)
+        if tracker and "response_end" in tracker.timestamps:
+            return tracker
+        time.sleep(0.005)
+    logger.warning(f"会话 {session_id} 没有在 {opts['timeout']} 秒内完成")
+    return None
+
+
+def run_scenario(conversation, name, opts, cache_dir):
+    source = parse_scenario(name)[0]
+    setup_scenario(conversation, name, opts, cache_dir)
+    samples = {metric: [] for metric in METRICS}
+    stages = {}
+    failed = 0
+    for i in range(opts["warmup"] + opts["repeat"]):
+        cpu = time.process_time()
+        tracker = interact(conversation, source, opts)
+        cpu = (time.process_time() - cpu) * 1000
+        if i < opts["warmup"]:
+            continue
+        if tracker is None:
+            failed += 1
+            continue
+        durations = dict(tracker.durations)
+        samples["ttfa_ms"].append(durations.get("first_audio_latency"))
+        samples["total_ms"].append(durations.get("response_latency"))
+        samples["cpu_ms"].append(cpu)
+        samples["peak_rss_mb"].append(peak_rss_mb())
+        for stage, value in durations.items():
+            if value is not None:
+                stages.setdefault(stage, []).append(value)
+    result = {"done": opts["repeat"] - failed, "failed": failed}
+    for metric, values in samples.items():
+        result[metric] = summarize([v for v in values if v is not None])
+    result["stages"] = {stage: summarize(values) for stage, values in sorted(stages.items())}
+    return result
+
+
+def print_results(results, baseline=None):
+    print(f"{'场景':<32s}{'指标':<14s}{'p50':>10s}{'p95':>10s}{'p99':>10s}")
+    for name, result in results["scenarios"].items():
+        old = (baseline or {}).get("scenarios", {}).get(name, {})
+        for metric in METRICS:
+            row = f"{name:<32s}{metric:<14s}"
+            for p in ("p50", "p95", "p99"):
+                value = result[metric].get(p)
+                row += f"{value:>10.1f}" if value is not None else f"{'-':>10s}"
+            previous = old.get(metric, {}).get("p50")
+            if previous and result[metric].get("p50") is not None:
+                row += f"  p50 {(result[metric]['p50'] - previous) / previous:+.1%}"
+            print(row)
+        if result["failed"]:
+            print(f"{name:<32s}失败 {result['failed']} 次")
+
+
+def run(**options):
+    """
+    运行基准测试
+
+    :param options: 见 DEFAULTS
+    :returns: 测试结果，同时保存为 JSON
+    """
+    unknown = set(options) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"未知的参数：{', '.join(sorted(unknown))}")
+    opts = {**DEFAULTS, **options}
+    names = opts["scenarios"] or all_scenarios()
+    if isinstance(names, str):
+        names = names.split(",")
+    for name in names:
+        parse_scenario(name)
+
+    stubs.load_config(
+        {
+            "asr_engine": stubs.StubASR.SLUG,
+            "nlu_engine": stubs.StubNLU.SLUG,
+            "robot": stubs.StubRobot.SLUG,
+            "tts_engine": stubs.StubTTS.SLUG,
+            stubs.StubASR.SLUG: {
+                "latency": opts["asr_latency"],
+                "stream_latency": opts["asr_stream_latency"],
+                "text": opts["query"],
+            },
+            stubs.StubNLU.SLUG: {"latency": opts["nlu_latency"]},
+            stubs.StubRobot.SLUG: {
+                "latency": opts["robot_latency"],
+                "token_latency": opts["token_latency"],
+            },
+            "audio_output": {"engine": "pyaudio"},
+            "LED": {"enable": False},
+        }
+    )
+    engine = AudioEngine.AudioEngine(
+        rate=config.get("/audio_output/rate", 48000),
+        channels=config.get("/audio_output/channels", 1),
+        frames_per_buffer=config.get("/audio_output/frames_per_buffer", 256),
+    )
+    engine.start_virtual(opts["speed"])
+    previous = AudioEngine.set_engine(engine)
+
+    from robot.Conversation import Conversation
+
+    results = {
+        "version": utils.get_file_content(os.path.join(constants.APP_PATH, "VERSION"), "r").strip(),
+        "generated_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": opts,
+        "scenarios": {},
+    }
+    try:
+        conversation = Conversation()
+        with tempfile.TemporaryDirectory(prefix="bench-", dir=constants.TEMP_PATH) as cache_dir:
+            for name in names:
+                logger.info(f"开始测试场景 {name}")
+                results["scenarios"][name] = run_scenario(conversation, name, opts, cache_dir)
+    finally:
+        AudioEngine.set_engine(previous)
+        engine.close()
+
+    baseline = None
+    if opts["compare"]:
+        with open(opts["compare"], encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = opts["output"]
+    if not output:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(get_monitor().report_dir, f"bench_{timestamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+    return results
+
+
+def parse_args(argv=None):
+    """
+    解析命令行参数
+
+    :param argv: 命令行参数，None 表示 sys.argv[1:]
+    :returns: run() 的参数
+    """
+    parser = argparse.ArgumentParser(description="对话链路延迟基准")
+    parser.add_argument("--repeat", type=int, default=DEFAULTS["repeat"], help="每个场景的对话次数")
+    parser.add_argument("--warmup", type=int, default=DEFAULTS["warmup"], help="不计入统计的预热次数")
+    parser.add_argument("--speed", type=float, default=DEFAULTS["speed"], help="虚拟播放的速度倍数")
+    parser.add_argument("--timeout", type=float, default=DEFAULTS["timeout"], help="单次对话最长等待（秒）")
+    parser.add_argument("--scenarios", help=f"逗号分隔的场景，默认全部：{','.join(all_scenarios())}")
+    parser.add_argument("--query", default=DEFAULTS["query"], help="指令文字")
+    parser.add_argument("--asr-latency", type=float, default=DEFAULTS["asr_latency"], help="ASR 耗时（秒）")
+    parser.add_argument(
+        "--asr-stream-latency", type=float, default=DEFAULTS["asr_stream_latency"], help="流式 ASR 尾部耗时（秒）"
+    )
+    parser.add_argument("--nlu-latency", type=float, default=DEFAULTS["nlu_latency"], help="NLU 耗时（秒）")
+    parser.add_argument("--robot-latency", type=float, default=DEFAULTS["robot_latency"], help="机器人首字耗时（秒）")
+    parser.add_argument("--token-latency", type=float, default=DEFAULTS["token_latency"], help="流式回复的字间隔（秒）")
+    parser.add_argument("--tts-latency", type=float, default=DEFAULTS["tts_latency"], help="TTS 每句耗时（秒）")
+    parser.add_argument(
+        "--tts-char-latency", type=float, default=DEFAULTS["tts_char_latency"], help="TTS 每字额外耗时（秒）"
+    )
+    parser.add_argument("--output", help="结果 JSON 的保存路径，默认保存到 temp/latency_reports")
+    parser.add_argument("--compare", help="与之前保存的结果对比")
+    return vars(parser.parse_args(argv))
+
+
+def main():
+    run(**parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+无声卡的全链路回放测试
+
+把录好的“唤醒词 + 指令”录音当作麦克风输入回放（ReplaySource），输出
+写进虚拟的音频输出引擎，ASR/NLU/对话机器人/TTS 换成本地桩引擎（见
+stubs.py），从离线唤醒、录音、识别一直跑到回复播放完成，重复成百上千
+次后从 LatencyMonitor 取出各阶段延迟的分位数。
+
+脚本目录下放 script.csv，每行：录音文件名,桩 ASR 返回的识别结果
+    001.wav,今天天气怎么样
+    002.wav,讲个笑话
+录音需包含当前配置的唤醒词，格式会自动转换为 16kHz 单声道。
+需要 snowboy（或 porcupine）可用。
+
+加速回放（--speed）时录音和播放的时间线整体变快，端点检测的等待、
+提示音和回复的播放时长都会相应缩短，桩引擎的延迟则不变。
+
+用法：
+    python bench/pipeline.py <脚本目录> [--repeat 10] [--speed 1]
+        [--asr-latency 0.3] [--nlu-latency 0.05] [--robot-latency 0.5]
+        [--tts-latency 0.2] [--json 结果.json]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from robot import AudioCapture, AudioEngine, config, constants, logging
+from robot.LatencyMonitor import get_monitor
+from robot.TTSCache import TTSCache
+
+import stubs
+
+logger = logging.getLogger(__name__)
+
+
+def load_script(directory):
+    script = []
+    with open(os.path.join(directory, "script.csv"), encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            pcm = AudioCapture.load_pcm(os.path.join(directory, row[0]))
+            script.append((row[0], pcm, row[1] if len(row) > 1 else ""))
+    return script
+
+
+def start_audio(speed):
+    """
+    把全局的采集服务和输出引擎换成回放和虚拟输出
+
+    :returns: (ReplaySource, 唤醒监听开始读取录音时设置的 Event)
+    """
+    source = AudioCapture.ReplaySource(speed)
+    capture = AudioCapture.AudioCapture(config.get("/audio_input/buffer_seconds", 10))
+    # 回放要等唤醒监听订阅之后才能开始，否则开头的唤醒词会被错过
+    listening = threading.Event()
+    subscribe = capture.subscribe
+
+    def subscribe_and_notify(*args, **kwargs):
+        subscription = subscribe(*args, **kwargs)
+        listening.set()
+        return subscription
+
+    capture.subscribe = subscribe_and_notify
+    capture.start(source)
+    AudioCapture.set_capture(capture)
+    engine = AudioEngine.AudioEngine(
+        rate=config.get("/audio_output/rate", 48000),
+        channels=config.get("/audio_output/channels", 1),
+        frames_per_buffer=config.get("/audio_output/frames_per_buffer", 256),
+    )
+    engine.start_virtual(speed)
+    AudioEngine.set_engine(engine)
+    return source, listening
+
+
+def responded(monitor, since):
+    """since 之后开始、已经播放完回复的语音对话数"""
+    with monitor.lock:
+        return sum(
+            1
+            for tracker in monitor.sessions.values()
+            if tracker.start_time >= since
+            and "asr_start" in tracker.timestamps
+            and "response_end" in tracker.timestamps
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无声卡的全链路回放测试")
+    parser.add_argument("directory", help="包含录音和 script.csv 的目录")
+    parser.add_argument("--repeat", type=int, default=10, help="脚本重复次数")
+    parser.add_argument("--speed", type=float, default=1, help="回放速度倍数")
+    parser.add_argument("--gap", type=float, default=1, help="两次对话之间的静音（秒）")
+    parser.add_argument("--timeout", type=float, default=30, help="单次对话最长等待（秒）")
+    parser.add_argument("--asr-latency", type=float, default=0.3, help="ASR 耗时（秒）")
+    parser.add_argument("--asr-stream-latency", type=float, default=0.1, help="流式 ASR 尾部耗时（秒）")
+    parser.add_argument("--nlu-latency", type=float, default=0.05, help="NLU 耗时（秒）")
+    parser.add_argument("--robot-latency", type=float, default=0.5, help="对话机器人耗时（秒）")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="TTS 每句耗时（秒）")
+    parser.add_argument("--json", help="把各阶段延迟分位数保存为 JSON")
+    opts = parser.parse_args()
+
+    stubs.load_config(
+        {
+            "asr_engine": stubs.StubASR.SLUG,
+            "nlu_engine": stubs.StubNLU.SLUG,
+            "robot": stubs.StubRobot.SLUG,
+            "tts_engine": stubs.StubTTS.SLUG,
+            stubs.StubASR.SLUG: {
+                "latency": opts.asr_latency,
+                "stream_latency": opts.asr_stream_latency,
+            },
+            stubs.StubNLU.SLUG: {"latency": opts.nlu_latency},
+            stubs.StubRobot.SLUG: {"latency": opts.robot_latency},
+            stubs.StubTTS.SLUG: {"latency": opts.tts_latency},
+            "audio_output": {"engine": "pyaudio"},
+            "LED": {"enable": False},
+        }
+    )
+    stubs.use_stub_voice(latency=opts.tts_latency)
+    script = load_script(opts.directory)
+    source, listening = start_audio(opts.speed)
+
+    from robot import detector
+    from robot.Conversation import Conversation
+    from robot.LifeCycleHandler import LifeCycleHandler
+    from wukong import Wukong
+
+    # 不启动后台管理端，只保留唤醒回调需要的部分
+    bot = Wukong()
+    bot._interrupted = False
+    bot.conversation = Conversation()
+    # 使用空的 TTS 缓存，避免命中之前合成过的回复
+    cache_dir = tempfile.TemporaryDirectory(prefix="bench-", dir=constants.TEMP_PATH)
+    bot.conversation.tts_cache = TTSCache(path=cache_dir.name)
+    bot.lifeCycleHandler = LifeCycleHandler(bot.conversation)
+    threading.Thread(target=detector.initDetector, args=(bot,), daemon=True).start()
+    if not listening.wait(opts.timeout):
+        logger.error("离线唤醒没有启动")
+        return
+
+    monitor = get_monitor()
+    done, failed = 0, 0
+    begin = time.time()
+    for _ in range(opts.repeat):
+        for name, pcm, text in script:
+            since = time.time()
+            bot.conversation.asr.expect(text)
+            source.play(pcm)
+            deadline = since + opts.timeout
+            while responded(monitor, since) == 0 and time.time() < deadline:
+                time.sleep(0.01)
+            if responded(monitor, since):
+                done += 1
+            else:
+                failed += 1
+                logger.warning(f"{name} 没有在 {opts.timeout} 秒内完成对话")
+                bot.conversation.asr.texts.queue.clear()
+            time.sleep(opts.gap / opts.speed)
+    bot._interrupted = True
+    elapsed = time.time() - begin
+    cache_dir.cleanup()
+
+    stats = monitor.get_percentiles((50, 95, 99))
+    print(f"完成 {done} 次对话，失败 {failed} 次，耗时 {elapsed:.1f} 秒，{opts.speed} 倍速回放")
+    print(f"{'阶段':<24s}{'样本':>6s}{'p50':>10s}{'p95':>10s}{'p99':>10s}")
+    for stage, s in sorted(stats.items()):
+        print(f"{stage:<24s}{s['count']:>6d}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}")
+    if opts.json:
+        with open(opts.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"done": done, "failed": failed, "speed": opts.speed, "stages": stats},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
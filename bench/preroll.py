@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+预录音回放测试
+
+把标注好的 WAV 录音当作麦克风输入，回放给常驻采集服务（不打开声卡），
+模拟“用户先开口、录音稍后才开始”的情况：回放到说话开始后 --late-ms
+毫秒才调用 ActiveListener.listen()（机器人在录音开头就已说完），对比不同
+预录音时长下：
+- 丢失：录音开头比说话开始晚了多少毫秒（被吃掉的第一个字）
+- 多录：录音开头比说话开始早了多少毫秒（多收进来的静音或噪声）
+
+标注文件为目录下的 onsets.csv，每行：文件名,说话开始时刻（毫秒）
+    001.wav,820
+    002.wav,1260
+录音需为 16kHz 单声道（其他格式会先转换），末尾会追加 --tail-ms 毫秒静音。
+需要 snowboy 和唤醒词模型。
+
+用法：
+    python bench/preroll.py <目录> [--preroll-ms 0,300,400,500] [--late-ms 200]
+        [--engine silero] [--speed 4]
+"""
+import argparse
+import csv
+import os
+import statistics
+import sys
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot import AudioCapture, VAD, config, constants
+
+FRAME_BYTES = AudioCapture.FRAME_BYTES
+BYTES_PER_MS = AudioCapture.RATE * AudioCapture.SAMPLE_WIDTH // 1000
+
+
+def load(directory, tail_ms):
+    samples = []
+    with open(os.path.join(directory, "onsets.csv"), encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            pcm = AudioCapture.load_pcm(os.path.join(directory, row[0]))
+            pcm += b"\0" * (BYTES_PER_MS * tail_ms)
+            pcm = pcm[: len(pcm) - len(pcm) % FRAME_BYTES]
+            samples.append((row[0], pcm, float(row[1])))
+    return samples
+
+
+def make_vad(engine, opts):
+    if engine == VAD.SnowboyVAD.SLUG:
+        return VAD.SnowboyVAD()
+    if engine == VAD.WebRTCVAD.SLUG:
+        return VAD.WebRTCVAD(opts.webrtc_level)
+    if engine == VAD.SileroVAD.SLUG:
+        model = VAD.SileroModel(constants.getData("silero_vad.onnx"))
+        return VAD.SileroVAD(model, opts.silero_threshold)
+    raise ValueError(f"未知的引擎：{engine}")
+
+
+def replay(listener, endpointer, pcm, onset_ms, preroll_ms, opts):
+    """
+    回放一条录音，在说话开始 late_ms 毫秒后开始录音
+
+    :returns: 录音开头在回放录音中的位置（毫秒），没录到返回 None
+    """
+    capture = AudioCapture.AudioCapture(buffer_seconds=len(pcm) / BYTES_PER_MS / 1000 + 1)
+    AudioCapture.set_capture(capture)
+    # 录音开始之前的部分直接写入，模拟采集服务一直在运行
+    start = int((onset_ms + opts.late_ms) * BYTES_PER_MS)
+    start -= start % FRAME_BYTES
+    capture.write(pcm[:start])
+    source = AudioCapture.ReplaySource(opts.speed)
+    done = source.play(pcm[start:])
+    capture.start(source)
+    fp = listener.listen(
+        interrupt_check=done.is_set,
+        silent_count_threshold=opts.silent_threshold,
+        recording_timeout=opts.recording_timeout * 4,
+        endpointer=endpointer,
+        preroll_ms=preroll_ms,
+        since=0,
+    )
+    capture.close()
+    if fp:
+        os.remove(fp)
+    recorded = b"".join(listener.recordedData)
+    if not recorded:
+        return None
+    # 回放是逐字节写入的，录音开头一定能在原录音里按帧对齐地找到
+    head = recorded[: FRAME_BYTES * 4]
+    pos = pcm.find(head)
+    while pos >= 0 and pos % FRAME_BYTES:
+        pos = pcm.find(head, pos + 1)
+    return pos / BYTES_PER_MS if pos >= 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预录音回放测试")
+    parser.add_argument("directory", help="包含 WAV 和 onsets.csv 的目录")
+    parser.add_argument("--preroll-ms", default="0,300,400,500", help="要对比的预录音时长")
+    parser.add_argument("--late-ms", type=float, default=200, help="说话开始后多久才开始录音")
+    parser.add_argument("--engine", default="silero", help="端点检测引擎 snowboy/webrtc/silero")
+    parser.add_argument("--hangover-ms", type=float, default=600, help="说完后的静音时长")
+    parser.add_argument("--min-speech-ms", type=float, default=90, help="判定开口的最短语音")
+    parser.add_argument("--webrtc-level", type=int, default=2, help="WebRTC VAD 激进程度")
+    parser.add_argument("--silero-threshold", type=float, default=0.5, help="Silero 语音概率阈值")
+    parser.add_argument("--silent-threshold", type=int, default=15, help="开口前最多等待的静音计数")
+    parser.add_argument("--recording-timeout", type=int, default=10, help="录音最长秒数")
+    parser.add_argument("--tail-ms", type=int, default=2000, help="每条录音末尾追加的静音")
+    parser.add_argument("--speed", type=float, default=4, help="回放速度倍数")
+    opts = parser.parse_args()
+
+    from snowboy import snowboydecoder
+
+    samples = load(opts.directory, opts.tail_ms)
+    listener = snowboydecoder.ActiveListener(
+        [constants.getHotwordModel(config.get("hotword", "wukong.pmdl"))]
+    )
+    endpointer = VAD.Endpointer(make_vad(opts.engine, opts), opts.hangover_ms, opts.min_speech_ms)
+    print(f"录音 {len(samples)} 条，{opts.engine} VAD，说话开始 {opts.late_ms:.0f}ms 后才开始录音")
+
+    previous = AudioCapture.set_capture(None)
+    try:
+        for preroll_ms in [int(p) for p in opts.preroll_ms.split(",")]:
+            lost, extra, failed = [], [], 0
+            for name, pcm, onset_ms in samples:
+                head = replay(listener, endpointer, pcm, onset_ms, preroll_ms, opts)
+                if head is None:
+                    failed += 1
+                    continue
+                lost.append(max(0, head - onset_ms))
+                extra.append(max(0, onset_ms - head))
+            lost, extra = lost or [float("nan")], extra or [float("nan")]
+            print(
+                f"预录音 {preroll_ms:4d}ms: 丢失 平均 {statistics.mean(lost):6.1f} ms, "
+                f"最多 {max(lost):6.1f} ms, 完整率 {sum(1 for x in lost if x == 0) / len(samples):6.1%}; "
+                f"多录 平均 {statistics.mean(extra):6.1f} ms; 没录到 {failed} 条"
+            )
+    finally:
+        AudioCapture.set_capture(previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+上传语音重采样基准
+
+模拟后台管理端 /chat 收到的语音（浏览器录音，WAV），测量把它转换成
+16kHz 单声道 PCM 的耗时：
+- sox：改造前的做法，写临时文件后启动 sox 进程，再写一个 16k 文件（需安装 sox）
+- linear：AudioEngine.Resampler 的线性插值，全程在内存中
+- polyphase：AudioCapture.decode，装了 scipy 时用多相滤波，全程在内存中
+
+每种时长重复若干次，输出平均耗时和实时倍数（每秒能处理多少秒的音频）。
+另外用一个 10kHz 的正弦波（高于 16k 采样的奈奎斯特频率）测量混叠：
+输出能量相对输入的分贝数，越低说明抗混叠越好。
+
+用法：
+    python bench/resample.py [--durations 1,5,10,30] [--rate 48000] [--channels 1] [--repeat 5]
+"""
+import argparse
+import io
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot import AudioCapture
+from robot.AudioEngine import Resampler
+
+
+def make_wav(seconds, rate, channels, freq=None):
+    """生成一段 WAV：默认是语音频段的几个正弦波加噪声，指定 freq 时是单个正弦波"""
+    t = np.arange(int(seconds * rate)) / rate
+    if freq:
+        signal = 0.5 * np.sin(2 * math.pi * freq * t)
+    else:
+        signal = sum(0.2 * np.sin(2 * math.pi * f * t) for f in (220, 880, 2500))
+        signal += 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    pcm = np.repeat(pcm[:, None], channels, axis=1).tobytes()
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def by_sox(data):
+    tmpfile = tempfile.NamedTemporaryFile(suffix=".wav", delete=False).name
+    nfile = tmpfile[:-4] + "-16k.wav"
+    with open(tmpfile, "wb") as f:
+        f.write(data)
+    subprocess.call([f"sox {tmpfile} {nfile} rate 16k"], shell=True, close_fds=True)
+    os.remove(tmpfile)
+    pcm = AudioCapture.load_pcm(nfile)
+    os.remove(nfile)
+    return pcm
+
+
+def by_linear(data):
+    with wave.open(io.BytesIO(data), "rb") as w:
+        return Resampler(
+            w.getframerate(), w.getnchannels(), w.getsampwidth(), AudioCapture.RATE, 1
+        ).process(w.readframes(w.getnframes()))
+
+
+def by_polyphase(data):
+    return AudioCapture.decode(data)
+
+
+def rms(pcm):
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float64)
+    return math.sqrt(np.mean(samples**2)) if len(samples) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传语音重采样基准")
+    parser.add_argument("--durations", default="1,5,10,30", help="语音时长（秒）")
+    parser.add_argument("--rate", type=int, default=48000, help="上传语音的采样率")
+    parser.add_argument("--channels", type=int, default=1, help="上传语音的声道数")
+    parser.add_argument("--repeat", type=int, default=5, help="每种时长重复次数")
+    opts = parser.parse_args()
+
+    methods = [("linear", by_linear), ("polyphase", by_polyphase)]
+    if shutil.which("sox"):
+        methods.insert(0, ("sox", by_sox))
+    else:
+        print("没有找到 sox，跳过 sox 的对比")
+
+    print(f"{opts.rate}Hz {opts.channels} 声道 -> 16kHz 单声道，每种时长重复 {opts.repeat} 次")
+    print(f"{'方法':<12s}{'时长(s)':>8s}{'平均(ms)':>12s}{'实时倍数':>12s}")
+    for seconds in [float(d) for d in opts.durations.split(",")]:
+        data = make_wav(seconds, opts.rate, opts.channels)
+        for name, method in methods:
+            method(data)  # 预热
+            start = time.perf_counter()
+            for _ in range(opts.repeat):
+                method(data)
+            elapsed = (time.perf_counter() - start) / opts.repeat
+            print(f"{name:<12s}{seconds:>8.0f}{elapsed * 1000:>12.2f}{seconds / elapsed:>12.0f}")
+
+    tone = make_wav(1, opts.rate, opts.channels, freq=10000)
+    print("10kHz 正弦波的混叠（输出相对输入，越低越好）：")
+    source = rms(np.frombuffer(tone[44:], dtype=np.int16)[:: opts.channels].tobytes())
+    for name, method in methods:
+        print(f"{name:<12s}{20 * math.log10(max(rms(method(tone)), 1e-9) / source):>8.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
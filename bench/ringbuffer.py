@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+唤醒监听环形缓冲区基准
+
+模拟空闲监听时的 snowboy 采集链路：一个线程按麦克风的节奏（16kHz、
+每次 2048 帧）调用 audio_callback 写入缓冲区，主循环每 sleep_time 秒
+取一次数据。分别测量旧的 deque 实现和常驻采集服务（AudioCapture）的
+预分配 bytearray 共享缓冲区：
+- 实时模式：进程 CPU 占用率（空闲监听时的开销）
+- 加速模式：不等待麦克风节奏，每秒能处理多少秒的音频
+
+用法：
+    python bench/ringbuffer.py [--seconds 10] [--rate 16000] [--frames 2048]
+"""
+import argparse
+import collections
+import os
+import sys
+import threading
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot import AudioCapture
+
+
+class DequeRingBuffer(object):
+    """改造前的实现，每个字节都是 deque 里的一个 int 对象"""
+
+    def __init__(self, size=4096):
+        self._buf = collections.deque(maxlen=size)
+
+    def extend(self, data):
+        self._buf.extend(data)
+
+    def get(self):
+        tmp = bytes(bytearray(self._buf))
+        self._buf.clear()
+        return tmp
+
+
+class CaptureRingBuffer(object):
+    """AudioCapture 的共享缓冲区和一个订阅者，接口同上"""
+
+    def __init__(self, size=4096):
+        self.capture = AudioCapture.AudioCapture(
+            buffer_seconds=size / (AudioCapture.RATE * AudioCapture.SAMPLE_WIDTH)
+        )
+        self.subscription = self.capture.subscribe()
+
+    def extend(self, data):
+        self.capture.write(data)
+
+    def get(self):
+        n = len(self.subscription)
+        return self.subscription.read(n, timeout=0) if n else b""
+
+
+def run(buffer_cls, seconds, rate, frames, realtime, sleep_time=0.03):
+    buf = buffer_cls(rate * 5)
+    chunk = os.urandom(frames * 2)
+    interval = frames / rate if realtime else 0
+    total = int(seconds * rate / frames)
+    done = threading.Event()
+
+    def capture():
+        # 模拟 PortAudio 回调线程
+        next_time = time.perf_counter()
+        for _ in range(total):
+            buf.extend(chunk)
+            if interval:
+                next_time += interval
+                time.sleep(max(0, next_time - time.perf_counter()))
+        done.set()
+
+    received = 0
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    threading.Thread(target=capture, daemon=True).start()
+    while True:
+        data = buf.get()
+        if len(data) == 0:
+            if done.is_set():
+                break
+            if realtime:
+                time.sleep(sleep_time)
+            continue
+        received += len(data)
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    return cpu / wall * 100, received / 2 / rate / wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="唤醒监听环形缓冲区基准")
+    parser.add_argument("--seconds", type=float, default=10, help="模拟的音频时长")
+    parser.add_argument("--rate", type=int, default=16000, help="采样率")
+    parser.add_argument("--frames", type=int, default=2048, help="每次回调的帧数")
+    opts = parser.parse_args()
+
+    print(f"audio={opts.seconds:.0f}s rate={opts.rate} frames={opts.frames}")
+    for name, cls in [("deque", DequeRingBuffer), ("bytearray", CaptureRingBuffer)]:
+        cpu, _ = run(cls, opts.seconds, opts.rate, opts.frames, realtime=True)
+        _, speed = run(cls, opts.seconds * 10, opts.rate, opts.frames, realtime=False)
+        print(f"{name:>10s}: 空闲监听 CPU {cpu:6.2f}%, 加速处理 {speed:8.1f}x 实时")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+本地桩引擎
+
+不访问任何在线服务，按配置的延迟模拟 ASR、NLU、对话机器人和 TTS，
+用来在没有网络和声卡的环境里测量对话链路本身的开销。
+导入本模块后，各引擎即可通过 SLUG 在配置里选用，例如：
+
+    asr_engine: stub-asr
+    stub-asr:
+        latency: 0.3
+"""
+import math
+import os
+import queue
+import struct
+import time
+import uuid
+import wave
+
+from robot import ASR, AI, NLU, TTS, CharacterVoice, config, constants, logging
+from robot.AudioStream import PCMStream
+
+logger = logging.getLogger(__name__)
+
+
+def _sleep(seconds):
+    seconds > 0 and time.sleep(seconds)
+
+
+def load_config(overrides):
+    """读取配置（不存在时使用默认配置，不会提示创建），再覆盖部分配置项"""
+    path = constants.getConfigPath()
+    config.doInit(path if os.path.exists(path) else constants.getDefaultConfigPath())
+    config.has_init = True
+    merge_config(overrides)
+
+
+def merge_config(overrides, conf=None):
+    """把 overrides 逐层合并进当前配置"""
+    conf = config.getConfig() if conf is None else conf
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(conf.get(key), dict):
+            merge_config(value, conf[key])
+        else:
+            conf[key] = value
+
+
+def use_stub_voice(**args):
+    """声纹识别切换角色语音时也使用桩 TTS，args 为 StubTTS 的参数"""
+    CharacterVoice.DEFAULT_VOICE = {"engine": StubTTS.SLUG, **args}
+    for name in CharacterVoice.CHARACTER_VOICE_MAP:
+        CharacterVoice.CHARACTER_VOICE_MAP[name] = CharacterVoice.DEFAULT_VOICE
+
+
+class StubASR(ASR.AbstractASR):
+    """
+    桩 ASR：按顺序返回预先排好的识别结果
+
+    :param latency: 录音结束后识别一段录音的耗时（秒）
+    :param stream_latency: 流式识别在录音结束后返回结果的耗时（秒），
+                           None 表示不支持流式识别
+    :param text: 没有排队的识别结果时返回的内容
+    """
+
+    SLUG = "stub-asr"
+
+    def __init__(self, latency=0.3, stream_latency=0.1, text="你好", **args):
+        super(self.__class__, self).__init__()
+        self.latency = latency
+        self.stream_latency = stream_latency
+        self.text = text
+        self.texts = queue.Queue()
+
+    @classmethod
+    def get_config(cls):
+        return config.get(cls.SLUG, {})
+
+    def expect(self, text):
+        """排队一个识别结果，下一次识别时返回"""
+        self.texts.put(text)
+
+    def _next(self):
+        try:
+            return self.texts.get_nowait()
+        except queue.Empty:
+            return self.text
+
+    def transcribe(self, fp):
+        _sleep(self.latency)
+        return self._next()
+
+    def stream(self):
+        if self.stream_latency is None:
+            return None
+
+        def worker(chunks):
+            for _ in chunks:
+                pass
+            _sleep(self.stream_latency)
+            return self._next()
+
+        return ASR.ASRStream(worker, self.SLUG)
+
+
+class StubNLU(NLU.AbstractNLU):
+    """
+    桩 NLU：不识别任何意图
+
+    :param latency: 解析耗时（秒）
+    """
+
+    SLUG = "stub-nlu"
+
+    def __init__(self, latency=0.05, **args):
+        super(self.__class__, self).__init__()
+        self.latency = latency
+
+    @classmethod
+    def get_config(cls):
+        return config.get(cls.SLUG, {})
+
+    def parse(self, query, **args):
+        _sleep(self.latency)
+        return {}
+
+    def getIntent(self, parsed):
+        return []
+
+    def hasIntent(self, parsed, intent):
+        return False
+
+    def getSlots(self, parsed, intent):
+        return []
+
+    def getSlotWords(self, parsed, intent, name):
+        return []
+
+
+class StubRobot(AI.AbstractRobot):
+    """
+    桩对话机器人：按模板回复
+
+    :param latency: 非流式回复的耗时；流式回复时为首个字出现前的耗时（秒）
+    :param token_latency: 流式回复时相邻两段文字的间隔（秒）
+    :param reply: 回复的模板，{query} 替换为用户的指令，{n} 替换为回复的序号
+                  （使每次回复的内容不同，避免全部命中 TTS 缓存）
+    :param streaming: 是否以流式方式回复
+    """
+
+    SLUG = "stub-robot"
+
+    def __init__(
+        self,
+        latency=0.5,
+        token_latency=0.03,
+        reply="好的，这是第{n}条用来测试延迟的回复。它一共有两句话。",
+        streaming=False,
+        **args,
+    ):
+        super(self.__class__, self).__init__()
+        self.latency = latency
+        self.token_latency = token_latency
+        self.reply = reply
+        self.streaming = streaming
+        self.count = 0
+
+    @classmethod
+    def get_config(cls):
+        return config.get(cls.SLUG, {})
+
+    def _reply(self, texts):
+        self.count += 1
+        return self.reply.format(query="".join(texts), n=self.count)
+
+    def chat(self, texts, parsed=None):
+        _sleep(self.latency)
+        return self._reply(texts)
+
+    def stream_chat(self, texts):
+        reply = self._reply(texts)
+
+        def generate():
+            _sleep(self.latency)
+            for i in range(0, len(reply), 2):
+                if i:
+                    _sleep(self.token_latency)
+                yield reply[i : i + 2]
+
+        return generate
+
+
+class StubTTS(TTS.AbstractTTS):
+    """
+    桩 TTS：合成一段与文字长度成正比的低音量正弦波
+
+    :param latency: 合成一句话的固定耗时（秒）
+    :param char_latency: 每个字额外的合成耗时（秒）
+    :param char_ms: 每个字的语音时长（毫秒）
+    :param rate: 合成音频的采样率
+    :param streaming: 是否边合成边返回音频流
+    """
+
+    SLUG = "stub-tts"
+    IDENTITY_KEYS = ("char_ms", "rate")
+
+    def __init__(
+        self, latency=0.2, char_latency=0.01, char_ms=200, rate=16000, streaming=False, **args
+    ):
+        super(self.__class__, self).__init__()
+        self.latency = latency
+        self.char_latency = char_latency
+        self.char_ms = char_ms
+        self.rate = rate
+        self.streaming = streaming
+
+    @classmethod
+    def get_config(cls):
+        return config.get(cls.SLUG, {})
+
+    def _pcm(self, phrase):
+        n = int(self.rate * len(phrase) * self.char_ms / 1000)
+        step = 2 * math.pi * 440 / self.rate
+        return struct.pack(f"<{n}h", *(int(1000 * math.sin(step * i)) for i in range(n)))
+
+    def get_speech(self, phrase):
+        _sleep(self.latency + self.char_latency * len(phrase))
+        tmpfile = os.path.join(constants.TEMP_PATH, f"stub-{uuid.uuid4().hex}.wav")
+        with wave.open(tmpfile, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.rate)
+            w.writeframes(self._pcm(phrase))
+        return tmpfile
+
+    def get_speech_stream(self, phrase):
+        """首个音频块在 latency 后到达，之后边合成边返回"""
+        pcm = self._pcm(phrase)
+        header = bytearray(44)
+        header[0:4], header[8:16], header[36:40] = b"RIFF", b"WAVEfmt ", b"data"
+        struct.pack_into("<IHHIIHH", header, 16, 16, 1, 1, self.rate, self.rate * 2, 2, 16)
+        struct.pack_into("<I", header, 40, len(pcm))
+        struct.pack_into("<I", header, 4, 36 + len(pcm))
+        chunk = self.rate * 2 // 5  # 200ms 一块
+
+        def chunks():
+            _sleep(self.latency)
+            yield bytes(header)
+            for i in range(0, len(pcm), chunk):
+                _sleep(self.char_latency * len(phrase) * chunk / max(1, len(pcm)))
+                yield pcm[i : i + chunk]
+
+        return PCMStream(chunks())
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+TTS 有序播放微基准
+
+模拟一次包含多段文本的回复：各分段在线程池中并行“合成”（sleep 模拟网络耗时），
+再按序号交给一个假的播放器。分别测量旧的忙等待方案和 OrderedSequencer 方案
+每次回复消耗的 CPU 时间。
+
+用法：
+    python bench/tts_sequencer.py [--segments 8] [--parallel 5] [--rounds 10]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot.Sequencer import OrderedSequencer
+
+
+class FakePlayer(object):
+    def __init__(self):
+        self.played = []
+
+    def play(self, index):
+        self.played.append(index)
+
+
+def synthesize(index, min_ms, max_ms):
+    time.sleep(random.uniform(min_ms, max_ms) / 1000)
+    return index
+
+
+def run_busy_wait(segments, parallel, min_ms, max_ms):
+    """旧方案：每个合成线程自旋等待轮到自己"""
+    player = FakePlayer()
+    state = {"index": 0}
+    lock = threading.Lock()
+
+    def action(index):
+        voice = synthesize(index, min_ms, max_ms)
+        while index != state["index"]:
+            continue
+        with lock:
+            player.play(voice)
+            state["index"] += 1
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        for i in range(segments):
+            pool.submit(action, i)
+    return player.played
+
+
+def run_sequencer(segments, parallel, min_ms, max_ms):
+    """新方案：合成完成后交给重排缓冲区，不等待"""
+    player = FakePlayer()
+    sequencer = OrderedSequencer(lambda index, voice: player.play(voice))
+
+    def action(index):
+        sequencer.put(index, synthesize(index, min_ms, max_ms))
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        for i in range(segments):
+            pool.submit(action, i)
+    return player.played
+
+
+def measure(fn, args, rounds):
+    cpu, wall = [], []
+    for _ in range(rounds):
+        c0, w0 = time.process_time(), time.perf_counter()
+        played = fn(*args)
+        cpu.append((time.process_time() - c0) * 1000)
+        wall.append((time.perf_counter() - w0) * 1000)
+        assert played == list(range(args[0])), f"播放顺序错误：{played}"
+    return sum(cpu) / rounds, sum(wall) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS 有序播放微基准")
+    parser.add_argument("--segments", type=int, default=8, help="每次回复的分段数")
+    parser.add_argument("--parallel", type=int, default=5, help="并行合成数（tts_parallel）")
+    parser.add_argument("--rounds", type=int, default=10, help="重复次数")
+    parser.add_argument("--min-ms", type=float, default=100, help="单段最短合成耗时")
+    parser.add_argument("--max-ms", type=float, default=600, help="单段最长合成耗时")
+    opts = parser.parse_args()
+
+    args = (opts.segments, opts.parallel, opts.min_ms, opts.max_ms)
+    print(
+        f"segments={opts.segments} parallel={opts.parallel} "
+        f"synth={opts.min_ms:.0f}-{opts.max_ms:.0f}ms rounds={opts.rounds}"
+    )
+    for name, fn in [("busy-wait", run_busy_wait), ("sequencer", run_sequencer)]:
+        cpu, wall = measure(fn, args, opts.rounds)
+        print(f"{name:>10s}: CPU {cpu:9.2f} ms/回复, 耗时 {wall:9.2f} ms/回复")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+GPT-SoVITS 流式播放基准
+
+在本机启动一个假的 GPT-SoVITS /tts 服务：先返回 WAV 头，再按固定间隔
+一块一块地“合成”出 PCM 数据（chunked 传输）。分别测量：
+- 整句模式：GPTSoVITSClient.tts() 读完整个响应并写入临时文件后才能开始播放
+- 流式模式：GPTSoVITSClient.tts_stream() + PCMStream，收到第一块 PCM 即可播放
+从发出请求到拿到第一个可播放采样的时间（time-to-first-sample）。
+
+用法：
+    python bench/tts_streaming.py [--audio-ms 4000] [--chunk-ms 200] [--rtf 0.5]
+"""
+import argparse
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot.AudioStream import PCMStream
+from robot.sdk import GPTSoVITSClient
+
+RATE = 32000
+
+
+def wav_header(rate, channels=1, width=2):
+    # 流式 WAV 的数据长度未知，与 GPT-SoVITS 一样写 0
+    return (
+        b"RIFF" + struct.pack("<I", 36) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, rate, rate * channels * width, channels * width, width * 8)
+        + b"data" + struct.pack("<I", 0)
+    )
+
+
+class TrickleServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, audio_ms, chunk_ms, rtf):
+        super().__init__(("127.0.0.1", 0), TrickleHandler)
+        self.audio_ms = audio_ms
+        self.chunk_ms = chunk_ms
+        self.rtf = rtf
+
+
+class TrickleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._write(wav_header(RATE))
+        chunk = b"\0\0" * int(RATE * server.chunk_ms / 1000)
+        sent = 0
+        while sent < server.audio_ms:
+            # 模拟合成耗时：每块音频需要 chunk_ms * rtf 的计算时间
+            time.sleep(server.chunk_ms * server.rtf / 1000)
+            self._write(chunk)
+            sent += server.chunk_ms
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_full(url):
+    start = time.perf_counter()
+    data = GPTSoVITSClient.tts(text="测试", server_url=url)
+    with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+        f.write(data)
+        f.flush()
+    ttfs = (time.perf_counter() - start) * 1000
+    return ttfs, ttfs
+
+
+def run_stream(url):
+    start = time.perf_counter()
+    response = GPTSoVITSClient.tts_stream(text="测试", server_url=url)
+    stream = PCMStream(response.iter_content(chunk_size=4096), close=response.close)
+    ttfs = None
+    for _ in stream:
+        if ttfs is None:
+            ttfs = (time.perf_counter() - start) * 1000
+    path = stream.wait()
+    total = (time.perf_counter() - start) * 1000
+    path and os.remove(path)
+    return ttfs, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPT-SoVITS 流式播放基准")
+    parser.add_argument("--audio-ms", type=float, default=4000, help="每句音频时长")
+    parser.add_argument("--chunk-ms", type=float, default=200, help="服务端每块音频时长")
+    parser.add_argument("--rtf", type=float, default=0.5, help="服务端实时率（合成耗时/音频时长）")
+    parser.add_argument("--rounds", type=int, default=5, help="重复次数")
+    opts = parser.parse_args()
+
+    server = TrickleServer(opts.audio_ms, opts.chunk_ms, opts.rtf)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    print(
+        f"audio={opts.audio_ms:.0f}ms chunk={opts.chunk_ms:.0f}ms "
+        f"rtf={opts.rtf} rounds={opts.rounds}"
+    )
+    for name, fn in [("整句", run_full), ("流式", run_stream)]:
+        results = [fn(url) for _ in range(opts.rounds)]
+        ttfs = statistics.mean(r[0] for r in results)
+        total = statistics.mean(r[1] for r in results)
+        print(f"{name}: 首个采样 {ttfs:8.2f} ms, 下载完成 {total:8.2f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
-from robot import constants, utils
+from robot import constants, utils, TTSCache
 from robot.sdk.AbstractPlugin import AbstractPlugin
 
 
@@ -11,8 +11,10 @@ class Plugin(AbstractPlugin):
 
     def handle(self, text, parsed):
         temp = constants.TEMP_PATH
+        # TTS 缓存目录由缓存自己清理，保证索引与文件一致
+        TTSCache.get_cache().clear()
         for f in os.listdir(temp):
-            if f != "DIR":
+            if f not in ("DIR", os.path.basename(TTSCache.CACHE_PATH)):
                 utils.check_and_delete(os.path.join(temp, f))
         self.say("缓存目录已清空", cache=True)
 
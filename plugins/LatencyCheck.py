@@ -6,6 +6,7 @@
 
 from robot.sdk.AbstractPlugin import AbstractPlugin
 from robot.LatencyMonitor import get_monitor
+from robot.TTSPool import get_pool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,7 +53,8 @@ class Plugin(AbstractPlugin):
             if summary:
                 msg = f"当前共有{summary['total_sessions']}个会话记录，"
                 msg += f"平均总延迟{summary['avg_total_latency']}毫秒，"
-                msg += f"最大延迟{summary['max_total_latency']}毫秒。"
+                msg += f"最大延迟{summary['max_total_latency']}毫秒，"
+                msg += f"百分之九十的会话在{summary['p90_total_latency']}毫秒内完成。"
                 
                 if summary['sessions_over_threshold'] > 0:
                     msg += f"有{summary['sessions_over_threshold']}个会话超过阈值。"
@@ -62,13 +64,20 @@ class Plugin(AbstractPlugin):
                 self.say(msg)
             else:
                 self.say("暂无延迟统计数据")
+        elif "引擎统计" in text:
+            # 查看角色 TTS 引擎池
+            stats = get_pool().stats()
+            msg = f"当前缓存了{stats['engines']}个语音引擎，"
+            msg += f"累计构建{stats['total_constructions']}次，复用{stats['hits']}次。"
+            self.say(msg)
         else:
-            self.say("我可以帮你查看延迟报告、网络状态或延迟统计")
+            self.say("我可以帮你查看延迟报告、网络状态、延迟统计或引擎统计")
     
     def isValid(self, text, parsed):
         """判断是否匹配插件"""
         return any(word in text for word in [
             "延迟报告", "生成报告", 
             "网络状态", "通信状态",
-            "延迟统计", "性能统计"
+            "延迟统计", "性能统计",
+            "引擎统计"
         ])
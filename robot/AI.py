@@ -7,7 +7,7 @@ import requests
 from uuid import getnode as get_mac
 from abc import ABCMeta, abstractmethod
 from robot import logging, config, utils
-from robot.sdk import unit
+from robot.sdk import unit, HttpClient
 
 logger = logging.getLogger(__name__)
 
@@ -196,8 +196,8 @@ class AnyQRobot(AbstractRobot):
         msg = "".join(texts)
         msg = utils.stripPunctuation(msg)
         try:
-            url = f"http://{self.host}:{self.port}/anyq?question={msg}"
-            r = requests.get(url)
+            url = f"http://{self.host}:{self.port}/anyq"
+            r = HttpClient.get(url, params={"question": msg})
             respond = json.loads(r.text)
             logger.info(f"anyq response: {respond}")
             if len(respond) > 0:
@@ -552,7 +552,7 @@ class CozeRobot(AbstractRobot):
                 "Host": "api.coze.cn",
                 "Connection": "keep-alive"
             }
-            r = requests.post(url, headers=headers, json=body)
+            r = HttpClient.post(url, headers=headers, json=body)
             respond = json.loads(r.text)
             result = ""
             logger.info(f"{self.SLUG} 回答：{respond}")
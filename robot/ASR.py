@@ -1,15 +1,82 @@
 # -*- coding: utf-8 -*-
 import json
+import queue
+import threading
 from aip import AipSpeech
-from .sdk import TencentSpeech, AliSpeech, XunfeiSpeech, BaiduSpeech, FunASREngine, VolcengineSpeech
+from .sdk import TencentSpeech, AliSpeech, XunfeiSpeech, BaiduSpeech, FunASREngine, VolcengineSpeech, HttpClient
 from . import utils, config
 from robot import logging
 from abc import ABCMeta, abstractmethod
-import requests
 
 logger = logging.getLogger(__name__)
 
 
+class ASRStream(object):
+    """
+    一次流式识别：录音的同时逐块 feed() 音频，用户说完后 finish() 取结果。
+    音频格式固定为 16kHz、16bit、单声道 PCM（与唤醒录音一致）。
+
+    :param worker: 在后台线程运行的识别函数，参数是音频块的迭代器（
+                   finish 之前会阻塞等待新的音频），返回识别结果
+    :param name: 引擎名称，用于日志
+    """
+
+    def __init__(self, worker, name=""):
+        self.name = name
+        self.queue = queue.Queue()
+        self.result = None
+        self.error = None
+        self.finished = False
+        self.done = threading.Event()
+        threading.Thread(target=self._run, args=(worker,), daemon=True).start()
+
+    def _chunks(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    def _run(self, worker):
+        try:
+            self.result = worker(self._chunks())
+        except Exception as e:
+            logger.error(f"{self.name} 流式识别出错了：{e}", stack_info=True)
+            self.error = e
+        finally:
+            self.done.set()
+
+    def feed(self, chunk):
+        """送入一块录音"""
+        if not self.finished and chunk:
+            self.queue.put(bytes(chunk))
+
+    def finish(self, timeout=10):
+        """
+        结束录音并等待识别结果
+
+        :param timeout: 最长等待时间（秒）
+        :returns: 识别结果，失败或超时返回 None
+        """
+        if not self.finished:
+            self.finished = True
+            self.queue.put(None)
+        if not self.done.wait(timeout):
+            logger.warning(f"{self.name} 流式识别超时")
+            return None
+        if self.error:
+            return None
+        if self.result:
+            logger.info(f"{self.name} 流式识别到了：{self.result}")
+        return self.result
+
+    def cancel(self):
+        """放弃本次识别"""
+        if not self.finished:
+            self.finished = True
+            self.queue.put(None)
+
+
 class AbstractASR(object):
     """
     Generic parent class for all ASR engines
@@ -31,6 +98,14 @@ class AbstractASR(object):
     def transcribe(self, fp):
         pass
 
+    def stream(self):
+        """
+        开始一次流式识别，录音过程中即可把音频送给引擎
+
+        :returns: ASRStream，引擎不支持流式识别时返回 None
+        """
+        return None
+
 
 class AzureASR(AbstractASR):
     """
@@ -52,7 +127,7 @@ class AzureASR(AbstractASR):
         }
 
         self.post_param = {"language": lang, "profanity": "raw"}
-        self.sess = requests.session()
+        self.sess = HttpClient.get_session(self.post_url)
 
     @classmethod
     def get_config(cls):
@@ -180,6 +255,14 @@ class XunfeiASR(AbstractASR):
     def transcribe(self, fp):
         return XunfeiSpeech.transcribe(fp, self.appid, self.api_key, self.api_secret)
 
+    def stream(self):
+        return ASRStream(
+            lambda chunks: XunfeiSpeech.transcribe_stream(
+                chunks, self.appid, self.api_key, self.api_secret
+            ),
+            self.SLUG,
+        )
+
 
 class AliASR(AbstractASR):
     """
@@ -291,6 +374,9 @@ class VolcengineASR(AbstractASR):
             logger.critical(f"{self.SLUG} 语音识别出错了", stack_info=True)
             return ""
 
+    def stream(self):
+        return ASRStream(self.volcengine_asr.execute_stream, self.SLUG)
+
 def get_engine_by_slug(slug=None):
     """
     Returns:
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+常驻麦克风采集服务
+
+进程内只打开一个 PyAudio 输入流（16kHz、16bit、单声道），唤醒检测、
+主动聆听、VAD 等都是它的订阅者：
+- 回调线程把每块录音写入一个共享的环形缓冲区，只拷贝一次
+- 每个订阅者有自己的读取位置，读得慢的订阅者只会丢掉自己最旧的数据
+- 输入流一直保持打开，多轮对话之间不再重复打开设备，也不会丢掉开头的音节
+
+录音来源是可替换的：默认是麦克风（MicrophoneSource），也可以换成按实时
+或加速节奏回放 WAV/PCM 的 ReplaySource，在没有声卡的环境里跑完整的
+唤醒、录音、识别流程。
+"""
+
+import io
+import math
+import threading
+import time
+import wave
+from abc import ABCMeta, abstractmethod
+from collections import deque
+
+from robot import config, logging
+
+logger = logging.getLogger(__name__)
+
+RATE = 16000
+CHANNELS = 1
+SAMPLE_WIDTH = 2
+FRAMES_PER_BUFFER = 512  # 每次回调的帧数（32ms）
+FRAME_BYTES = FRAMES_PER_BUFFER * CHANNELS * SAMPLE_WIDTH
+
+
+def load_pcm(path):
+    """
+    读取录音文件并转换成采集格式（16kHz、16bit、单声道）
+
+    :param path: WAV 文件，或扩展名为 .pcm 的裸 PCM（需已是采集格式）
+    :returns: PCM 字节串
+    """
+    if path.endswith(".pcm"):
+        with open(path, "rb") as f:
+            return f.read()
+    with wave.open(path, "rb") as w:
+        return convert(
+            w.readframes(w.getnframes()), w.getframerate(), w.getnchannels(), w.getsampwidth()
+        )
+
+
+def convert(data, rate, channels, width):
+    """
+    把一整段 PCM 转换成采集格式
+
+    装了 scipy 时用多相滤波重采样（带抗混叠滤波，适合把 44.1k/48k 的
+    录音降到 16k 给 ASR），否则用 AudioEngine.Resampler 的线性插值。
+
+    :param data: PCM 字节串
+    :param rate: 采样率
+    :param channels: 声道数
+    :param width: 采样宽度
+    :returns: 采集格式的 PCM 字节串
+    """
+    from robot.AudioEngine import Resampler, to_int16
+
+    if rate == RATE:
+        return Resampler(rate, channels, width, RATE, CHANNELS).process(data)
+    try:
+        from scipy.signal import resample_poly
+    except ImportError:
+        return Resampler(rate, channels, width, RATE, CHANNELS).process(data)
+    import numpy as np
+
+    data = data[: len(data) - len(data) % (channels * width)]
+    samples = to_int16(data, width).reshape(-1, channels).astype(np.float32).mean(axis=1)
+    gcd = math.gcd(RATE, rate)
+    samples = resample_poly(samples, RATE // gcd, rate // gcd)
+    return np.clip(np.round(samples), -32768, 32767).astype(np.int16).tobytes()
+
+
+def decode(data):
+    """
+    在内存中把上传的音频（WAV，或者 pydub 能解码的格式）转换成采集格式
+
+    :param data: 音频文件的字节串
+    :returns: 采集格式的 PCM 字节串
+    """
+    try:
+        with wave.open(io.BytesIO(data), "rb") as w:
+            return convert(
+                w.readframes(w.getnframes()), w.getframerate(), w.getnchannels(), w.getsampwidth()
+            )
+    except (wave.Error, EOFError):
+        from pydub import AudioSegment
+
+        segment = AudioSegment.from_file(io.BytesIO(data))
+        return convert(
+            segment.raw_data, segment.frame_rate, segment.channels, segment.sample_width
+        )
+
+
+def to_wav(pcm):
+    """把采集格式的 PCM 封装成 WAV 字节串"""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(CHANNELS)
+        w.setsampwidth(SAMPLE_WIDTH)
+        w.setframerate(RATE)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+class AbstractSource(metaclass=ABCMeta):
+    """
+    录音来源，把采集格式的 PCM 一块一块交给采集服务
+    """
+
+    @abstractmethod
+    def start(self, write):
+        """
+        开始采集
+
+        :param write: 每采集到一块录音就调用一次 write(data)
+        """
+        pass
+
+    def close(self):
+        """停止采集"""
+        pass
+
+
+class MicrophoneSource(AbstractSource):
+    """
+    麦克风：PyAudio 回调模式的输入流
+
+    :param device_index: 输入设备序号，None 表示默认设备
+    """
+
+    def __init__(self, device_index=None):
+        self.device_index = device_index
+        self.audio = None
+        self.stream = None
+
+    def start(self, write):
+        import pyaudio
+
+        def callback(in_data, frame_count, time_info, status):
+            write(in_data)
+            return None, pyaudio.paContinue
+
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            format=pyaudio.paInt16,
+            channels=CHANNELS,
+            rate=RATE,
+            input=True,
+            frames_per_buffer=FRAMES_PER_BUFFER,
+            input_device_index=self.device_index,
+            stream_callback=callback,
+        )
+        self.stream.start_stream()
+        logger.info(f"麦克风采集服务已启动：{RATE}Hz，每周期 {FRAMES_PER_BUFFER} 帧")
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.audio.terminate()
+            self.stream = None
+
+
+class ReplaySource(AbstractSource):
+    """
+    回放录音：和麦克风一样每 32ms 交出一帧，按排队的顺序回放录音，
+    队列为空时交出静音
+
+    :param speed: 回放速度倍数，1 为实时；加速回放时录音的时间线整体变快，
+                  端点检测等按音频时长计算的等待也会相应缩短
+    """
+
+    def __init__(self, speed=1):
+        self.interval = FRAMES_PER_BUFFER / RATE / speed
+        self.cond = threading.Condition()
+        self.queue = deque()  # (PCM, 回放完成时设置的 Event)
+        self.offset = 0
+        self.silence = b"\0" * FRAME_BYTES
+        self.running = False
+        self.frames = 0  # 已交出的帧数
+
+    def play(self, pcm):
+        """
+        排队回放一段录音
+
+        :param pcm: 采集格式的 PCM，或录音文件路径（见 load_pcm）
+        :returns: threading.Event，整段录音交出后被设置
+        """
+        if isinstance(pcm, str):
+            pcm = load_pcm(pcm)
+        done = threading.Event()
+        with self.cond:
+            self.queue.append((pcm, done))
+        return done
+
+    def idle(self):
+        """排队的录音是否都已回放完"""
+        with self.cond:
+            return not self.queue
+
+    def _next_frame(self):
+        with self.cond:
+            while self.queue:
+                pcm, done = self.queue[0]
+                frame = pcm[self.offset : self.offset + FRAME_BYTES]
+                self.offset += FRAME_BYTES
+                if self.offset >= len(pcm):
+                    self.queue.popleft()
+                    self.offset = 0
+                    done.set()
+                if frame:
+                    return frame + self.silence[len(frame) :]
+            return self.silence
+
+    def start(self, write):
+        self.running = True
+        threading.Thread(target=self._run, args=(write,), daemon=True).start()
+        logger.info(f"录音回放已启动：每 {self.interval * 1000:.1f}ms 交出一帧")
+
+    def _run(self, write):
+        # 按绝对时间排期，sleep 的误差不会累积
+        deadline = time.perf_counter()
+        while self.running:
+            write(self._next_frame())
+            self.frames += 1
+            deadline += self.interval
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def close(self):
+        self.running = False
+
+
+class Subscription(object):
+    """
+    采集服务的一个订阅者，按自己的进度读取录音
+
+    :param capture: AudioCapture 实例
+    :param cursor: 起始读取位置（累计字节数）
+    """
+
+    def __init__(self, capture, cursor):
+        self.capture = capture
+        self.cursor = cursor
+        self.closed = False
+
+    def __len__(self):
+        """还没读取的字节数"""
+        return self.capture.available(self)
+
+    def read(self, size, timeout=None):
+        """
+        阻塞直到有 size 字节的新录音，读取并返回正好 size 字节
+
+        :param size: 读取的字节数，应为整帧
+        :param timeout: 最长等待时间（秒）
+        :returns: 录音数据，超时或订阅已关闭时返回空字节串
+        """
+        return self.capture.read(self, size, timeout)
+
+    def skip(self):
+        """丢弃所有还没读取的录音，从最新的位置开始读"""
+        self.capture.skip(self)
+
+    def close(self):
+        """取消订阅，正在等待的 read() 会立即返回"""
+        self.capture.close_subscription(self)
+
+
+class AudioCapture(object):
+    """
+    常驻麦克风采集服务
+
+    创建后需调用 start() 开始采集；不启动录音来源、直接调用 write() 写入
+    录音也可以。
+
+    :param buffer_seconds: 共享缓冲区保存多少秒的录音
+    """
+
+    def __init__(self, buffer_seconds=10):
+        frames = int(RATE * buffer_seconds) // FRAMES_PER_BUFFER
+        self.size = frames * FRAME_BYTES
+        self.buf = bytearray(self.size)
+        self.view = memoryview(self.buf)
+        self.position = 0  # 累计写入的字节数
+        self.overruns = 0
+        self.cond = threading.Condition()
+        self.source = None
+
+    def start(self, source=None):
+        """
+        开始采集
+
+        :param source: 录音来源，None 表示默认输入设备上的麦克风
+        """
+        self.source = source or MicrophoneSource()
+        self.source.start(self.write)
+
+    def write(self, data):
+        """写入一块录音，缓冲区满时覆盖最旧的数据"""
+        data = memoryview(data).cast("B")
+        n = len(data)
+        with self.cond:
+            if n > self.size:
+                self.position += n - self.size
+                data = data[n - self.size :]
+                n = self.size
+            start = self.position % self.size
+            first = min(n, self.size - start)
+            self.view[start : start + first] = data[:first]
+            if first < n:
+                self.view[: n - first] = data[first:]
+            self.position += n
+            self.cond.notify_all()
+
+    def subscribe(self, preroll=0, since=None):
+        """
+        订阅录音
+
+        :param preroll: 从多少字节之前的录音开始读，0 表示只读之后的新录音
+        :param since: 预录音最早从哪个位置（见 position）开始，例如播放结束时的位置，
+                      避免把之前的唤醒词或机器人自己的声音读进来；None 表示不限制
+        :returns: Subscription
+        """
+        with self.cond:
+            preroll -= preroll % FRAME_BYTES
+            oldest = max(0, self.position - self.size)
+            if since is not None:
+                oldest = max(oldest, min(since, self.position))
+            return Subscription(self, max(oldest, self.position - preroll))
+
+    def _catch_up(self, sub):
+        """读得太慢的订阅者跳过已被覆盖的数据，调用方需持有锁"""
+        oldest = self.position - self.size
+        if sub.cursor < oldest:
+            self.overruns += 1
+            logger.debug(f"订阅者读取过慢，丢弃 {oldest - sub.cursor} 字节录音")
+            sub.cursor = oldest
+
+    def available(self, sub):
+        with self.cond:
+            self._catch_up(sub)
+            return self.position - sub.cursor
+
+    def read(self, sub, size, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(
+                lambda: sub.closed or self.position - sub.cursor >= size, timeout
+            ) or sub.closed:
+                return b""
+            self._catch_up(sub)
+            start = sub.cursor % self.size
+            first = min(size, self.size - start)
+            if first == size:
+                data = bytes(self.view[start : start + size])
+            else:
+                data = bytes(self.view[start:]) + bytes(self.view[: size - first])
+            sub.cursor += size
+            return data
+
+    def skip(self, sub):
+        with self.cond:
+            sub.cursor = self.position
+
+    def close_subscription(self, sub):
+        with self.cond:
+            sub.closed = True
+            self.cond.notify_all()
+
+    def close(self):
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+
+# 全局单例
+_audio_capture = None
+_audio_capture_lock = threading.Lock()
+
+
+def get_capture():
+    """
+    获取全局麦克风采集服务，第一次调用时打开输入设备
+
+    :returns: AudioCapture 实例
+
+    Raises:
+        打开输入设备失败时抛出 PyAudio 的异常
+    """
+    global _audio_capture
+    if _audio_capture is None:
+        with _audio_capture_lock:
+            if _audio_capture is None:
+                from robot.Player import no_alsa_error
+
+                capture = AudioCapture(
+                    buffer_seconds=config.get("/audio_input/buffer_seconds", 10)
+                )
+                with no_alsa_error():
+                    capture.start(
+                        MicrophoneSource(config.get("/audio_input/device_index", None))
+                    )
+                _audio_capture = capture
+    return _audio_capture
+
+
+def set_capture(capture):
+    """
+    替换全局采集服务，例如换成录音来源为 ReplaySource 的实例
+
+    :param capture: AudioCapture 实例，None 表示下次使用时重新打开麦克风
+    :returns: 原来的采集服务
+    """
+    global _audio_capture
+    with _audio_capture_lock:
+        previous, _audio_capture = _audio_capture, capture
+    return previous
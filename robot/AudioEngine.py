@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+常驻音频输出引擎
+
+进程内只打开一个 PyAudio 输出流（回调模式），所有播放器都是它上面的一个声道：
+- 播放器把解码后的 PCM 写入自己的声道缓冲区，回调线程从各声道取数据混音输出
+- 没有数据时输出静音，输出流始终保持打开，句子之间可以无缝衔接
+- 清空声道后下一个缓冲周期（256 帧 @48kHz 约 5ms）即停止发声
+- 每个音频的结束位置在缓冲区中放一个标记，回调读到标记时交给分发线程执行完成回调
+
+没有声卡时可以用 start_virtual() 以实时或加速的节奏空跑输出回调，
+播放器的行为（排队、完成回调、打断）与真实输出完全一致。
+"""
+
+import io
+import queue
+import threading
+import time
+import wave
+import weakref
+
+from collections import deque
+
+import numpy as np
+
+from pydub import AudioSegment
+from robot import config, logging
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_WIDTH = 2  # 输出固定为 16bit
+
+
+def to_int16(data, width):
+    """
+    把任意采样宽度的 PCM 转成 int16 数组
+
+    :param data: PCM 字节串
+    :param width: 采样宽度（1/2/4 字节）
+    :returns: numpy int16 数组
+    """
+    if width == 2:
+        return np.frombuffer(data, dtype=np.int16)
+    if width == 1:
+        return ((np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8).astype(np.int16)
+    if width == 4:
+        return (np.frombuffer(data, dtype=np.int32) >> 16).astype(np.int16)
+    raise ValueError(f"不支持的采样宽度：{width}")
+
+
+class Resampler(object):
+    """
+    流式 PCM 格式转换：采样宽度转为 16bit，声道数转换，线性插值重采样。
+    可以逐块输入，块之间保持插值的连续性。
+
+    :param src_rate: 输入采样率
+    :param src_channels: 输入声道数
+    :param src_width: 输入采样宽度
+    :param rate: 输出采样率
+    :param channels: 输出声道数
+    """
+
+    def __init__(self, src_rate, src_channels, src_width, rate, channels):
+        self.src_rate, self.src_channels, self.src_width = src_rate, src_channels, src_width
+        self.rate, self.channels = rate, channels
+        self.step = src_rate / rate
+        self.frame_bytes = src_channels * src_width
+        self.remainder = b""  # 不足一帧的尾部字节
+        self.prev = None  # 上一块的最后一帧
+        self.pos = 0.0  # 下一个输出采样在输入中的位置
+
+    def process(self, data):
+        """
+        :param data: 输入 PCM 字节串
+        :returns: 输出 PCM 字节串
+        """
+        data = self.remainder + data
+        usable = len(data) - len(data) % self.frame_bytes
+        self.remainder = data[usable:]
+        if not usable:
+            return b""
+        frames = to_int16(data[:usable], self.src_width).reshape(-1, self.src_channels)
+        if self.src_channels != self.channels:
+            mono = frames.mean(axis=1, keepdims=True)
+            frames = np.repeat(mono, self.channels, axis=1)
+        if self.src_rate == self.rate:
+            return frames.astype(np.int16).tobytes()
+        frames = frames.astype(np.float32)
+        if self.prev is not None:
+            frames = np.concatenate([self.prev, frames])
+        n = len(frames)
+        positions = np.arange(self.pos, n - 1, self.step)
+        index = np.arange(n)
+        out = np.empty((len(positions), self.channels), dtype=np.float32)
+        for c in range(self.channels):
+            out[:, c] = np.interp(positions, index, frames[:, c])
+        self.pos = (positions[-1] + self.step if len(positions) else self.pos) - (n - 1)
+        self.prev = frames[-1:]
+        return np.clip(out, -32768, 32767).astype(np.int16).tobytes()
+
+
+def decode(src, rate, channels):
+    """
+    把音频文件解码成引擎的 PCM 格式
+
+    :param src: 音频文件路径或 URL
+    :param rate: 输出采样率
+    :param channels: 输出声道数
+    :returns: PCM 字节串
+    """
+    if src.startswith("http"):
+        from robot.sdk import HttpClient
+
+        r = HttpClient.get(src, timeout=30)
+        r.raise_for_status()
+        src = io.BytesIO(r.content)
+        segment = AudioSegment.from_file(src)
+        data, src_rate, src_channels, width = (
+            segment.raw_data, segment.frame_rate, segment.channels, segment.sample_width
+        )
+    elif src.endswith(".wav"):
+        with wave.open(src, "rb") as f:
+            data = f.readframes(f.getnframes())
+            src_rate, src_channels, width = f.getframerate(), f.getnchannels(), f.getsampwidth()
+    else:
+        segment = AudioSegment.from_file(src)
+        data, src_rate, src_channels, width = (
+            segment.raw_data, segment.frame_rate, segment.channels, segment.sample_width
+        )
+    return Resampler(src_rate, src_channels, width, rate, channels).process(data)
+
+
+class Channel(object):
+    """
+    输出引擎上的一个声道（每个播放器一个）
+
+    :param capacity: 缓冲区最多保存多少字节，写满后写入方阻塞
+    """
+
+    def __init__(self, capacity):
+        self.cond = threading.Condition()
+        self.buffers = deque()  # PCM 字节串或完成标记（可调用对象）
+        self.offset = 0  # 第一个字节串已经读到的位置
+        self.size = 0
+        self.capacity = capacity
+        self.generation = 0  # 每次清空后加一，旧的写入会被丢弃
+        self.paused = False
+
+    def write(self, data, generation):
+        """
+        写入 PCM 数据，缓冲区满时阻塞
+
+        :returns: False 表示声道已被清空，应停止写入
+        """
+        with self.cond:
+            self.cond.wait_for(
+                lambda: self.size < self.capacity or generation != self.generation
+            )
+            if generation != self.generation:
+                return False
+            if data:
+                self.buffers.append(data)
+                self.size += len(data)
+            return True
+
+    def mark(self, callback, generation):
+        """在当前写入位置放一个完成标记，播放到这里时执行 callback"""
+        with self.cond:
+            if generation == self.generation:
+                self.buffers.append(callback)
+
+    def clear(self):
+        """丢弃所有未播放的数据和标记"""
+        with self.cond:
+            self.generation += 1
+            self.buffers.clear()
+            self.offset = 0
+            self.size = 0
+            self.cond.notify_all()
+
+    def read(self, nbytes):
+        """
+        供回调线程读取数据
+
+        :returns: (PCM 字节串，可能不足 nbytes；没有数据时为 None, 读到的完成标记列表)
+        """
+        markers = []
+        with self.cond:
+            if self.paused or not self.buffers:
+                return None, markers
+            out = bytearray()
+            while self.buffers and len(out) < nbytes:
+                head = self.buffers[0]
+                if callable(head):
+                    markers.append(self.buffers.popleft())
+                    continue
+                take = head[self.offset : self.offset + nbytes - len(out)]
+                out += take
+                self.offset += len(take)
+                if self.offset >= len(head):
+                    self.buffers.popleft()
+                    self.offset = 0
+            while self.buffers and callable(self.buffers[0]):
+                markers.append(self.buffers.popleft())
+            if out:
+                self.size -= len(out)
+                self.cond.notify_all()
+            return (bytes(out) if out else None), markers
+
+
+class AudioEngine(object):
+    """
+    常驻音频输出引擎，创建后需调用 start() 或 start_virtual() 开始输出
+
+    :param rate: 输出采样率
+    :param channels: 输出声道数
+    :param frames_per_buffer: 每个缓冲周期的帧数
+    :param buffer_ms: 每个声道最多缓冲多少毫秒的音频
+    """
+
+    def __init__(self, rate=48000, channels=1, frames_per_buffer=256, buffer_ms=2000):
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.frame_size = channels * SAMPLE_WIDTH
+        self.capacity = int(rate * buffer_ms / 1000) * self.frame_size
+        self.silence = b"\0" * (frames_per_buffer * self.frame_size)
+        self.voices = weakref.WeakSet()  # 当前所有声道，播放器被回收后自动移除
+        self.callbacks = queue.Queue()
+        self.underruns = 0
+        self.audio = None
+        self.stream = None
+        self.running = False
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def start(self, device_index=None):
+        """
+        打开输出设备
+
+        :param device_index: 输出设备序号，None 表示默认设备
+        """
+        import pyaudio
+
+        self._continue = pyaudio.paContinue
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            format=pyaudio.paInt16,
+            channels=self.channels,
+            rate=self.rate,
+            output=True,
+            frames_per_buffer=self.frames_per_buffer,
+            output_device_index=device_index,
+            stream_callback=self._callback,
+        )
+        self.stream.start_stream()
+        logger.info(
+            f"音频输出引擎已启动：{self.rate}Hz，{self.channels} 声道，每周期 {self.frames_per_buffer} 帧"
+        )
+
+    def start_virtual(self, speed=1, sink=None):
+        """
+        不打开输出设备，由一个线程按输出设备的节奏调用回调
+
+        :param speed: 输出速度倍数，1 为实时
+        :param sink: 每个缓冲周期的输出都会交给 sink(data)，None 表示丢弃
+        """
+        self._continue = None
+        self.running = True
+        threading.Thread(target=self._virtual_loop, args=(speed, sink), daemon=True).start()
+        logger.info(f"虚拟音频输出已启动：{self.rate}Hz，{speed} 倍速")
+
+    def _virtual_loop(self, speed, sink):
+        interval = self.frames_per_buffer / self.rate / speed
+        # 按绝对时间排期，sleep 的误差不会累积
+        deadline = time.perf_counter()
+        while self.running:
+            out, _ = self._callback(None, self.frames_per_buffer, None, 0)
+            sink and sink(out)
+            deadline += interval
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def open_channel(self):
+        """创建一个新的声道"""
+        channel = Channel(self.capacity)
+        self.voices.add(channel)
+        return channel
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        nbytes = frame_count * self.frame_size
+        if status:
+            self.underruns += 1
+        mixed = None
+        single = None
+        try:
+            for channel in list(self.voices):
+                data, markers = channel.read(nbytes)
+                for marker in markers:
+                    self.callbacks.put(marker)
+                if not data:
+                    continue
+                if mixed is None and single is None:
+                    single = data
+                    continue
+                if mixed is None:
+                    mixed = self._samples(single, nbytes)
+                mixed += self._samples(data, nbytes)
+        except Exception as e:
+            logger.error(f"音频输出回调异常：{e}")
+        if mixed is not None:
+            out = np.clip(mixed, -32768, 32767).astype(np.int16).tobytes()
+        elif single is not None:
+            out = single + self.silence[: nbytes - len(single)]
+        else:
+            out = self.silence[:nbytes]
+        return (out, self._continue)
+
+    def _samples(self, data, nbytes):
+        samples = np.zeros(nbytes // SAMPLE_WIDTH, dtype=np.int32)
+        pcm = np.frombuffer(data, dtype=np.int16)
+        samples[: len(pcm)] = pcm
+        return samples
+
+    def _dispatch(self):
+        """在独立线程中执行完成回调，避免阻塞音频回调"""
+        while True:
+            callback = self.callbacks.get()
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"播放完成回调异常：{e}", stack_info=True)
+
+    def close(self):
+        self.running = False
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.audio.terminate()
+            self.stream = None
+
+
+# 全局单例
+_audio_engine = None
+_audio_engine_failed = False
+_audio_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    获取全局音频输出引擎
+
+    :returns: AudioEngine 实例，PyAudio 不可用或打开输出设备失败时返回 None
+    """
+    global _audio_engine, _audio_engine_failed
+    if _audio_engine is None and not _audio_engine_failed:
+        with _audio_engine_lock:
+            if _audio_engine is None and not _audio_engine_failed:
+                try:
+                    from robot.Player import no_alsa_error
+
+                    engine = AudioEngine(
+                        rate=config.get("/audio_output/rate", 48000),
+                        channels=config.get("/audio_output/channels", 1),
+                        frames_per_buffer=config.get("/audio_output/frames_per_buffer", 256),
+                    )
+                    with no_alsa_error():
+                        engine.start(config.get("/audio_output/device_index", None))
+                    _audio_engine = engine
+                except Exception as e:
+                    logger.warning(f"音频输出引擎启动失败，改用 sox 播放：{e}")
+                    _audio_engine_failed = True
+    return _audio_engine
+
+
+def set_engine(engine):
+    """
+    替换全局音频输出引擎，例如换成 start_virtual() 启动的实例
+
+    :param engine: AudioEngine 实例，None 表示下次使用时重新打开输出设备
+    :returns: 原来的输出引擎
+    """
+    global _audio_engine, _audio_engine_failed
+    with _audio_engine_lock:
+        previous, _audio_engine = _audio_engine, engine
+        _audio_engine_failed = False
+    return previous
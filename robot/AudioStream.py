@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+边下载边播放的音频流
+
+在线 TTS 以流式（chunked）返回 WAV 时，后台线程逐块读取 HTTP 响应：
+- 解析 WAV 头得到采样率、声道数和采样宽度
+- 把 PCM 数据块保存在内存中，播放器可以在下载完成前开始消费
+- 同时把数据写入 TEMP_PATH 下的临时 WAV 文件，下载完成后可以直接放进
+  TTS 缓存，未缓存时也能通过后台管理端的 /audio/ 链接访问
+"""
+
+import os
+import struct
+import tempfile
+import threading
+import time
+import wave
+
+from robot import constants, logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_wav_header(data):
+    """
+    解析 WAV 头
+
+    :param data: 以 RIFF 头开始的字节串
+    :returns: ((采样率, 声道数, 采样宽度), data 块起始偏移)，数据不足时返回 (None, None)
+
+    Raises:
+        ValueError if data is not a WAV stream
+    """
+    if len(data) < 12:
+        return None, None
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("不是 WAV 格式的音频流")
+    offset, fmt = 12, None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset : offset + 4]
+        (chunk_size,) = struct.unpack("<I", data[offset + 4 : offset + 8])
+        if chunk_id == b"data":
+            return fmt, offset + 8
+        if chunk_id == b"fmt ":
+            if offset + 8 + 16 > len(data):
+                return None, None
+            _, channels, rate, _, _, bits = struct.unpack(
+                "<HHIIHH", data[offset + 8 : offset + 24]
+            )
+            fmt = (rate, channels, bits // 8)
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return None, None
+
+
+class PCMStream(object):
+    """
+    边下载边播放的 PCM 音频流
+
+    :param chunks: 音频数据块的迭代器（WAV 格式，例如 response.iter_content()）
+    :param close: 下载结束或取消时调用的清理函数，例如 response.close，
+                  取消时立即调用，正在阻塞读取的下载线程随之结束
+    """
+
+    def __init__(self, chunks, close=None):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.format = None  # (采样率, 声道数, 采样宽度)
+        self.path = None
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.start_time = time.time()
+        self.first_chunk_time = None
+        self._close = close
+        self.thread = threading.Thread(target=self._pump, args=(chunks,), daemon=True)
+        self.thread.start()
+
+    def _pump(self, chunks):
+        header = b""
+        writer = None
+        tmpfile = None
+        try:
+            for chunk in chunks:
+                if self.cancelled:
+                    break
+                if not chunk:
+                    continue
+                if writer is None:
+                    header += chunk
+                    fmt, offset = parse_wav_header(header)
+                    if offset is None:
+                        continue
+                    if fmt is None:
+                        raise ValueError("WAV 头缺少 fmt 块")
+                    tmpfile = tempfile.NamedTemporaryFile(
+                        suffix=".wav", dir=constants.TEMP_PATH, delete=False
+                    )
+                    writer = wave.open(tmpfile, "wb")
+                    writer.setframerate(fmt[0])
+                    writer.setnchannels(fmt[1])
+                    writer.setsampwidth(fmt[2])
+                    with self.cond:
+                        self.format = fmt
+                    chunk = header[offset:]
+                    if not chunk:
+                        continue
+                writer.writeframesraw(chunk)
+                with self.cond:
+                    if self.first_chunk_time is None:
+                        self.first_chunk_time = time.time()
+                    self.chunks.append(chunk)
+                    self.cond.notify_all()
+        except Exception as e:
+            if not self.cancelled:
+                logger.error(f"音频流读取失败：{e}")
+                self.error = e
+        finally:
+            if writer:
+                writer.close()
+                tmpfile.close()
+            complete = writer and not self.error and not self.cancelled
+            if tmpfile and not complete:
+                # 不完整的音频不保留
+                try:
+                    os.remove(tmpfile.name)
+                except OSError:
+                    pass
+            with self.cond:
+                if complete:
+                    self.path = tmpfile.name
+                self.done = True
+                self.cond.notify_all()
+            self._release()
+
+    def _release(self):
+        """只调用一次清理函数"""
+        with self.cond:
+            close, self._close = self._close, None
+        close and close()
+
+    def wait_format(self, timeout=None):
+        """
+        等待 WAV 头解析完成
+
+        :returns: (采样率, 声道数, 采样宽度)，流在此之前结束则返回 None
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.format or self.done, timeout)
+            return self.format
+
+    def __iter__(self):
+        """从头依次返回 PCM 数据块，下载完成前会阻塞等待新的数据"""
+        index = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(
+                    lambda: index < len(self.chunks) or self.done or self.cancelled
+                )
+                if self.cancelled or index >= len(self.chunks):
+                    return
+                chunk = self.chunks[index]
+            index += 1
+            yield chunk
+
+    def wait(self, timeout=None):
+        """
+        等待下载完成
+
+        :returns: 完整音频的临时文件路径，失败或被取消时返回 None
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.done, timeout)
+            return self.path
+
+    def cancel(self):
+        """取消下载，已经在等待的消费者会立即返回，HTTP 响应随即关闭"""
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+        self._release()
+
+    def __str__(self):
+        return self.path or f"<PCMStream {id(self):x}>"
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import re
+import time
 import traceback
 
 from robot import config
 from robot import logging
+from robot.LatencyMonitor import get_monitor
 from . import plugin_loader
 
 logger = logging.getLogger(__name__)
@@ -62,12 +64,20 @@ class Brain(object):
         parsed -- ULU解析出来的结果
         """
 
+        start = time.time()
+        matched = False
         for plugin in self.plugins:
             if not self.isValid(plugin, text, parsed) and not self.isImmersive(
                 plugin, text, parsed
             ):
                 continue
 
+            if not matched:
+                # 只统计找到第一个命中技能所花的时间
+                matched = True
+                get_monitor().record_latency(
+                    "plugin_match_latency", (time.time() - start) * 1000
+                )
             logger.info(f"'{text}' 命中技能 {plugin.SLUG}")
             self.conversation.matchPlugin = plugin.SLUG
 
@@ -94,6 +104,10 @@ class Brain(object):
                 if not continueHandle:
                     return True
 
+        if not matched:
+            get_monitor().record_latency(
+                "plugin_match_latency", (time.time() - start) * 1000
+            )
         logger.debug(f"No plugin was able to handle phrase {text} ")
         return False
 
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+TTS 缓存预热
+
+扫描插件源码中所有 say(..., cache=True) 的固定话术，为 CharacterVoice 中的
+每个角色语音预先合成并写入 TTS 缓存，使这些话术第一次被说出时就能命中缓存。
+
+用法：
+    python wukong.py warmup
+"""
+
+import ast
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from robot import config, constants, logging, utils, CharacterVoice
+from robot.TTSCache import get_cache
+from robot.TTSPool import get_pool, DEFAULT_KEY
+
+logger = logging.getLogger(__name__)
+
+
+def _literal(node):
+    """
+    取出只由常量组成的字符串表达式的值
+
+    :param node: ast 节点
+    :returns: 字符串，无法在静态分析时确定的返回 None
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if not (isinstance(value, ast.Constant) and isinstance(value.value, str)):
+                return None
+            parts.append(value.value)
+        return "".join(parts)
+    return None
+
+
+def _is_cached_say(node):
+    """判断是否是一次 say(..., cache=True) 调用"""
+    func = node.func
+    name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+    if name != "say" or not node.args:
+        return False
+    for keyword in node.keywords:
+        if keyword.arg == "cache":
+            return isinstance(keyword.value, ast.Constant) and keyword.value.value is True
+    return (
+        len(node.args) > 1
+        and isinstance(node.args[1], ast.Constant)
+        and node.args[1].value is True
+    )
+
+
+def scan_file(path):
+    """
+    扫描单个源码文件中的固定话术
+
+    :param path: 源码路径
+    :returns: 话术列表
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError, ValueError) as e:
+        logger.warning(f"无法解析 {path}：{e}")
+        return []
+    phrases = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and _is_cached_say(node):
+            text = _literal(node.args[0])
+            if text:
+                phrases.append(text)
+    return phrases
+
+
+def collect_phrases():
+    """
+    收集所有需要预热的分句
+
+    :returns: 去重后的分句列表，与 Conversation.say 的切分方式一致
+    """
+    files = [os.path.join(constants.LIB_PATH, "Conversation.py")]
+    for plugin_dir in (constants.PLUGIN_PATH, constants.CONTRIB_PATH, constants.CUSTOM_PATH):
+        if not os.path.isdir(plugin_dir):
+            continue
+        for root, _, names in os.walk(plugin_dir):
+            files.extend(os.path.join(root, name) for name in names if name.endswith(".py"))
+    lines = []
+    for path in files:
+        for phrase in scan_file(path):
+            for line in utils.splitSentences(phrase):
+                if line not in lines:
+                    lines.append(line)
+    return lines
+
+
+def _voices():
+    """所有角色语音配置，按引擎身份去重"""
+    voices = dict(CharacterVoice.CHARACTER_VOICE_MAP)
+    voices[DEFAULT_KEY] = CharacterVoice.DEFAULT_VOICE
+    engines, seen = [], set()
+    for name, voice_config in voices.items():
+        try:
+            engine = get_pool().get(name, voice_config)
+        except Exception as e:
+            logger.warning(f"角色 {name} 的 TTS 引擎创建失败，跳过预热：{e}")
+            continue
+        if engine.cache_namespace() in seen:
+            continue
+        seen.add(engine.cache_namespace())
+        engines.append((name, engine))
+    return engines
+
+
+def warmup(phrases=None):
+    """
+    为每个角色语音预先合成固定话术
+
+    :param phrases: 要预热的分句，默认扫描插件源码
+    :returns: 统计信息 {"phrases": 分句数, "voices": 音色数, "cached": 已缓存数, "rendered": 新合成数, "failed": 失败数}
+    """
+    phrases = collect_phrases() if phrases is None else phrases
+    engines = _voices()
+    cache = get_cache()
+    stats = {"phrases": len(phrases), "voices": len(engines), "cached": 0, "rendered": 0, "failed": 0}
+    logger.info(f"开始预热 TTS 缓存：{len(phrases)} 句话术，{len(engines)} 个音色")
+
+    def render(name, engine, line):
+        if cache.get(line, engine):
+            return "cached"
+        try:
+            voice = engine.get_speech(line)
+        except Exception as e:
+            logger.warning(f"角色 {name} 合成失败：{line}，{e}")
+            voice = None
+        if not voice:
+            return "failed"
+        cache.put(voice, line, engine)
+        return "rendered"
+
+    with ThreadPoolExecutor(max_workers=config.get("tts_parallel", 5)) as pool:
+        tasks = [
+            pool.submit(render, name, engine, line)
+            for name, engine in engines
+            for line in phrases
+        ]
+        for task in tasks:
+            stats[task.result()] += 1
+
+    logger.info(
+        f"TTS 缓存预热完成：新合成 {stats['rendered']} 条，已缓存 {stats['cached']} 条，失败 {stats['failed']} 条"
+    )
+    return stats
@@ -9,7 +9,9 @@ import os
 import threading
 import traceback
 
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 
 from snowboy import snowboydecoder
 
@@ -20,10 +22,10 @@ from robot.sdk import History
 #from .sdk.VoiceProcessor import SileroPerception
 from robot.sdk.TencentSpeech import TencentSpeech
 from robot.sdk.SpeakerID import SpeakerEncoder
-from robot import CharacterVoice
 from robot import (
     AI,
     ASR,
+    AudioCapture,
     config,
     constants,
     logging,
@@ -32,86 +34,208 @@ from robot import (
     statistic,
     TTS,
     utils,
+    VAD,
 )
 from robot.LatencyMonitor import get_monitor
+from robot.Sequencer import PlaybackRound
+from robot.Session import Session
+from robot.TTSCache import get_cache
+from robot.TTSPool import get_pool
 
 
 logger = logging.getLogger(__name__)
 
 
+def _session_attr(name):
+    """把对话状态委托给当前线程正在处理的会话（见 Session）"""
+    return property(
+        lambda self: getattr(self.session, name),
+        lambda self, value: setattr(self.session, name, value),
+    )
+
+
 class Conversation(object):
+    # 以下状态属于当前线程正在处理的会话，多个客户端同时对话时互不影响
+    ai = _session_attr("ai")
+    tts = _session_attr("tts")
+    player = _session_attr("player")
+    onSay = _session_attr("onSay")
+    onStream = _session_attr("onStream")
+    current_session_id = _session_attr("current_session_id")
+    current_user_context = _session_attr("current_user_context")
+    immersiveMode = _session_attr("immersiveMode")
+    matchPlugin = _session_attr("matchPlugin")
+    hasPardon = _session_attr("hasPardon")
+
     def __init__(self, profiling=False):
-        self.brain, self.asr, self.ai, self.tts, self.nlu = None, None, None, None, None
+        self.local = threading.local()
+        self.default_session = Session(play_segment=self._playSegment)
+        self.sessions = OrderedDict()  # 客户端的会话，按最近使用排序
+        self.sessions_lock = threading.Lock()
+        self.brain, self.asr, self.nlu, self.default_tts = None, None, None, None
         self.reInit()
         self.scheduler = Scheduler(self)
         # 历史会话消息
         self.history = History.History()
-        # 沉浸模式，处于这个模式下，被打断后将自动恢复这个技能
-        self.matchPlugin = None
-        self.immersiveMode = None
         self.isRecording = False
         self.profiling = profiling
-        self.onSay = None
-        self.onStream = None
-        self.hasPardon = False
-        self.player = Player.SoxPlayer()
         self.lifeCycleHandler = LifeCycleHandler(self)
-        self.tts_count = 0
-        self.tts_index = 0
-        self.tts_lock = threading.Lock()
-        self.play_lock = threading.Lock()
         #self.perception = SileroPerception()
         self.vads_threshold = 0.8 # 降低静音截断阈值，实现“停顿即截”
         self.streaming_mode = True # 开启流式模式
         self.speaker_id = SpeakerEncoder() # 初始化声纹识别模块
-        self.current_user_context = None # 当前用户画像
-        self.default_tts = None # 保存默认的TTS引擎                
         self.latency_monitor = get_monitor() # 延迟监控器
-        self.current_session_id = None # 当前会话ID
-    def _lastCompleted(self, index, onCompleted):
-        # logger.debug(f"{index}, {self.tts_index}, {self.tts_count}")
-        if index >= self.tts_count - 1:
-            # logger.debug(f"执行onCompleted")
-            onCompleted and onCompleted()
-
-    def _ttsAction(self, msg, cache, index, onCompleted=None):
+        self.tts_cache = get_cache() # TTS 语音缓存
+        self.tts_pool = get_pool() # 按角色复用的 TTS 引擎池
+        self.active_listener = None # 复用的主动聆听检测器，避免每轮重新加载模型
+        self.active_listener_model = None
+
+    @property
+    def session(self):
+        """当前线程正在处理的会话，没有绑定时为本机的默认会话"""
+        return getattr(self.local, "session", None) or self.default_session
+
+    @contextmanager
+    def use_session(self, session):
+        """with 块中当前线程的对话状态都属于 session"""
+        previous = getattr(self.local, "session", None)
+        self.local.session = session
+        try:
+            yield session
+        finally:
+            self.local.session = previous
+
+    def bind(self, session, fn):
+        """包装回调，使其在播放器等其他线程中执行时也属于 session"""
+        if fn is None:
+            return None
+
+        def wrapper(*args, **kwargs):
+            with self.use_session(session):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    def get_session(self, key):
+        """
+        按客户端或 UUID 取得会话，不存在时创建
+
+        :param key: 会话标识，None 表示本机的默认会话
+        :returns: Session
+        """
+        if key is None:
+            return self.default_session
+        with self.sessions_lock:
+            session = self.sessions.get(key)
+            if session is not None:
+                self.sessions.move_to_end(key)
+                return session
+            try:
+                # 对话机器人保存了上下文，每个客户端各用一个
+                ai = AI.get_robot_by_slug(config.get("robot", "tuling"))
+            except Exception as e:
+                logger.error(f"为会话 {key} 创建对话机器人失败，使用默认的：{e}")
+                ai = self.default_session.ai
+            session = Session(
+                key,
+                ai=ai,
+                tts=self.default_session.tts,
+                player=Player.get_player(),
+                play_segment=self._playSegment,
+            )
+            self.sessions[key] = session
+            evicted = []
+            while len(self.sessions) > config.get("/server/max_sessions", 20):
+                evicted.append(self.sessions.popitem(last=False)[1])
+        for old in evicted:
+            logger.info(f"会话数超过上限，关闭最久未使用的会话 {old.key}")
+            old.close()
+        return session
+
+    def close_session(self, key):
+        """客户端离开时关闭它的会话"""
+        with self.sessions_lock:
+            session = self.sessions.pop(key, None)
+        session and session.close()
+
+    def _resetSegments(self, session):
+        """开始新一轮分段播放，调用方需持有 session.tts_lock"""
+        session.sequencer.reset()
+        with session.completed_lock:
+            session.first_audio_pending = True
+            session.segment_end_time = None
+
+    def _lastCompleted(self, session, index, playback):
+        with session.completed_lock:
+            session.segment_end_time = time.time()
+        playback.played(index)
+
+    def _playSegment(self, session, index, segment):
+        voice, cache, playback = segment
+        if session.current_session_id:
+            if session.first_audio_pending:
+                session.first_audio_pending = False
+                self.latency_monitor.mark_stage(session.current_session_id, "first_audio")
+            elif session.segment_end_time and not session.player.is_playing():
+                # 播放器已经空闲，说明这一段没能及时合成，出现了句间断音
+                gap = (time.time() - session.segment_end_time) * 1000
+                self.latency_monitor.record_gap(session.current_session_id, gap)
+        logger.info(f"即将播放第{index}段TTS：{voice}")
+        session.player.play(
+            voice,
+            not cache,
+            onCompleted=lambda: self._lastCompleted(session, index, playback),
+        )
+        playback.delivered(index)
+
+    def _ttsAction(self, session, msg, cache, index, playback):
         if msg:
-            voice = ""
-            if utils.getCache(msg):
+            # 合成过程中可能切换角色语音，固定使用当前这一个引擎
+            tts = session.tts
+            voice = self.tts_cache.get(msg, tts)
+            if voice:
                 logger.info(f"第{index}段TTS命中缓存，播放缓存语音")
-                voice = utils.getCache(msg)
-                while index != self.tts_index:
-                    # 阻塞直到轮到这个音频播放
-                    continue
-                with self.play_lock:
-                    self.player.play(
-                        voice,
-                        not cache,
-                        onCompleted=lambda: self._lastCompleted(index, onCompleted),
-                    )
-                    self.tts_index += 1
-                return voice
+                cache = True  # 缓存文件播放后不能删除
+            elif getattr(tts, "streaming", False):
+                return self._ttsStreamAction(session, tts, msg, cache, index, playback)
             else:
                 try:
-                    voice = self.tts.get_speech(msg)
+                    voice = tts.get_speech(msg)
                     logger.info(f"第{index}段TTS合成成功。msg: {msg}")
-                    while index != self.tts_index:
-                        # 阻塞直到轮到这个音频播放
-                        continue
-                    with self.play_lock:
-                        logger.info(f"即将播放第{index}段TTS。msg: {msg}")
-                        self.player.play(
-                            voice,
-                            not cache,
-                            onCompleted=lambda: self._lastCompleted(index, onCompleted),
-                        )
-                        self.tts_index += 1
-                    return voice
+                    if voice and cache:
+                        voice = self.tts_cache.put(voice, msg, tts)
                 except Exception as e:
                     logger.error(f"语音合成失败：{e}", stack_info=True)
-                    self.tts_index += 1
                     traceback.print_exc()
-                    return None
+                    voice = None
+                if not voice:
+                    self.latency_monitor.record_error("tts", tts.SLUG)
+                    self.tts_pool.discard(tts)
+            # 交给调度器按序播放，不必在这里等待前面的分段
+            session.sequencer.put(index, (voice, cache, playback) if voice else None)
+            return voice
+        session.sequencer.put(index, None)
+        return None
+
+    def _ttsStreamAction(self, session, tts, msg, cache, index, playback):
+        """
+        流式合成：收到响应头就把音频流交给调度器，播放器边下载边播放，
+        下载完成后再把完整的音频写入缓存
+        """
+        stream = tts.get_speech_stream(msg)
+        session.sequencer.put(index, (stream, cache, playback) if stream else None)
+        if not stream:
+            self.latency_monitor.record_error("tts", tts.SLUG)
+            self.tts_pool.discard(tts)
+            return None
+        voice = stream.wait()
+        if stream.error:
+            self.latency_monitor.record_error("tts", tts.SLUG)
+            self.tts_pool.discard(tts)
+        logger.info(f"第{index}段TTS流式合成完成。msg: {msg}")
+        if voice and cache:
+            voice = self.tts_cache.put(voice, msg, tts)
+        return voice
 
     def getHistory(self):
         return self.history
@@ -124,17 +248,24 @@ class Conversation(object):
 
     def reInit(self):
         """重新初始化"""
+        session = self.default_session
         try:
             self.asr = ASR.get_engine_by_slug(config.get("asr_engine", "tencent-asr"))
-            self.ai = AI.get_robot_by_slug(config.get("robot", "tuling"))
-            self.tts = TTS.get_engine_by_slug(config.get("tts_engine", "baidu-tts"))
-            self.default_tts = self.tts  # 保存默认TTS引擎
+            session.ai = AI.get_robot_by_slug(config.get("robot", "tuling"))
+            session.tts = TTS.get_engine_by_slug(config.get("tts_engine", "baidu-tts"))
+            self.default_tts = session.tts  # 保存默认TTS引擎
             self.nlu = NLU.get_engine_by_slug(config.get("nlu_engine", "unit"))
-            self.player = Player.SoxPlayer()
+            session.player = Player.get_player()
             self.brain = Brain(self)
             self.brain.printPlugins()
         except Exception as e:
             logger.critical(f"对话初始化失败：{e}", stack_info=True)
+        # 客户端的会话用的还是旧的引擎，关闭后按新配置重新创建
+        with self.sessions_lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for old in sessions:
+            old.close()
 
     def checkRestore(self):
         if self.immersiveMode:
@@ -158,7 +289,8 @@ class Conversation(object):
         if not UUID or UUID == "" or UUID == "null":
             UUID = str(uuid.uuid1())
         self.current_session_id = UUID
-        tracker = self.latency_monitor.start_session(UUID)
+        # 语音对话的会话已在 doConverse 中开始，接着记录后续阶段
+        tracker = self.latency_monitor.get_session(UUID) or self.latency_monitor.start_session(UUID)
         
         statistic.report(1)
         self.interrupt()
@@ -190,11 +322,18 @@ class Conversation(object):
                 self.player.stop()
             else:
                 # 没命中技能，使用机器人回复
-                if self.ai.SLUG == "openai":
-                    stream = self.ai.stream_chat(query)
+                streaming = self.ai.SLUG == "openai" or getattr(self.ai, "streaming", False)
+                try:
+                    if streaming:
+                        stream = self.ai.stream_chat(query)
+                    else:
+                        msg = self.ai.chat(query, parsed)
+                except Exception:
+                    self.latency_monitor.record_error("ai", self.ai.SLUG)
+                    raise
+                if streaming:
                     self.stream_say(stream, True, onCompleted=self.checkRestore)
                 else:
-                    msg = self.ai.chat(query, parsed)
                     self.say(msg, True, onCompleted=self.checkRestore)
         else:
             # 命中技能
@@ -202,7 +341,9 @@ class Conversation(object):
                 if self.player:
                     if self.player.is_playing():
                         logger.debug("等说完再checkRestore")
-                        self.player.appendOnCompleted(lambda: self.checkRestore())
+                        self.player.appendOnCompleted(
+                            self.bind(self.session, self.checkRestore)
+                        )
                 else:
                     logger.debug("checkRestore")
                     self.checkRestore()
@@ -223,7 +364,21 @@ class Conversation(object):
     def getImmersiveMode(self):
         return self.immersiveMode
 
-    def converse(self, fp, callback=None):
+    def createASRStream(self):
+        """
+        为即将开始的录音创建一次流式识别
+
+        :returns: ASRStream，未开启流式识别或引擎不支持时返回 None
+        """
+        if not config.get("asr_streaming", True) or not self.asr:
+            return None
+        try:
+            return self.asr.stream()
+        except Exception as e:
+            logger.warning(f"创建流式识别失败，改为录音结束后识别：{e}")
+            return None
+
+    def converse(self, fp, callback=None, asr_stream=None):
         """核心对话逻辑"""
         logger.info("结束录音")
         self.lifeCycleHandler.onThink()
@@ -232,7 +387,7 @@ class Conversation(object):
             logger.info("性能调试已打开")
             pr = cProfile.Profile()
             pr.enable()
-            self.doConverse(fp, callback)
+            self.doConverse(fp, callback, asr_stream=asr_stream)
             pr.disable()
             s = io.StringIO()
             sortby = "cumulative"
@@ -240,9 +395,9 @@ class Conversation(object):
             ps.print_stats()
             print(s.getvalue())
         else:
-            self.doConverse(fp, callback)
+            self.doConverse(fp, callback, asr_stream=asr_stream)
 
-    def doConverse(self, fp, callback=None, onSay=None, onStream=None):
+    def doConverse(self, fp, callback=None, onSay=None, onStream=None, asr_stream=None):
         self.interrupt()
         
         # 启动会话（如果还没启动）
@@ -252,21 +407,27 @@ class Conversation(object):
 
         # --- [成员2] 插入点：在 ASR 之前或同时进行声纹识别 ---
         # 建议使用线程异步执行，以免阻塞 ASR
-        threading.Thread(target=self.identify_speaker, args=(fp,)).start()
+        threading.Thread(target=self.identify_speaker, args=(fp, self.session)).start()
         # -------------------------------------------------
 
         # ASR延迟追踪
         self.latency_monitor.mark_stage(session_id, 'asr_start')
         try:
-            query = self.asr.transcribe(fp)
+            # 流式识别在录音期间已经上传了音频，失败时再用录音文件识别
+            query = asr_stream.finish() if asr_stream else None
+            if asr_stream and asr_stream.error:
+                self.latency_monitor.record_error("asr", asr_stream.name)
+            if query is None:
+                query = self.asr.transcribe(fp)
         except Exception as e:
+            self.latency_monitor.record_error("asr", self.asr.SLUG)
             logger.critical(f"ASR识别失败：{e}", stack_info=True)
             traceback.print_exc()
         self.latency_monitor.mark_stage(session_id, 'asr_end')
         
         utils.check_and_delete(fp)
         try:
-            self.doResponse(query, callback, onSay, onStream)
+            self.doResponse(query, session_id, onSay, onStream)
         except Exception as e:
             logger.critical(f"回复失败：{e}", stack_info=True)
             traceback.print_exc()
@@ -315,30 +476,32 @@ class Conversation(object):
             self.say("没听清呢")
             self.hasPardon = False
 
-    def _tts_line(self, line, cache, index=0, onCompleted=None):
+    def _tts_line(self, session, line, cache, index, playback):
         """
         对单行字符串进行 TTS 并返回合成后的音频
+        :param session: 所属的会话
         :param line: 字符串
         :param cache: 是否缓存 TTS 结果
         :param index: 合成序号
-        :param onCompleted: 播放完成的操作
+        :param playback: 这次回复的 PlaybackRound
         """
         line = line.strip()
         pattern = r"http[s]?://.+"
         if re.match(pattern, line):
             logger.info("内容包含URL，屏蔽后续内容")
+            # 跳过的分段也要占用序号，否则后续分段无法播放
+            session.sequencer.put(index, None)
             return None
         line.replace("- ", "")
-        if line:
-            result = self._ttsAction(line, cache, index, onCompleted)
-            return result
-        return None
+        return self._ttsAction(session, line, cache, index, playback)
 
     # 在 Conversation.py 中添加辅助方法
-    def identify_speaker(self, audio_fp):
+    def identify_speaker(self, audio_fp, session=None):
         """
         识别说话人并注入 Context
+        :param session: 说话人所属的会话，默认为当前会话
         """
+        session = session or self.session
         with open(audio_fp, 'rb') as f:
             audio_data = f.read()
         
@@ -346,198 +509,187 @@ class Conversation(object):
         
         if user:
             # 注入用户画像到当前会话 Context
-            self.current_user_context = user['context']
+            session.current_user_context = user['context']
             fav_char = user['context'].get('fav_char')
             logger.info(f"[成员] 已锁定用户: {user['name']}, 偏好角色: {fav_char}")
             
             # 根据用户喜欢的角色切换TTS语音
-            self.switch_character_voice(fav_char)
+            self.switch_character_voice(fav_char, session)
             
             # 这里可以将 context 传递给 AI 模块
             # self.ai.set_context(self.current_user_context) 
         else:
-            self.current_user_context = None
+            session.current_user_context = None
             # 恢复默认TTS
-            self.restore_default_voice()
+            self.restore_default_voice(session)
             logger.info("[成员] 未识别到注册用户，使用默认人设")
 
-    def switch_character_voice(self, character_name):
+    def switch_character_voice(self, character_name, session=None):
         """
         根据角色名切换TTS语音
         :param character_name: 角色名称
+        :param session: 要切换语音的会话，默认为当前会话
         """
+        session = session or self.session
         if not character_name:
             logger.info("未指定角色，保持当前语音")
             return
         
-        # 获取角色对应的语音配置
-        voice_config = CharacterVoice.get_character_voice(character_name)
-        engine = voice_config.get('engine')
-        
-        logger.info(f"尝试切换到角色 '{character_name}' 的语音，引擎: {engine}")
-        
         try:
-            if engine == 'edge-tts':
-                # 使用 Edge-TTS，切换 voice
-                voice = voice_config.get('voice')
-                self.tts = TTS.EdgeTTS(voice=voice)
-                logger.info(f"已切换到 Edge-TTS 语音: {voice} (角色: {character_name})")
-                
-            elif engine == 'gpt-sovits':
-                # 使用 GPT-SoVITS 模型
-                self.tts = TTS.GPTSoVITS(
-                    server_url=voice_config.get('server_url'),
-                    ref_audio_path=voice_config.get('ref_audio_path'),
-                    prompt_text=voice_config.get('prompt_text'),
-                    prompt_language=voice_config.get('prompt_language', 'zh'),
-                    text_language=voice_config.get('text_language', 'zh'),
-                    top_k=voice_config.get('top_k', 15),
-                    top_p=voice_config.get('top_p', 1.0),
-                    temperature=voice_config.get('temperature', 1.0),
-                    speed=voice_config.get('speed', 1.0),
-                    timeout=voice_config.get('timeout', 30)
-                )
-                logger.info(f"已切换到 GPT-SoVITS 语音 (角色: {character_name})")
-                
-            elif engine == 'vits':
-                # 使用 VITS 模型
-                server_url = voice_config.get('server_url')
-                speaker_id = voice_config.get('speaker_id', 0)
-                # 这里需要你实现 VITS TTS 类
-                # self.tts = TTS.VITS(server_url=server_url, speaker_id=speaker_id)
-                logger.warning("VITS 引擎需要自行实现，当前使用默认语音")
-                
-            elif engine == 'bert-vits2':
-                # 使用 Bert-VITS2 模型
-                server_url = voice_config.get('server_url')
-                speaker_id = voice_config.get('speaker_id')
-                # 这里需要你实现 Bert-VITS2 TTS 类
-                # self.tts = TTS.BertVITS2(server_url=server_url, speaker_id=speaker_id)
-                logger.warning("Bert-VITS2 引擎需要自行实现，当前使用默认语音")
-                
-            else:
-                logger.warning(f"未知的TTS引擎: {engine}，保持当前语音")
-                
+            tts = self.tts_pool.get_character(character_name)
         except Exception as e:
             logger.error(f"切换角色语音失败: {e}，保持当前语音")
+            return
+        if tts is not session.tts:
+            session.tts = tts
+            logger.info(f"已切换到 {tts.SLUG} 语音 (角色: {character_name})")
     
-    def restore_default_voice(self):
+    def restore_default_voice(self, session=None):
         """恢复默认语音"""
-        # 使用 CharacterVoice 中定义的默认语音配置
-        default_voice_config = CharacterVoice.DEFAULT_VOICE
-        engine = default_voice_config.get('engine')
-        
-        logger.info(f"恢复默认语音，引擎: {engine}")
-        
-        if engine == 'edge-tts':
-            voice = default_voice_config.get('voice')
-            self.tts = TTS.EdgeTTS(voice=voice)
-            logger.info(f"已切换到默认 Edge-TTS 语音: {voice}")
-        elif engine == 'gpt-sovits':
-            # 使用 GPT-SoVITS 默认配置
-            self.tts = TTS.GPTSoVITS(
-                server_url=default_voice_config.get('server_url'),
-                ref_audio_path=default_voice_config.get('ref_audio_path'),
-                prompt_text=default_voice_config.get('prompt_text'),
-                prompt_language=default_voice_config.get('prompt_language', 'zh'),
-                text_language=default_voice_config.get('text_language', 'zh'),
-                top_k=default_voice_config.get('top_k', 15),
-                top_p=default_voice_config.get('top_p', 1.0),
-                temperature=default_voice_config.get('temperature', 1.0),
-                speed=default_voice_config.get('speed', 1.0),
-                timeout=default_voice_config.get('timeout', 30)
-            )
-            logger.info(f"已切换到默认 GPT-SoVITS 语音")
-        else:
-            # 其他引擎，恢复到原始默认 TTS
-            if self.default_tts:
-                self.tts = self.default_tts
-                logger.info("已恢复到系统默认语音")
-
-    def _tts(self, lines, cache, onCompleted=None):
+        session = session or self.session
+        try:
+            tts = self.tts_pool.get_default()
+        except Exception as e:
+            # 无法创建时恢复到原始默认 TTS
+            logger.error(f"恢复默认语音失败: {e}")
+            tts = self.default_tts
+        if tts and tts is not session.tts:
+            session.tts = tts
+            logger.info(f"已恢复默认 {tts.SLUG} 语音")
+
+    def _tts(self, session, lines, cache, playback):
         """
         对字符串进行 TTS 并返回合成后的音频
+        :param session: 所属的会话
         :param lines: 字符串列表
         :param cache: 是否缓存 TTS 结果
+        :param playback: 这次回复的 PlaybackRound
         """
         audios = []
         pattern = r"http[s]?://.+"
         logger.info("_tts")
-        with self.tts_lock:
-            with ThreadPoolExecutor(max_workers=config.get("tts_parallel", 5)) as pool:
-                all_task = []
-                index = 0
-                for line in lines:
-                    if re.match(pattern, line):
-                        logger.info("内容包含URL，屏蔽后续内容")
-                        self.tts_count -= 1
-                        continue
-                    if line:
-                        task = pool.submit(
-                            self._ttsAction, line.strip(), cache, index, onCompleted
-                        )
-                        index += 1
-                        all_task.append(task)
-                    else:
-                        self.tts_count -= 1
-                for future in as_completed(all_task):
-                    audio = future.result()
-                    if audio:
-                        audios.append(audio)
-            return audios
-
-    def _after_play(self, msg, audios, plugin=""):
-        cached_audios = [
-            f"http://{config.get('/server/host')}:{config.get('/server/port')}/audio/{os.path.basename(voice)}"
-            for voice in audios
-        ]
-        if self.onSay:
+        # 同一会话的回复依次合成，重置序号必须在锁内，否则会打乱上一次回复的分段
+        try:
+            with session.tts_lock:
+                self._resetSegments(session)
+                with ThreadPoolExecutor(max_workers=config.get("tts_parallel", 5)) as pool:
+                    all_task = []
+                    index = 0
+                    for line in lines:
+                        if re.match(pattern, line):
+                            logger.info("内容包含URL，屏蔽后续内容")
+                            continue
+                        if line:
+                            task = pool.submit(
+                                self._ttsAction, session, line.strip(), cache, index, playback
+                            )
+                            index += 1
+                            all_task.append(task)
+                    for future in as_completed(all_task):
+                        audio = future.result()
+                        if audio:
+                            audios.append(audio)
+        finally:
+            # 完成回调可能再次调用 say，必须在锁外结束这一轮
+            playback.finish()
+        return audios
+
+    def _after_play(self, session, msg, audios, plugin=""):
+        cached_audios = []
+        for voice in audios:
+            if voice.startswith(constants.TEMP_PATH):
+                # 缓存的语音位于 temp 的子目录中
+                name = os.path.relpath(voice, constants.TEMP_PATH).replace(os.sep, "/")
+            else:
+                name = os.path.basename(voice)
+            cached_audios.append(
+                f"http://{config.get('/server/host')}:{config.get('/server/port')}/audio/{name}"
+            )
+        if session.onSay:
             logger.info(f"onSay: {msg}, {cached_audios}")
-            self.onSay(msg, cached_audios, plugin=plugin)
-            self.onSay = None
-        utils.lruCache()  # 清理缓存
+            session.onSay(msg, cached_audios, plugin=plugin)
+            session.onSay = None
 
     def stream_say(self, stream, cache=False, onCompleted=None):
         """
         从流中逐字逐句生成语音
+
+        文字流的消费、逐句合成和按序播放是流水线并行的：
+        每凑够一句就提交给合成线程池，然后立即继续读取后续文字，
+        合成好的分段由调度器按序交给播放器。
+
         :param stream: 文字流，可迭代对象
         :param cache: 是否缓存 TTS 结果
         :param onCompleted: 声音播报完成后的回调
         """
         lines = []
         line = ""
+        msg = ""
         resp_uuid = str(uuid.uuid1())
-        audios = []
-        if onCompleted is None:
-            onCompleted = lambda: self._onCompleted(msg)
-        self.tts_index = 0
-        self.tts_count = 0
-        index = 0
+        session = self.session
+        session_id = session.current_session_id
+        # 完成回调在播放器线程中执行，仍然属于这个会话
+        onCompleted = self.bind(session, onCompleted)
+
+        def wrapped_onCompleted():
+            if session_id:
+                self.latency_monitor.mark_stage(session_id, "tts_end")
+                self.latency_monitor.mark_stage(session_id, "play_end")
+                self.latency_monitor.mark_stage(session_id, "response_end")
+                self.latency_monitor.end_session(session_id)
+            if onCompleted:
+                onCompleted()
+            else:
+                self._onCompleted(msg)
+
+        # 流结束前不知道总段数，等合成全部结束后再确定最后一段
+        playback = PlaybackRound(wrapped_onCompleted)
+        if session_id:
+            self.latency_monitor.mark_stage(session_id, "tts_start")
+        parallel = config.get("tts_parallel", 5)
+        # 限制积压的合成任务数，避免合成远远落后于文字流
+        pending = threading.BoundedSemaphore(parallel * 2)
+        futures = []
+
+        def submit(text, cache):
+            pending.acquire()
+            future = pool.submit(
+                self._tts_line, session, text, cache, len(futures), playback
+            )
+            future.add_done_callback(lambda _: pending.release())
+            futures.append(future)
+
         skip_tts = False
-        for data in stream():
-            if self.onStream:
-                self.onStream(data, resp_uuid)
-            line += data
-            if any(char in data for char in utils.getPunctuations()):
-                if "```" in line.strip():
-                    skip_tts = True
-                if not skip_tts:
-                    audio = self._tts_line(line.strip(), cache, index, onCompleted)
-                    if audio:
-                        self.tts_count += 1
-                        audios.append(audio)
-                        index += 1
-                else:
-                    logger.info(f"{line} 属于代码段，跳过朗读")
-                lines.append(line)
-                line = ""
-        if line.strip():
-            lines.append(line)
-        if skip_tts:
-            self._tts_line("内容包含代码，我就不念了", True, index, onCompleted)
+        try:
+            with session.tts_lock:
+                self._resetSegments(session)
+                with ThreadPoolExecutor(max_workers=parallel) as pool:
+                    for data in stream():
+                        if session.onStream:
+                            session.onStream(data, resp_uuid)
+                        line += data
+                        if any(char in data for char in utils.getPunctuations()):
+                            if "```" in line.strip():
+                                skip_tts = True
+                            if not skip_tts:
+                                submit(line.strip(), cache)
+                            else:
+                                logger.info(f"{line} 属于代码段，跳过朗读")
+                            lines.append(line)
+                            line = ""
+                    if line.strip():
+                        lines.append(line)
+                    if skip_tts:
+                        submit("内容包含代码，我就不念了", True)
+                    results = [future.result() for future in futures]
+        finally:
+            # 最后一段可能在流结束前就已经播完了，由 finish 补上完成回调
+            playback.finish()
+
+        audios = [audio for audio in results if audio]
         msg = "".join(lines)
         self.appendHistory(1, msg, UUID=resp_uuid, plugin="")
-        self._after_play(msg, audios, "")
+        self._after_play(session, msg, audios, "")
 
     def say(self, msg, cache=False, plugin="", onCompleted=None, append_history=True):
         """
@@ -548,9 +700,12 @@ class Conversation(object):
         :param onCompleted: 完成的回调
         :param append_history: 是否要追加到聊天记录
         """
+        session = self.session
+        session_id = session.current_session_id
+        onCompleted = self.bind(session, onCompleted)
         # TTS延迟追踪开始
-        if self.current_session_id:
-            self.latency_monitor.mark_stage(self.current_session_id, 'tts_start')
+        if session_id:
+            self.latency_monitor.mark_stage(session_id, 'tts_start')
         
         if append_history:
             self.appendHistory(1, msg, plugin=plugin)
@@ -560,31 +715,27 @@ class Conversation(object):
             return
 
         logger.info(f"即将朗读语音：{msg}")
-        lines = re.split("。|！|？|\!|\?|\n", msg)
+        lines = utils.splitSentences(msg)
         
         # 创建一个包装的回调来标记TTS和播放完成
         def wrapped_onCompleted():
-            if self.current_session_id:
-                self.latency_monitor.mark_stage(self.current_session_id, 'tts_end')
-                self.latency_monitor.mark_stage(self.current_session_id, 'play_end')
-                self.latency_monitor.mark_stage(self.current_session_id, 'response_end')
+            if session_id:
+                self.latency_monitor.mark_stage(session_id, 'tts_end')
+                self.latency_monitor.mark_stage(session_id, 'play_end')
+                self.latency_monitor.mark_stage(session_id, 'response_end')
                 # 结束会话并生成报告
-                self.latency_monitor.end_session(self.current_session_id)
+                self.latency_monitor.end_session(session_id)
             if onCompleted:
                 onCompleted()
             else:
                 self._onCompleted(msg)
         
-        self.tts_index = 0
-        self.tts_count = len(lines)
-        logger.debug(f"tts_count: {self.tts_count}")
-        
         # 标记播放开始
-        if self.current_session_id:
-            self.latency_monitor.mark_stage(self.current_session_id, 'play_start')
+        if session_id:
+            self.latency_monitor.mark_stage(session_id, 'play_start')
         
-        audios = self._tts(lines, cache, wrapped_onCompleted)
-        self._after_play(msg, audios, plugin)
+        audios = self._tts(session, lines, cache, PlaybackRound(wrapped_onCompleted))
+        self._after_play(session, msg, audios, plugin)
 
     def activeListen(self, silent=False, return_fp=False, silent_threshold=None, recording_timeout=None):
         """
@@ -600,17 +751,32 @@ class Conversation(object):
             self.player.join()  # 确保所有音频都播完
         logger.info("进入主动聆听...")
         try:
+            capture = AudioCapture.get_capture()
+            # 预录音不能早于机器人说完、提示音播完的时刻，否则会录进唤醒词和回声
+            mark = {"since": capture.position}
             if not silent:
-                self.lifeCycleHandler.onWakeup()
-            listener = snowboydecoder.ActiveListener(
-                [constants.getHotwordModel(config.get("hotword", "wukong.pmdl"))]
-            )
+                mark["since"] = None  # 提示音播完之前不取预录音
+
+                def onBeepCompleted():
+                    mark["since"] = capture.position
+
+                self.lifeCycleHandler.onWakeup(onCompleted=onBeepCompleted)
+            model = constants.getHotwordModel(config.get("hotword", "wukong.pmdl"))
+            if self.active_listener is None or self.active_listener_model != model:
+                self.active_listener = snowboydecoder.ActiveListener([model])
+                self.active_listener_model = model
+            listener = self.active_listener
             # 使用传入的参数或配置默认值
             _silent_threshold = silent_threshold if silent_threshold is not None else config.get("silent_threshold", 150)
             _recording_timeout = (recording_timeout if recording_timeout is not None else config.get("recording_timeout", 5)) * 4
+            asr_stream = None if return_fp else self.createASRStream()
             voice = listener.listen(
                 silent_count_threshold=_silent_threshold,
                 recording_timeout=_recording_timeout,
+                asr_stream=asr_stream,
+                endpointer=VAD.get_endpointer(),
+                preroll_ms=config.get("/audio_input/preroll_ms", 400),
+                since=mark["since"],
             )
             if not silent:
                 self.lifeCycleHandler.onThink()
@@ -619,9 +785,12 @@ class Conversation(object):
                 return voice
 
             if voice:
-                query = self.asr.transcribe(voice)
+                query = asr_stream.finish() if asr_stream else None
+                if query is None:
+                    query = self.asr.transcribe(voice)
                 utils.check_and_delete(voice)
                 return query
+            asr_stream and asr_stream.cancel()
             return ""
         except Exception as e:
             logger.error(f"主动聆听失败：{e}", stack_info=True)
@@ -632,5 +801,5 @@ class Conversation(object):
         """播放一个音频"""
         if self.player:
             self.interrupt()
-        self.player = Player.SoxPlayer()
+        self.player = Player.get_player()
         self.player.play(src, delete=delete, onCompleted=onCompleted)
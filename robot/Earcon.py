@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+提示音（earcon）
+
+启动时把 beep_hi/beep_lo/ding/dong 解码成输出引擎的 PCM 格式保存在内存中，
+播放时直接写入常驻输出流上的专用声道：不读文件、不解码、不启动进程，
+唤醒后的提示音在下一个缓冲周期就能发出。
+"""
+
+import os
+import threading
+
+from robot import constants, logging, AudioEngine, Player
+
+logger = logging.getLogger(__name__)
+
+EARCONS = {
+    "beep_hi": constants.getData("beep_hi.wav"),
+    "beep_lo": constants.getData("beep_lo.wav"),
+    "ding": os.path.join(constants.APP_PATH, "snowboy", "resources", "ding.wav"),
+    "dong": os.path.join(constants.APP_PATH, "snowboy", "resources", "dong.wav"),
+}
+
+
+class Earcons(object):
+    """
+    预加载的提示音
+
+    :param engine: 音频输出引擎
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.channel = engine.open_channel()
+        self.pcm = {}
+        for name, path in EARCONS.items():
+            try:
+                self.pcm[name] = AudioEngine.decode(path, engine.rate, engine.channels)
+            except Exception as e:
+                logger.warning(f"提示音 {name} 加载失败：{e}")
+        logger.info(f"已预加载提示音：{', '.join(self.pcm)}")
+
+    def play(self, name, onCompleted=None, onStarted=None):
+        """
+        播放提示音，会打断正在播放的上一个提示音
+
+        :param name: 提示音名称
+        :param onCompleted: 播放完成的回调
+        :param onStarted: 开始发声时的回调
+        :returns: 是否已播放
+        """
+        pcm = self.pcm.get(name)
+        if pcm is None:
+            return False
+        self.channel.clear()
+        generation = self.channel.generation
+        onStarted and self.channel.mark(onStarted, generation)
+        self.channel.write(pcm, generation)
+        onCompleted and self.channel.mark(onCompleted, generation)
+        return True
+
+
+# 全局单例
+_earcons = None
+_earcons_lock = threading.Lock()
+
+
+def get_earcons():
+    """
+    获取预加载的提示音
+
+    :returns: Earcons 实例，输出引擎不可用时返回 None
+    """
+    global _earcons
+    if _earcons is None:
+        with _earcons_lock:
+            if _earcons is None:
+                engine = AudioEngine.get_engine()
+                if engine:
+                    _earcons = Earcons(engine)
+    return _earcons
+
+
+def play(name, onCompleted=None, onStarted=None):
+    """
+    播放提示音，输出引擎不可用时退回到 Player.play
+
+    :param name: 提示音名称（beep_hi/beep_lo/ding/dong）
+    :param onCompleted: 播放完成的回调
+    :param onStarted: 开始发声时的回调，退回到 Player.play 时
+                      不知道何时发声，不会调用
+    """
+    earcons = get_earcons()
+    if earcons and earcons.play(name, onCompleted, onStarted):
+        return
+    Player.play(EARCONS[name], onCompleted)
@@ -11,19 +11,228 @@
 - WebSocket通信抖动
 
 生成量化的延迟分析报告，保证局域网环境下不出现断音
+
+会话明细只保留最近的 max_sessions 个；各阶段的延迟另外记入对数分桶的
+直方图，分别按启动以来和最近 1 分钟、1 小时、24 小时的滚动窗口统计，
+占用的内存与运行时长无关，查询分位数只需遍历一遍桶。
 """
 
+import math
 import time
 import json
 import os
 import threading
-from collections import deque
+from collections import deque, Counter, OrderedDict
 from datetime import datetime
-from robot import logging, constants
+from robot import logging, constants, config
 
 logger = logging.getLogger(__name__)
 
 
+def summarize(values, percentiles=(50, 95, 99)):
+    """
+    计算一组样本的分位数
+
+    :param values: 样本
+    :param percentiles: 要计算的分位数
+    :returns: {'count': 样本数, 'p50': 值, ...}
+    """
+    values = sorted(values)
+    stats = {'count': len(values)}
+    for p in percentiles:
+        if not values:
+            stats[f'p{p}'] = None
+            continue
+        # 最近秩法：不小于 p% 样本的最小值
+        rank = max(1, -(-len(values) * p // 100))
+        stats[f'p{p}'] = round(values[int(rank) - 1], 2)
+    return stats
+
+
+# 直方图的桶：相邻桶边界之比为 2^(1/16)，取桶的几何中点时相对误差不超过 2.2%
+HISTOGRAM_MIN = 0.1  # 毫秒，不大于它的值都归入第 0 个桶
+HISTOGRAM_RATIO = 2 ** (1 / 16)
+HISTOGRAM_BUCKETS = 373  # 覆盖 0.1ms ~ 约 17 分钟，更大的值归入最后一个桶
+
+# 滚动窗口：名称 -> (窗口长度（秒）, 分片数)，过期按分片整体淘汰
+WINDOWS = OrderedDict([
+    ('1m', (60, 6)),
+    ('1h', (3600, 60)),
+    ('24h', (86400, 96)),
+])
+
+
+def bucket_of(value):
+    """延迟值所在的桶，第 i 个桶为 (MIN * RATIO^(i-1), MIN * RATIO^i]"""
+    if value <= HISTOGRAM_MIN:
+        return 0
+    index = int(math.ceil(math.log(value / HISTOGRAM_MIN, HISTOGRAM_RATIO)))
+    return min(index, HISTOGRAM_BUCKETS - 1)
+
+
+def bucket_value(index):
+    """桶的代表值（上下边界的几何中点）"""
+    if index == 0:
+        return HISTOGRAM_MIN
+    return HISTOGRAM_MIN * HISTOGRAM_RATIO ** (index - 0.5)
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图，只保存非空的桶"""
+
+    def __init__(self):
+        self.counts = Counter()  # 桶序号 -> 样本数
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        """记录一个样本（毫秒）"""
+        self.counts[bucket_of(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def copy(self):
+        histogram = LatencyHistogram()
+        histogram.counts = self.counts.copy()
+        histogram.count = self.count
+        histogram.sum = self.sum
+        histogram.min = self.min
+        histogram.max = self.max
+        return histogram
+
+    def buckets(self):
+        """
+        非空的桶
+
+        :returns: [(桶的上边界（毫秒）, 样本数)]，按上边界升序
+        """
+        return [
+            (HISTOGRAM_MIN * HISTOGRAM_RATIO ** index, self.counts[index])
+            for index in sorted(self.counts)
+        ]
+
+    def remove(self, other):
+        """减去另一个直方图的样本，min/max 不会随之更新"""
+        self.counts.subtract(other.counts)
+        self.counts = +self.counts  # 去掉计数为 0 的桶
+        self.count -= other.count
+        self.sum = self.sum - other.sum if self.count else 0.0
+
+    def percentile(self, p, low=None, high=None):
+        """
+        估算分位数
+
+        :param p: 分位数（0~100）
+        :param low, high: 已知的最小、最大值，用于收紧估算结果
+        :returns: 毫秒，没有样本时返回 None
+        """
+        if self.count <= 0:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                value = bucket_value(index)
+                if low is not None:
+                    value = max(value, low)
+                if high is not None:
+                    value = min(value, high)
+                return value
+        return high
+
+    def summary(self, percentiles=(50, 90, 99), low=None, high=None):
+        """
+        统计信息
+
+        :returns: {'count', 'avg', 'min', 'max', 'p50', ...}
+        """
+        low = self.min if low is None else low
+        high = self.max if high is None else high
+        stats = {
+            'count': self.count,
+            'avg': round(self.sum / self.count, 2) if self.count else None,
+            'min': round(low, 2) if self.count and low is not None else None,
+            'max': round(high, 2) if self.count and high is not None else None,
+        }
+        for p in percentiles:
+            value = self.percentile(p, low, high)
+            stats[f'p{p}'] = round(value, 2) if value is not None else None
+        return stats
+
+
+class RollingHistogram:
+    """
+    滚动窗口直方图
+
+    窗口被切成若干个分片，每个分片一个直方图，另维护一份全窗口的合计，
+    分片过期时从合计中减去。
+
+    :param window: 窗口长度（秒）
+    :param slots: 分片数
+    """
+
+    def __init__(self, window, slots):
+        self.slots = slots
+        self.slot_seconds = window / slots
+        self.ring = deque()  # (分片序号, LatencyHistogram)
+        self.merged = LatencyHistogram()
+
+    def _expire(self, now):
+        oldest = int(now // self.slot_seconds) - self.slots + 1
+        while self.ring and self.ring[0][0] < oldest:
+            _, histogram = self.ring.popleft()
+            self.merged.remove(histogram)
+
+    def record(self, value, now):
+        self._expire(now)
+        index = int(now // self.slot_seconds)
+        if not self.ring or self.ring[-1][0] != index:
+            self.ring.append((index, LatencyHistogram()))
+        self.ring[-1][1].record(value)
+        self.merged.record(value)
+
+    def snapshot(self, now):
+        """
+        :returns: (窗口内合计的直方图副本, 窗口内最小值, 最大值)
+        """
+        self._expire(now)
+        if not self.ring:
+            return self.merged.copy(), None, None
+        low = min(h.min for _, h in self.ring if h.min is not None)
+        high = max(h.max for _, h in self.ring if h.max is not None)
+        return self.merged.copy(), low, high
+
+
+class StageHistograms:
+    """某个阶段启动以来和各滚动窗口的直方图"""
+
+    def __init__(self):
+        self.all = LatencyHistogram()
+        self.windows = {
+            name: RollingHistogram(window, slots)
+            for name, (window, slots) in WINDOWS.items()
+        }
+
+    def record(self, value, now):
+        self.all.record(value)
+        for histogram in self.windows.values():
+            histogram.record(value, now)
+
+    def snapshot(self, window, now):
+        """
+        :param window: WINDOWS 中的窗口名，None 表示启动以来
+        :returns: (直方图副本, 最小值, 最大值)
+        """
+        if window is None:
+            return self.all.copy(), self.all.min, self.all.max
+        return self.windows[window].snapshot(now)
+
+
 class LatencyTracker:
     """单次对话的延迟追踪器"""
     
@@ -31,12 +240,18 @@ class LatencyTracker:
         self.session_id = session_id
         self.timestamps = {}
         self.durations = {}
+        self.gaps = []  # 句间断音（毫秒）
         self.start_time = time.time()
+        self.recorded = False  # 是否已计入直方图
         
     def mark(self, stage_name):
         """标记时间点"""
         self.timestamps[stage_name] = time.time()
         
+    def add_gap(self, gap_ms):
+        """记录一次句间断音"""
+        self.gaps.append(gap_ms)
+
     def calculate_duration(self, stage_name, start_stage, end_stage):
         """计算两个阶段之间的延迟"""
         if start_stage in self.timestamps and end_stage in self.timestamps:
@@ -58,6 +273,7 @@ class LatencyTracker:
             'start_time': self.start_time,
             'timestamps': self.timestamps,
             'durations': self.durations,
+            'gaps': self.gaps,
             'total_latency': self.get_total_latency()
         }
 
@@ -116,10 +332,19 @@ class WebSocketJitterMonitor:
 
 
 class LatencyMonitor:
-    """全链路延迟监控器"""
+    """
+    全链路延迟监控器
+
+    :param max_sessions: 最多保留多少个会话的明细，超出后淘汰最早开始的
+    """
     
-    def __init__(self):
-        self.sessions = {}  # 存储所有会话的延迟数据
+    def __init__(self, max_sessions=100):
+        self.sessions = OrderedDict()  # 最近会话的延迟明细，按开始先后排序
+        self.max_sessions = max_sessions
+        self.histograms = {}  # 阶段名 -> StageHistograms
+        self.session_count = 0  # 已结束的会话数
+        self.over_threshold = Counter()  # 阶段名 -> 超过阈值的次数
+        self.errors = Counter()  # (组件, 引擎 SLUG) -> 出错次数
         self.ws_monitor = WebSocketJitterMonitor()
         self.report_dir = os.path.join(constants.TEMP_PATH, 'latency_reports')
         self.lock = threading.Lock()
@@ -131,11 +356,14 @@ class LatencyMonitor:
         # 延迟阈值（毫秒）- 根据实际网络服务延迟调整
         self.thresholds = {
             'wakeup': 500,      # 唤醒延迟阈值（放宽到500ms）
+            'beep': 100,        # 唤醒提示音延迟阈值（从检测到唤醒到提示音发声）
             'asr': 1500,        # ASR延迟阈值（网络语音识别服务，1.5秒合理）
             'nlu': 800,         # NLU延迟阈值（网络NLU服务，800ms合理）
             'skill': 3000,      # 技能处理延迟阈值（包含复杂逻辑+多次TTS，3秒合理）
             'tts': 5000,        # TTS合成延迟阈值（Edge-TTS网络服务，长文本5秒内）
             'play': 5000,        # 播放延迟阈值（本地播放，放宽到500ms）
+            'first_audio': 3000, # 首音延迟阈值（从会话开始到第一段语音开始播放）
+            'sentence_gap': 300, # 句间断音阈值（播放器因等待合成而空闲的时长）
             'total': 15000,     # 总延迟阈值（15秒内完成一次完整交互）
             'ws_latency': 100,  # WebSocket延迟阈值（放宽到100ms）
             'ws_jitter': 50     # WebSocket抖动阈值（放宽到50ms）
@@ -148,10 +376,18 @@ class LatencyMonitor:
         with self.lock:
             tracker = LatencyTracker(session_id)
             tracker.mark('session_start')
+            self.sessions.pop(session_id, None)
             self.sessions[session_id] = tracker
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
             logger.debug(f"开始延迟追踪: {session_id}")
             return tracker
     
+    def get_session(self, session_id):
+        """获取正在追踪或已结束的会话，不存在时返回 None"""
+        with self.lock:
+            return self.sessions.get(session_id)
+
     def mark_stage(self, session_id, stage_name):
         """标记某个阶段的时间点"""
         with self.lock:
@@ -161,14 +397,30 @@ class LatencyMonitor:
             else:
                 logger.warning(f"会话 {session_id} 不存在")
     
+    def record_gap(self, session_id, gap_ms):
+        """记录某个会话的句间断音"""
+        with self.lock:
+            if session_id in self.sessions:
+                self.sessions[session_id].add_gap(gap_ms)
+                logger.debug(f"[{session_id}] 句间断音: {gap_ms:.2f}ms")
+
     def end_session(self, session_id):
-        """结束会话并计算各阶段延迟"""
+        """
+        结束会话并计算各阶段延迟
+
+        每次回复（say 或 stream_say）播放完成时都会调用一次。一轮对话
+        回复了多次时（如插件先后说了两次），只有第一次回复计入直方图，
+        tts_latency、play_latency 等只反映第一次回复
+        """
         with self.lock:
             if session_id not in self.sessions:
                 logger.warning(f"会话 {session_id} 不存在")
                 return None
                 
             tracker = self.sessions[session_id]
+            if tracker.recorded:
+                return tracker
+            tracker.recorded = True
             tracker.mark('session_end')
             
             # 计算各阶段延迟
@@ -179,17 +431,77 @@ class LatencyMonitor:
                 ('skill_latency', 'skill_start', 'skill_end'),
                 ('tts_latency', 'tts_start', 'tts_end'),
                 ('play_latency', 'play_start', 'play_end'),
+                ('first_audio_latency', 'session_start', 'first_audio'),
                 ('response_latency', 'session_start', 'response_end')
             ]
             
             for stage_name, start, end in stages:
                 tracker.calculate_duration(stage_name, start, end)
+            if tracker.gaps:
+                tracker.durations['sentence_gap_latency'] = max(tracker.gaps)
+            self._record(tracker)
             
             # 分析并记录
             self._analyze_and_log(tracker)
             
             return tracker
     
+    def _record(self, tracker):
+        """把会话各阶段的延迟记入直方图，调用方需持有锁"""
+        now = time.monotonic()
+        self.session_count += 1
+        for stage_name, latency in tracker.durations.items():
+            if latency is not None:
+                self._record_latency(stage_name, latency, now)
+        total = tracker.get_total_latency()
+        if total is not None and total > self.thresholds['total']:
+            self.over_threshold['total'] += 1
+
+    def _record_latency(self, stage_name, latency, now):
+        if stage_name not in self.histograms:
+            self.histograms[stage_name] = StageHistograms()
+        self.histograms[stage_name].record(latency, now)
+        threshold = self.thresholds.get(stage_name.replace('_latency', ''))
+        if threshold is not None and latency > threshold:
+            self.over_threshold[stage_name] += 1
+
+    def record_latency(self, stage_name, latency_ms):
+        """
+        直接记录一个不属于某次会话的延迟样本（如插件匹配耗时）
+
+        :param stage_name: 阶段名，约定以 _latency 结尾
+        :param latency_ms: 延迟（毫秒）
+        """
+        with self.lock:
+            self._record_latency(stage_name, latency_ms, time.monotonic())
+
+    def record_error(self, component, slug):
+        """
+        记录一次引擎出错
+
+        :param component: 组件，如 asr、tts、ai
+        :param slug: 引擎的 SLUG
+        """
+        with self.lock:
+            self.errors[(component, slug)] += 1
+
+    def get_counts(self):
+        """
+        :returns: {'sessions': 已结束的会话数, 'over_threshold': {阶段名: 超过阈值的次数}}
+        """
+        with self.lock:
+            return {
+                'sessions': self.session_count,
+                'over_threshold': dict(self.over_threshold),
+            }
+
+    def get_error_counts(self):
+        """
+        :returns: {(组件, 引擎 SLUG): 出错次数}
+        """
+        with self.lock:
+            return dict(self.errors)
+
     def _analyze_and_log(self, tracker):
         """分析延迟并记录警告"""
         logger.info(f"\n{'='*60}")
@@ -257,13 +569,15 @@ class LatencyMonitor:
             output_file = os.path.join(self.report_dir, f'latency_report_{timestamp}.json')
         
         with self.lock:
-            report = {
-                'generated_at': datetime.now().isoformat(),
-                'sessions': [tracker.to_dict() for tracker in self.sessions.values()],
-                'websocket_stats': self.ws_monitor.get_stats(),
-                'thresholds': self.thresholds,
-                'summary': self._generate_summary()
-            }
+            sessions = [tracker.to_dict() for tracker in self.sessions.values()]
+        report = {
+            'generated_at': datetime.now().isoformat(),
+            'sessions': sessions,
+            'websocket_stats': self.ws_monitor.get_stats(),
+            'thresholds': self.thresholds,
+            'summary': self._generate_summary(),
+            'windows': self.get_window_stats(),
+        }
         
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(report, f, ensure_ascii=False, indent=2)
@@ -272,24 +586,68 @@ class LatencyMonitor:
         return output_file
     
     def _generate_summary(self):
-        """生成摘要统计"""
-        if not self.sessions:
-            return None
-        
-        all_totals = [t.get_total_latency() for t in self.sessions.values() 
-                     if t.get_total_latency() is not None]
-        
-        if not all_totals:
-            return None
-        
+        """生成摘要统计（启动以来）"""
+        with self.lock:
+            histograms = self.histograms.get('response_latency')
+            if histograms is None or not histograms.all.count:
+                return None
+            total = histograms.all.summary()
+            return {
+                'total_sessions': self.session_count,
+                'avg_total_latency': total['avg'],
+                'max_total_latency': total['max'],
+                'min_total_latency': total['min'],
+                'p50_total_latency': total['p50'],
+                'p90_total_latency': total['p90'],
+                'p99_total_latency': total['p99'],
+                'sessions_over_threshold': self.over_threshold['total'],
+                'stages_over_threshold': dict(self.over_threshold),
+            }
+    
+    def get_percentiles(self, percentiles=(50, 90, 99), window=None):
+        """
+        统计各阶段延迟的分位数（由直方图估算）
+
+        :param percentiles: 要计算的分位数
+        :param window: WINDOWS 中的窗口名（'1m'、'1h'、'24h'），None 表示启动以来
+        :returns: {阶段名: {'count': 样本数, 'avg', 'min', 'max', 'p50': 毫秒, ...}}，
+                  窗口内没有样本的阶段不会出现
+        """
         return {
-            'total_sessions': len(self.sessions),
-            'avg_total_latency': round(sum(all_totals) / len(all_totals), 2),
-            'max_total_latency': round(max(all_totals), 2),
-            'min_total_latency': round(min(all_totals), 2),
-            'sessions_over_threshold': sum(1 for t in all_totals if t > self.thresholds['total'])
+            stage_name: histogram.summary(percentiles, low, high)
+            for stage_name, (histogram, low, high) in self.get_histograms(window).items()
+            if histogram.count
         }
-    
+
+    def get_histograms(self, window=None):
+        """
+        各阶段直方图的副本
+
+        持锁期间只复制非空的桶，分位数等计算在锁外进行，不会阻塞对话线程
+
+        :param window: WINDOWS 中的窗口名，None 表示启动以来
+        :returns: {阶段名: (LatencyHistogram, 最小值, 最大值)}
+        """
+        if window is not None and window not in WINDOWS:
+            raise ValueError(f"未知的统计窗口：{window}")
+        now = time.monotonic()
+        with self.lock:
+            return {
+                stage_name: histograms.snapshot(window, now)
+                for stage_name, histograms in self.histograms.items()
+            }
+
+    def get_window_stats(self, percentiles=(50, 90, 99)):
+        """
+        各滚动窗口的分位数统计
+
+        :returns: {窗口名: get_percentiles 的结果}，'all' 为启动以来
+        """
+        stats = {'all': self.get_percentiles(percentiles)}
+        for window in WINDOWS:
+            stats[window] = self.get_percentiles(percentiles, window)
+        return stats
+
     def clear_old_sessions(self, keep_last=100):
         """清理旧会话数据，保留最近的N个"""
         with self.lock:
@@ -304,10 +662,15 @@ class LatencyMonitor:
 
 # 全局单例
 _latency_monitor = None
+_latency_monitor_lock = threading.Lock()
 
 def get_monitor():
     """获取全局延迟监控器实例"""
     global _latency_monitor
     if _latency_monitor is None:
-        _latency_monitor = LatencyMonitor()
+        with _latency_monitor_lock:
+            if _latency_monitor is None:
+                _latency_monitor = LatencyMonitor(
+                    max_sessions=config.get("/latency_monitor/max_sessions", 100)
+                )
     return _latency_monitor
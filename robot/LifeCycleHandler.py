@@ -1,3 +1,4 @@
+import functools
 import logging
 import multiprocessing
 import os
@@ -7,7 +8,8 @@ import time
 import _thread as thread
 
 from watchdog.observers import Observer
-from robot import config, constants, statistic, Player
+from robot import config, constants, statistic, Earcon
+from robot.LatencyMonitor import get_monitor
 from robot.ConfigMonitor import ConfigMonitor
 from robot.sdk import LED
 
@@ -16,6 +18,13 @@ logger = logging.getLogger(__name__)
 LOCAL_REMINDER = os.path.join(constants.TEMP_PATH, "reminder.pkl")
 
 
+def _record_beep_latency(detected_at):
+    # 只记一个独立样本，不开会话，免得挤占真正的对话会话
+    get_monitor().record_latency(
+        "beep_latency", (time.perf_counter() - detected_at) * 1000
+    )
+
+
 def singleton(cls):
     _instance = {}
 
@@ -48,6 +57,9 @@ class LifeCycleHandler(object):
         config.init()
         statistic.report(0)
 
+        # 预加载提示音
+        Earcon.get_earcons()
+
         # 初始化配置监听器
         config_event_handler = ConfigMonitor(self._conversation)
         self._observer.schedule(config_event_handler, constants.CONFIG_PATH, False)
@@ -155,18 +167,27 @@ class LifeCycleHandler(object):
             self._conversation.doResponse(query)
             self._wakeup.clear()
 
-    def _beep_hi(self, onCompleted=None):
-        Player.play(constants.getData("beep_hi.wav"), onCompleted)
+    def _beep_hi(self, onCompleted=None, onStarted=None):
+        Earcon.play("beep_hi", onCompleted, onStarted)
 
     def _beep_lo(self):
-        Player.play(constants.getData("beep_lo.wav"))
+        Earcon.play("beep_lo")
 
-    def onWakeup(self, onCompleted=None):
+    def onWakeup(self, onCompleted=None, detected_at=None):
         """
         唤醒并进入录音的状态
+
+        :param onCompleted: 提示音播放完成的回调
+        :param detected_at: 检测到唤醒词时的 time.perf_counter()，
+                            传入时统计从检测到提示音发声的延迟
         """
         logger.info("onWakeup")
-        self._beep_hi(onCompleted=onCompleted)
+        onStarted = (
+            None
+            if detected_at is None
+            else functools.partial(_record_beep_latency, detected_at)
+        )
+        self._beep_hi(onCompleted=onCompleted, onStarted=onStarted)
         if config.get("/LED/enable", False):
             LED.wakeup()
         self._unihiker and self._unihiker.record(1, "我正在聆听...")
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 指标导出
+
+把 LatencyMonitor、WebSocket 抖动监控、TTS 缓存、播放器和进程资源的
+统计数据渲染成 Prometheus 文本格式（text/plain; version=0.0.4），由后台
+管理端的 /metrics 接口返回。
+
+各数据源只在复制快照时短暂持锁，渲染在锁外进行，抓取不会阻塞对话线程。
+"""
+
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from robot.LatencyMonitor import get_monitor, WINDOWS
+from robot.TTSCache import get_cache
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 延迟直方图导出的桶上边界（秒）。内部直方图的桶更细，跨越边界的桶
+# 计入下一个边界，误差不超过一个内部桶的宽度（约 4.4%）
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUANTILES = (50, 90, 99)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Exposition(object):
+    """按 Prometheus 文本格式拼接指标"""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, doc):
+        self.lines.append(f"# HELP {name} {doc}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name, value, **labels):
+        if value is None:
+            return
+        self.lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def _stage(stage_name):
+    return stage_name[: -len("_latency")] if stage_name.endswith("_latency") else stage_name
+
+
+def _latency_metrics(out, monitor):
+    histograms = monitor.get_histograms()
+    out.family(
+        "wukong_stage_latency_seconds", "histogram", "启动以来各阶段的延迟"
+    )
+    for stage_name, (histogram, _, _) in sorted(histograms.items()):
+        stage = _stage(stage_name)
+        buckets = histogram.buckets()
+        seen, i = 0, 0
+        for le in LATENCY_BUCKETS:
+            while i < len(buckets) and buckets[i][0] <= le * 1000:
+                seen += buckets[i][1]
+                i += 1
+            out.sample("wukong_stage_latency_seconds_bucket", seen, stage=stage, le=_number(float(le)))
+        out.sample("wukong_stage_latency_seconds_bucket", histogram.count, stage=stage, le="+Inf")
+        out.sample("wukong_stage_latency_seconds_sum", histogram.sum / 1000, stage=stage)
+        out.sample("wukong_stage_latency_seconds_count", histogram.count, stage=stage)
+
+    out.family(
+        "wukong_stage_latency_window_seconds",
+        "gauge",
+        "各阶段延迟在滚动窗口内的分位数",
+    )
+    for window in WINDOWS:
+        for stage_name, (histogram, low, high) in sorted(monitor.get_histograms(window).items()):
+            if not histogram.count:
+                continue
+            for p in QUANTILES:
+                out.sample(
+                    "wukong_stage_latency_window_seconds",
+                    histogram.percentile(p, low, high) / 1000,
+                    stage=_stage(stage_name),
+                    window=window,
+                    quantile=_number(p / 100),
+                )
+
+    counts = monitor.get_counts()
+    out.family("wukong_sessions_total", "counter", "已结束的延迟追踪会话数")
+    out.sample("wukong_sessions_total", counts["sessions"])
+    out.family(
+        "wukong_stage_over_threshold_total", "counter", "超过阶段延迟阈值的次数"
+    )
+    for stage_name, count in sorted(counts["over_threshold"].items()):
+        out.sample("wukong_stage_over_threshold_total", count, stage=_stage(stage_name))
+
+    out.family("wukong_engine_errors_total", "counter", "ASR、TTS、AI 引擎出错次数")
+    for (component, slug), count in sorted(monitor.get_error_counts().items()):
+        out.sample("wukong_engine_errors_total", count, component=component, engine=slug)
+
+
+def _websocket_metrics(out, monitor):
+    ws = monitor.ws_monitor
+    stats = ws.get_stats() or {}
+    out.family("wukong_websocket_rtt_seconds", "gauge", "最近若干次 ping 的 WebSocket 延迟")
+    for stat in ("avg", "max", "min"):
+        value = stats.get(f"{stat}_latency")
+        out.sample("wukong_websocket_rtt_seconds", value / 1000 if value is not None else None, stat=stat)
+    out.family("wukong_websocket_jitter_seconds", "gauge", "最近若干次 ping 的 WebSocket 抖动")
+    for stat in ("avg", "max"):
+        value = stats.get(f"{stat}_jitter")
+        out.sample("wukong_websocket_jitter_seconds", value / 1000 if value is not None else None, stat=stat)
+    out.family("wukong_websocket_packets_total", "counter", "WebSocket ping 和发送的次数")
+    out.sample("wukong_websocket_packets_total", ws.total_packets)
+    out.family("wukong_websocket_packet_loss_total", "counter", "WebSocket 发送失败次数")
+    out.sample("wukong_websocket_packet_loss_total", ws.packet_loss_count)
+
+
+def _tts_cache_metrics(out):
+    stats = get_cache().stats()
+    out.family("wukong_tts_cache_lookups_total", "counter", "TTS 缓存查询次数")
+    out.sample("wukong_tts_cache_lookups_total", stats["hits"], result="hit")
+    out.sample("wukong_tts_cache_lookups_total", stats["misses"], result="miss")
+    out.family("wukong_tts_cache_hit_ratio", "gauge", "启动以来的 TTS 缓存命中率")
+    out.sample("wukong_tts_cache_hit_ratio", stats["hit_ratio"])
+    out.family("wukong_tts_cache_evictions_total", "counter", "TTS 缓存淘汰次数")
+    out.sample("wukong_tts_cache_evictions_total", stats["evictions"])
+    out.family("wukong_tts_cache_entries", "gauge", "TTS 缓存的语音条数")
+    out.sample("wukong_tts_cache_entries", stats["entries"])
+    out.family("wukong_tts_cache_bytes", "gauge", "TTS 缓存占用的字节数")
+    out.sample("wukong_tts_cache_bytes", stats["bytes"])
+
+
+def _player_metrics(out, conversation):
+    sessions = []
+    if conversation is not None:
+        # 本机的默认会话和后台管理端、远程麦克风的客户端会话各有一个播放器
+        with conversation.sessions_lock:
+            sessions = list(conversation.sessions.values())
+        sessions.append(conversation.default_session)
+    players = {id(s.player): s.player for s in sessions if s.player}.values()
+    out.family("wukong_player_queue_depth", "gauge", "所有会话的播放器中排队和正在播放的音频数")
+    out.sample("wukong_player_queue_depth", sum(player.queue_depth() for player in players))
+    out.family("wukong_client_sessions", "gauge", "后台管理端和远程麦克风的客户端会话数")
+    out.sample("wukong_client_sessions", max(len(sessions) - 1, 0))
+
+
+def _rss_bytes():
+    """当前常驻内存，读不到时返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _process_metrics(out):
+    out.family("process_cpu_seconds_total", "counter", "进程消耗的 CPU 时间")
+    out.sample("process_cpu_seconds_total", time.process_time())
+    out.family("process_resident_memory_bytes", "gauge", "进程的常驻内存")
+    out.sample("process_resident_memory_bytes", _rss_bytes())
+    if resource is not None:
+        # Linux 的单位是 KB，macOS 是字节
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        out.family("process_max_resident_memory_bytes", "gauge", "进程常驻内存的峰值")
+        out.sample("process_max_resident_memory_bytes", peak if sys.platform == "darwin" else peak * 1024)
+
+
+def render(conversation=None):
+    """
+    渲染全部指标
+
+    :param conversation: 当前的 Conversation，用于读取各会话的播放器状态
+    :returns: Prometheus 文本格式的指标
+    """
+    out = Exposition()
+    monitor = get_monitor()
+    _latency_metrics(out, monitor)
+    _websocket_metrics(out, monitor)
+    _tts_cache_metrics(out)
+    _player_metrics(out, conversation)
+    _process_metrics(out)
+    return out.render()
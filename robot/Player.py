@@ -1,17 +1,24 @@
 # -*- coding: utf-8 -*-
 import asyncio
+import functools
 import subprocess
 import os
 import platform
+import shutil
 import queue
 import signal
 import threading
+import uuid
+import wave
 
 from robot import logging
 from ctypes import CFUNCTYPE, c_char_p, c_int, cdll
 from contextlib import contextmanager
 
-from . import utils
+from collections import deque
+
+from . import utils, config, constants, AudioEngine
+from .AudioStream import PCMStream
 
 logger = logging.getLogger(__name__)
 
@@ -42,12 +49,32 @@ def play(fname, onCompleted=None):
     player.play(fname, onCompleted=onCompleted)
 
 
+_effect_player = None
+
+
 def getPlayerByFileName(fname):
+    global _effect_player
     foo, ext = os.path.splitext(fname)
     if ext in [".mp3", ".wav"]:
+        if config.get("/audio_output/engine", "pyaudio") == "pyaudio" and AudioEngine.get_engine():
+            # 提示音共用常驻输出引擎上的一个播放器
+            if _effect_player is None:
+                _effect_player = AudioPlayer()
+            return _effect_player
         return SoxPlayer()
 
 
+def get_player():
+    """
+    按 audio_output.engine 配置创建播放器
+
+    :returns: 常驻输出引擎可用时返回 AudioPlayer，否则返回 SoxPlayer
+    """
+    if config.get("/audio_output/engine", "pyaudio") == "pyaudio" and AudioEngine.get_engine():
+        return AudioPlayer()
+    return SoxPlayer()
+
+
 class AbstractPlayer(object):
     def __init__(self, **kwargs):
         super(AbstractPlayer, self).__init__()
@@ -64,6 +91,10 @@ class AbstractPlayer(object):
     def is_playing(self):
         return False
 
+    def queue_depth(self):
+        """已提交但还没播放完的音频数"""
+        return 0
+
     def join(self):
         pass
 
@@ -95,11 +126,12 @@ class SoxPlayer(AbstractPlayer):
 
     def playLoop(self):
         while True:
-            (src, onCompleted) = self.play_queue.get()
+            (src, delete, onCompleted) = self.play_queue.get()
             if src:
                 with self.play_lock:
                     logger.info(f"开始播放音频：{src}")
-                    self.src = src
+                    # 播放完或被打断时按这一段自己的 delete 决定是否删除
+                    self.src, self.delete = src, delete
                     res = self.doPlay(src)
                     self.play_queue.task_done()
                     # 将 onCompleted() 方法的调用放到事件循环的线程中执行
@@ -108,6 +140,8 @@ class SoxPlayer(AbstractPlayer):
                     )
 
     def doPlay(self, src):
+        if isinstance(src, PCMStream):
+            return self.doPlayStream(src)
         system = platform.system()
         if system == "Darwin":
             cmd = ["afplay", str(src)]
@@ -125,10 +159,80 @@ class SoxPlayer(AbstractPlayer):
         logger.info(f"播放完成：{src}")
         return self.proc and self.proc.returncode == 0
 
+    def doPlayStream(self, stream):
+        """边下载边播放：把 PCM 数据块通过管道送给 play"""
+        fmt = stream.wait_format()
+        if not fmt:
+            logger.error(f"音频流没有可播放的数据：{stream}")
+            return False
+        if platform.system() == "Darwin" and not shutil.which("play"):
+            return self.doPlayDownloaded(stream, fmt)
+        rate, channels, width = fmt
+        cmd = [
+            "play", "-q",
+            "-t", "raw", "-r", str(rate), "-c", str(channels),
+            "-b", str(width * 8), "-e", "signed-integer", "-",
+        ]
+        logger.debug("Executing %s", " ".join(cmd))
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.proc = proc
+        self.playing = True
+        try:
+            for chunk in stream:
+                if self.proc is not proc:
+                    # 被 stop() 打断
+                    stream.cancel()
+                    break
+                proc.stdin.write(chunk)
+            proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            stream.cancel()
+        proc.wait()
+        self.playing = False
+        if self.delete:
+            utils.check_and_delete(stream.wait())
+        logger.info(f"播放完成：{stream}")
+        return proc.returncode == 0
+
+    def doPlayDownloaded(self, stream, fmt):
+        """
+        afplay 不支持从管道读取，只能等下载完成。下载好的文件随即可能被
+        移进 TTS 缓存，所以用内存中的数据块另写一个文件来播放
+        """
+        path = stream.wait()
+        if not path:
+            return False
+        rate, channels, width = fmt
+        copy = os.path.join(constants.TEMP_PATH, uuid.uuid4().hex + ".wav")
+        with wave.open(copy, "wb") as w:
+            w.setframerate(rate)
+            w.setnchannels(channels)
+            w.setsampwidth(width)
+            w.writeframes(b"".join(stream))
+        cmd = ["afplay", copy]
+        logger.debug("Executing %s", " ".join(cmd))
+        self.proc = subprocess.Popen(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.playing = True
+        self.proc.wait()
+        self.playing = False
+        utils.check_and_delete(copy)
+        if self.delete:
+            utils.check_and_delete(path)
+        logger.info(f"播放完成：{stream}")
+        return self.proc and self.proc.returncode == 0
+
     def play(self, src, delete=False, onCompleted=None):
-        if src and (os.path.exists(src) or src.startswith("http")):
-            self.delete = delete
-            self.play_queue.put((src, onCompleted))
+        if isinstance(src, PCMStream):
+            self.play_queue.put((src, delete, onCompleted))
+        elif src and (os.path.exists(src) or src.startswith("http")):
+            self.play_queue.put((src, delete, onCompleted))
         else:
             logger.critical(f"path not exists: {src}", stack_info=True)
 
@@ -149,12 +253,17 @@ class SoxPlayer(AbstractPlayer):
             self.proc = None
             self.playing = False
             self._clear_queue()
-            if self.delete:
+            if isinstance(self.src, PCMStream):
+                self.src.cancel()
+            elif self.delete:
                 utils.check_and_delete(self.src)
 
     def is_playing(self):
         return self.playing or not self.play_queue.empty()
 
+    def queue_depth(self):
+        return self.play_queue.qsize() + (1 if self.playing else 0)
+
     def join(self):
         self.play_queue.join()
 
@@ -163,6 +272,158 @@ class SoxPlayer(AbstractPlayer):
             self.play_queue.queue.clear()
 
 
+class AudioPlayer(AbstractPlayer):
+    """
+    常驻输出引擎上的播放器，接口与 SoxPlayer 相同。
+    音频解码成 PCM 后写入引擎的一个声道，不再为每段语音启动 play 进程；
+    相邻的音频无缝衔接，stop() 在一个缓冲周期内生效。
+    """
+
+    SLUG = "AudioPlayer"
+    CHUNK_MS = 100  # 每次写入声道的音频时长
+
+    def __init__(self, engine=None, **kwargs):
+        super(AudioPlayer, self).__init__(**kwargs)
+        self.engine = engine or AudioEngine.get_engine()
+        self.channel = self.engine.open_channel()
+        self.lock = threading.Condition()
+        self.play_queue = deque()
+        self.pending = 0  # 已提交但还没播放完的音频数
+        self.feeding = False
+        self.playing = False
+        self.unfinished = []  # 已取出解码但还没播放完的 (src, delete)
+        self.onCompleteds = []
+
+    def play(self, src, delete=False, onCompleted=None):
+        if not (
+            isinstance(src, PCMStream)
+            or (src and (os.path.exists(src) or src.startswith("http")))
+        ):
+            logger.critical(f"path not exists: {src}", stack_info=True)
+            return
+        with self.lock:
+            self.play_queue.append((src, delete, onCompleted, self.channel.generation))
+            self.pending += 1
+            self.playing = True
+            if not self.feeding:
+                # 解码线程只在有音频时运行，空闲的播放器不占用线程
+                self.feeding = True
+                threading.Thread(target=self.feedLoop, daemon=True).start()
+
+    def feedLoop(self):
+        while True:
+            with self.lock:
+                if not self.play_queue:
+                    self.feeding = False
+                    return
+                src, delete, onCompleted, generation = self.play_queue.popleft()
+                # 被打断时由 stop() 按这一段自己的 delete 决定是否删除
+                self.unfinished.append((src, delete))
+            if generation != self.channel.generation:
+                continue
+            logger.info(f"开始播放音频：{src}")
+            try:
+                res = self.doFeed(src, generation)
+            except Exception as e:
+                logger.error(f"音频解码失败：{src}，{e}")
+                res = False
+            self.channel.mark(
+                functools.partial(
+                    self.executeOnCompleted, src, res, delete, onCompleted, generation
+                ),
+                generation,
+            )
+
+    def doFeed(self, src, generation):
+        """把音频解码后写入声道，声道被清空时返回 False"""
+        rate, channels = self.engine.rate, self.engine.channels
+        if isinstance(src, PCMStream):
+            fmt = src.wait_format()
+            if not fmt:
+                return False
+            resampler = AudioEngine.Resampler(*fmt, rate, channels)
+            for chunk in src:
+                if not self.channel.write(resampler.process(chunk), generation):
+                    src.cancel()
+                    return False
+            return True
+        pcm = AudioEngine.decode(str(src), rate, channels)
+        step = int(rate * self.CHUNK_MS / 1000) * self.engine.frame_size
+        for i in range(0, len(pcm), step):
+            if not self.channel.write(pcm[i : i + step], generation):
+                return False
+        return True
+
+    def executeOnCompleted(self, src, res, delete, onCompleted, generation):
+        # 在引擎的分发线程中执行
+        if delete:
+            utils.check_and_delete(src.wait() if isinstance(src, PCMStream) else src)
+        logger.info(f"播放完成：{src}")
+        with self.lock:
+            if generation != self.channel.generation:
+                return
+            self.unfinished.remove((src, delete))
+            self.pending -= 1
+            last = self.pending <= 0
+            if last:
+                self.playing = False
+                self.lock.notify_all()
+            onCompleteds = list(self.onCompleteds) if last else []
+        res and onCompleted and onCompleted()
+        # 全部播放完成，播放统一的 onCompleted()
+        for onCompleted in onCompleteds:
+            onCompleted and onCompleted()
+
+    def preappendCompleted(self, onCompleted):
+        onCompleted and self.onCompleteds.insert(0, onCompleted)
+
+    def appendOnCompleted(self, onCompleted):
+        onCompleted and self.onCompleteds.append(onCompleted)
+
+    def stop(self):
+        with self.lock:
+            # 清空后这些音频的完成标记不会再执行，临时文件在这里删除
+            discarded = self.unfinished + [item[:2] for item in self.play_queue]
+            self.unfinished = []
+            self.onCompleteds = []
+            self.play_queue.clear()
+            self.channel.clear()
+            self.pending = 0
+            self.playing = False
+            self.lock.notify_all()
+        for src, delete in discarded:
+            self.discard(src, delete)
+
+    @staticmethod
+    def discard(src, delete):
+        """丢弃没播放完的音频：取消下载，delete 为 True 时删除文件"""
+        if isinstance(src, PCMStream):
+            src.cancel()
+            if delete:
+                # 取消后下载线程很快结束，完整下载过的音频才会留下文件
+                threading.Thread(
+                    target=lambda: utils.check_and_delete(src.wait()), daemon=True
+                ).start()
+        elif delete:
+            utils.check_and_delete(src)
+
+    def pause(self):
+        self.channel.paused = True
+
+    def resume(self):
+        self.channel.paused = False
+
+    def is_playing(self):
+        return self.playing
+
+    def queue_depth(self):
+        return max(0, self.pending)
+
+    def join(self):
+        with self.lock:
+            self.lock.wait_for(lambda: self.pending <= 0)
+
+
 class MusicPlayer(SoxPlayer):
     """
     给音乐播放器插件使用的，
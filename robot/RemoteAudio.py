@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+远程麦克风
+
+浏览器或卫星设备通过 WebSocket 发来 16bit 单声道 PCM，服务端按采集格式
+（16kHz）分帧，用配置的 VAD 做端点检测：用户开口后把预录音和之后的每一帧
+边收边送给 ASR 流式识别，说完时取出整句录音交给 Conversation.doConverse，
+和本机麦克风走同一条链路。
+"""
+
+from collections import deque
+
+from robot import AudioCapture, VAD, config, logging
+from robot.AudioEngine import Resampler
+
+logger = logging.getLogger(__name__)
+
+FRAME_BYTES = AudioCapture.FRAME_BYTES
+FRAME_MS = AudioCapture.FRAMES_PER_BUFFER * 1000 / AudioCapture.RATE
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+
+class RemoteListener(object):
+    """
+    一路远程音频
+
+    :param create_stream: 开口时调用，返回 ASRStream 或 None（见 Conversation.createASRStream）
+    :param rate: 客户端发来的 PCM 采样率，不是 16kHz 时在服务端重采样
+    :param endpointing: 是否由服务端判断开口和说完；False 时由客户端发 end 结束一句话
+    :param preroll_ms: 判定开口之前保留多长的录音，避免丢掉第一个字
+    :param recording_timeout: 一句话最长多少秒
+    """
+
+    def __init__(
+        self,
+        create_stream,
+        rate=AudioCapture.RATE,
+        endpointing=True,
+        preroll_ms=400,
+        recording_timeout=15,
+    ):
+        self.create_stream = create_stream
+        self.resampler = (
+            Resampler(rate, 1, AudioCapture.SAMPLE_WIDTH, AudioCapture.RATE, 1)
+            if rate != AudioCapture.RATE
+            else None
+        )
+        self.endpointer = VAD.get_endpointer() if endpointing else None
+        if self.endpointer and isinstance(self.endpointer.vad, VAD.SnowboyVAD):
+            # snowboy 的静音判断依赖唤醒检测的结果，远程音频没有
+            logger.warning("远程音频不支持 snowboy VAD，需由客户端结束录音")
+            self.endpointer = None
+        self.preroll = deque(maxlen=max(1, int(preroll_ms / FRAME_MS)))
+        self.max_frames = int(recording_timeout * 1000 / FRAME_MS)
+        self.pending = b""  # 不足一帧的尾部
+        self.reset()
+
+    @property
+    def endpointing(self):
+        return self.endpointer is not None
+
+    def reset(self):
+        """准备接收下一句话"""
+        self.speaking = False
+        self.frames = []
+        self.asr_stream = None
+        if self.endpointer:
+            # 远程麦克风一直开着，开口前不限制等待时间
+            self.endpointer.reset(leading_ms=float("inf"))
+        self.preroll.clear()
+
+    def _record(self, frame):
+        if self.asr_stream is None and not self.frames:
+            self.asr_stream = self.create_stream()
+        self.frames.append(frame)
+        self.asr_stream and self.asr_stream.feed(frame)
+
+    def write(self, data):
+        """
+        收到一段 PCM
+
+        :param data: 客户端格式的 PCM 字节串
+        :returns: 事件列表（SPEECH_START、SPEECH_END）；收到 SPEECH_END 后应调用 finish()
+        """
+        if self.resampler:
+            data = self.resampler.process(data)
+        data = self.pending + data
+        events = []
+        offset = 0
+        while offset + FRAME_BYTES <= len(data):
+            frame = data[offset : offset + FRAME_BYTES]
+            offset += FRAME_BYTES
+            if not self.endpointer:
+                self._record(frame)
+            elif not self.speaking:
+                self.preroll.append(frame)
+                self.endpointer.process(frame)
+                if self.endpointer.triggered:
+                    self.speaking = True
+                    events.append(SPEECH_START)
+                    for f in self.preroll:
+                        self._record(f)
+                    self.preroll.clear()
+            else:
+                self._record(frame)
+                if self.endpointer.process(frame):
+                    events.append(SPEECH_END)
+                    break
+            if len(self.frames) >= self.max_frames:
+                logger.info("远程录音超过最长时长，结束录音")
+                events.append(SPEECH_END)
+                break
+        # 说完之后剩下的音频留给下一句
+        self.pending = data[offset:]
+        return events
+
+    def finish(self):
+        """
+        结束当前这句话，准备接收下一句
+
+        :returns: (采集格式的 PCM, ASRStream 或 None)，没有录到声音时 PCM 为空
+        """
+        pcm, asr_stream = b"".join(self.frames), self.asr_stream
+        self.reset()
+        if not pcm and asr_stream:
+            asr_stream.cancel()
+            asr_stream = None
+        return pcm, asr_stream
+
+    def cancel(self):
+        """放弃当前这句话"""
+        self.asr_stream and self.asr_stream.cancel()
+        self.pending = b""
+        self.reset()
+
+
+def create(conversation, rate=AudioCapture.RATE, endpointing=True):
+    """
+    按配置为一路远程音频创建 RemoteListener
+
+    :param conversation: 用于创建流式识别的 Conversation
+    :param rate: 客户端发来的 PCM 采样率
+    :param endpointing: 是否由服务端判断说完
+    """
+    return RemoteListener(
+        conversation.createASRStream,
+        rate=rate,
+        endpointing=endpointing,
+        preroll_ms=config.get("/audio_input/preroll_ms", 400),
+        recording_timeout=config.get("recording_timeout", 15),
+    )
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+有序播放调度器
+
+TTS 分段是并行合成的，但必须严格按照分段序号交给播放器。
+这里实现一个按序号重排的缓冲区（reorder buffer）：
+合成线程完成后把结果放进来即可返回，补齐当前等待序号的线程在锁外
+把已经就绪的连续分段依次交给 sink（同一时刻只有一个线程在交付），
+等待期间不占用任何 CPU。
+"""
+
+import threading
+
+from robot import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedSequencer(object):
+    """
+    按序号重排的缓冲区
+
+    :param sink: 分段就绪时的回调，签名为 sink(index, item)，
+                 保证按 index 从小到大、逐个串行调用
+    """
+
+    def __init__(self, sink):
+        self._sink = sink
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._next = 0  # 下一个等待提交的序号
+        self._delivering = False  # 是否已有线程在交付
+        self._generation = 0  # 每次 reset 加一，作废上一轮正在进行的交付
+
+    def reset(self):
+        """开始新一轮播放，序号从 0 重新计数"""
+        with self._lock:
+            self._pending.clear()
+            self._next = 0
+            self._delivering = False
+            self._generation += 1
+
+    def put(self, index, item):
+        """
+        提交第 index 段的结果
+
+        sink 在锁外调用，sink 阻塞时其他线程仍可提交，它们的分段由正在
+        交付的线程按序交给 sink
+
+        :param index: 分段序号
+        :param item: 分段内容。为 None 表示该段合成失败或被跳过，
+                     只占用序号，不会交给 sink
+        """
+        with self._lock:
+            if index < self._next or index in self._pending:
+                logger.warning(f"第{index}段重复提交，忽略")
+                return
+            self._pending[index] = item
+            if self._delivering:
+                return
+            self._delivering = True
+            generation = self._generation
+        while True:
+            with self._lock:
+                if generation != self._generation:
+                    return
+                if self._next not in self._pending:
+                    self._delivering = False
+                    return
+                index = self._next
+                ready = self._pending.pop(index)
+                self._next += 1
+            if ready is not None:
+                try:
+                    self._sink(index, ready)
+                except Exception as e:
+                    logger.error(f"第{index}段交付失败：{e}", stack_info=True)
+
+
+class PlaybackRound(object):
+    """
+    一次回复（say 或 stream_say）的分段播放进度
+
+    每次回复各有一份，上一次回复还在播放时开始新的回复也互不影响。
+    分段交给播放器时调用 delivered()，播放完成时调用 played()；合成全部
+    结束后调用 finish()，此时最后一个交给播放器的分段播完（或者根本没有
+    可播放的分段）就调用一次 onCompleted，不依赖最后一个序号的分段合成成功。
+
+    :param onCompleted: 全部分段播放完成后的回调
+    """
+
+    def __init__(self, onCompleted=None):
+        self.onCompleted = onCompleted
+        self.lock = threading.Lock()
+        self.last_delivered = -1  # 已经交给播放器的最大分段序号
+        self.last_played = -1  # 已经播放完成的最大分段序号
+        self.finished = False  # 合成是否已经全部结束
+        self.completed = False
+
+    def delivered(self, index):
+        with self.lock:
+            self.last_delivered = max(self.last_delivered, index)
+
+    def played(self, index):
+        with self.lock:
+            self.last_played = max(self.last_played, index)
+        self._check()
+
+    def finish(self):
+        """合成全部结束，之后不会再有新的分段交给播放器"""
+        with self.lock:
+            self.finished = True
+        self._check()
+
+    def _check(self):
+        with self.lock:
+            if self.completed or not self.finished or self.last_played < self.last_delivered:
+                return
+            self.completed = True
+        self.onCompleted and self.onCompleted()
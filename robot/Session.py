@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+对话会话
+
+Conversation 里和“当前这一轮对话”有关的状态都放在 Session 里：回调、
+延迟追踪的会话 ID、声纹识别出的用户、沉浸模式、角色语音、播放器，以及
+分段播放的序号。本机麦克风使用默认会话，后台管理端和远程麦克风的每个
+客户端各有一个会话，多个客户端可以同时对话而不会互相覆盖。
+
+ASR、NLU、TTS 引擎和技能在所有会话间共享；对话机器人（AI）会保存上下文，
+每个客户端的会话各用一个实例。
+"""
+
+import threading
+
+from robot import logging
+from robot.Sequencer import OrderedSequencer
+
+logger = logging.getLogger(__name__)
+
+
+class Session(object):
+    """
+    一个客户端的对话状态
+
+    :param key: 会话标识（客户端或 UUID），本机的默认会话为 None
+    :param ai: 对话机器人
+    :param tts: 当前使用的 TTS 引擎（可被声纹识别切换为角色语音）
+    :param player: 播放器
+    :param play_segment: 分段就绪时的回调，签名为 play_segment(session, index, segment)
+    """
+
+    def __init__(self, key=None, ai=None, tts=None, player=None, play_segment=None):
+        self.key = key
+        self.ai = ai
+        self.tts = tts
+        self.player = player
+        self.onSay = None
+        self.onStream = None
+        self.current_session_id = None  # 延迟追踪的会话ID
+        self.current_user_context = None  # 当前用户画像
+        # 沉浸模式，处于这个模式下，被打断后将自动恢复这个技能
+        self.immersiveMode = None
+        self.matchPlugin = None
+        self.hasPardon = False
+        # 分段播放的状态，同一会话的多次回复按顺序合成，不会互相重置序号
+        self.tts_lock = threading.Lock()
+        self.completed_lock = threading.Lock()
+        self.first_audio_pending = False  # 本轮回复是否还未开始出声
+        self.segment_end_time = None  # 上一段播放完成的时间，用于统计句间断音
+        # 并行合成的 TTS 分段按序号交给播放器
+        self.sequencer = OrderedSequencer(
+            lambda index, segment: play_segment(self, index, segment)
+        )
+
+    def close(self):
+        """客户端离开时停止播放"""
+        try:
+            self.player and self.player.stop()
+        except Exception as e:
+            logger.debug(f"停止会话 {self.key} 的播放器失败：{e}")
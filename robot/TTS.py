@@ -1,5 +1,6 @@
 # -*- coding: utf -8-*-
 import os
+import json
 import base64
 import tempfile
 import pypinyin
@@ -11,13 +12,13 @@ import edge_tts
 import nest_asyncio
 
 from aip import AipSpeech
-from . import utils, config, constants
+from . import utils, config, constants, AudioStream
 from robot import logging
 from pathlib import Path
 from pypinyin import lazy_pinyin
 from pydub import AudioSegment
 from abc import ABCMeta, abstractmethod
-from .sdk import TencentSpeech, AliSpeech, XunfeiSpeech, atc, VITSClient, VolcengineSpeech, GPTSoVITSClient
+from .sdk import TencentSpeech, AliSpeech, XunfeiSpeech, atc, VITSClient, VolcengineSpeech, GPTSoVITSClient, HttpClient
 import requests
 from xml.etree import ElementTree
 
@@ -31,6 +32,9 @@ class AbstractTTS(object):
 
     __metaclass__ = ABCMeta
 
+    # 会影响合成结果（音色、语速等）的实例属性，用于区分不同音色的缓存
+    IDENTITY_KEYS = ("voice",)
+
     @classmethod
     def get_config(cls):
         return {}
@@ -41,6 +45,27 @@ class AbstractTTS(object):
         instance = cls(**profile)
         return instance
 
+    def get_identity(self):
+        """
+        引擎身份：引擎 SLUG 以及所有会影响合成结果的参数
+
+        :returns: 身份字典
+        """
+        identity = {"engine": getattr(self, "SLUG", type(self).__name__)}
+        for key in self.IDENTITY_KEYS:
+            identity[key] = getattr(self, key, None)
+        return identity
+
+    def cache_namespace(self):
+        """
+        语音缓存的命名空间，身份相同的引擎实例共享缓存
+
+        :returns: 命名空间字符串
+        """
+        return json.dumps(
+            self.get_identity(), sort_keys=True, ensure_ascii=False, default=str
+        )
+
     @abstractmethod
     def get_speech(self, phrase):
         pass
@@ -154,11 +179,13 @@ class AzureTTS(AbstractTTS):
     """
 
     SLUG = "azure-tts"
+    IDENTITY_KEYS = ("lang", "voice")
 
     def __init__(
         self, secret_key, region, lang="zh-CN", voice="zh-CN-XiaoxiaoNeural", **args
     ) -> None:
         super(self.__class__, self).__init__()
+        self.lang, self.voice = lang, voice
         self.post_url = "https://INSERT_REGION_HERE.tts.speech.microsoft.com/cognitiveservices/v1".replace(
             "INSERT_REGION_HERE", region
         )
@@ -169,14 +196,7 @@ class AzureTTS(AbstractTTS):
             "X-Microsoft-OutputFormat": "audio-16khz-128kbitrate-mono-mp3",
             "User-Agent": "curl",
         }
-        self.sess = requests.session()
-        body = ElementTree.Element("speak", version="1.0")
-        body.set("xml:lang", "en-us")
-        vc = ElementTree.SubElement(body, "voice")
-        vc.set("xml:lang", lang)
-        vc.set("name", voice)
-        self.body = body
-        self.vc = vc
+        self.sess = HttpClient.get_session(self.post_url)
 
     @classmethod
     def get_config(cls):
@@ -184,11 +204,17 @@ class AzureTTS(AbstractTTS):
         return config.get("azure_yuyin", {})
 
     def get_speech(self, phrase):
-        self.vc.text = phrase
+        # 每次请求单独构造 SSML，同一个引擎可以被多个合成线程同时使用
+        body = ElementTree.Element("speak", version="1.0")
+        body.set("xml:lang", "en-us")
+        vc = ElementTree.SubElement(body, "voice")
+        vc.set("xml:lang", self.lang)
+        vc.set("name", self.voice)
+        vc.text = phrase
         result = self.sess.post(
             self.post_url,
             headers=self.post_header,
-            data=ElementTree.tostring(self.body),
+            data=ElementTree.tostring(body),
         )
         # 识别正确返回语音二进制,http状态码为200
         if result.status_code == 200:
@@ -217,6 +243,7 @@ class BaiduTTS(AbstractTTS):
     """
 
     SLUG = "baidu-tts"
+    IDENTITY_KEYS = ("per", "lan")
 
     def __init__(self, appid, api_key, secret_key, per=1, lan="zh", **args):
         super(self.__class__, self).__init__()
@@ -254,6 +281,7 @@ class TencentTTS(AbstractTTS):
     """
 
     SLUG = "tencent-tts"
+    IDENTITY_KEYS = ("voiceType", "language")
 
     def __init__(
         self,
@@ -292,6 +320,7 @@ class XunfeiTTS(AbstractTTS):
     """
 
     SLUG = "xunfei-tts"
+    IDENTITY_KEYS = ("voice_name",)
 
     def __init__(self, appid, api_key, api_secret, voice="xiaoyan"):
         super(self.__class__, self).__init__()
@@ -424,6 +453,7 @@ class VITS(AbstractTTS):
     """
 
     SLUG = "VITS"
+    IDENTITY_KEYS = ("server_url", "speaker_id", "length", "noise", "noisew", "max")
 
     def __init__(self, server_url, api_key, speaker_id, length, noise, noisew, max, timeout, **args):
         super(self.__class__, self).__init__()
@@ -475,9 +505,11 @@ class VolcengineTTS(AbstractTTS):
     """
 
     SLUG = "volcengine-tts"
+    IDENTITY_KEYS = ("cluster", "voice_type")
 
     def __init__(self, appid, token, cluster, voice_type, **args):
         super(self.__class__, self).__init__()
+        self.cluster, self.voice_type = cluster, voice_type
         self.engine = VolcengineSpeech.VolcengineTTS(appid=appid, token=token, cluster=cluster, voice_type=voice_type)
 
     @classmethod
@@ -514,6 +546,7 @@ class GPTSoVITS(AbstractTTS):
     temperature: 温度参数，默认 1.0
     speed: 语速，默认 1.0
     timeout: 请求超时时间（秒），默认 30
+    streaming: 是否边下载边播放，默认读取 gpt_sovits.streaming
     
     配置示例：
     gpt_sovits:
@@ -527,9 +560,25 @@ class GPTSoVITS(AbstractTTS):
         temperature: 1.0
         speed: 1.0
         timeout: 30
+        streaming: true
     """
 
     SLUG = "gpt-sovits"
+    IDENTITY_KEYS = (
+        "server_url",
+        "text_lang",
+        "ref_audio_path",
+        "prompt_text",
+        "prompt_lang",
+        "aux_ref_audio_paths",
+        "top_k",
+        "top_p",
+        "temperature",
+        "text_split_method",
+        "speed_factor",
+        "seed",
+        "repetition_penalty",
+    )
 
     def __init__(
         self,
@@ -549,6 +598,7 @@ class GPTSoVITS(AbstractTTS):
         parallel_infer=True,
         repetition_penalty=1.35,
         timeout=30,
+        streaming=None,
         **args
     ):
         super(self.__class__, self).__init__()
@@ -568,6 +618,9 @@ class GPTSoVITS(AbstractTTS):
         self.parallel_infer = parallel_infer
         self.repetition_penalty = repetition_penalty
         self.timeout = timeout
+        if streaming is None:
+            streaming = config.get("/gpt_sovits/streaming", False)
+        self.streaming = streaming
 
     @classmethod
     def get_config(cls):
@@ -641,6 +694,74 @@ class GPTSoVITS(AbstractTTS):
             )
             return None
 
+    def get_speech_stream(self, phrase):
+        """
+        以流式模式合成语音，收到响应头后立即返回
+
+        :param phrase: 要合成的文本
+        :returns: AudioStream.PCMStream，请求失败返回 None
+        """
+        try:
+            response = GPTSoVITSClient.tts_stream(
+                text=phrase,
+                server_url=self.server_url,
+                text_lang=self.text_lang,
+                ref_audio_path=self.ref_audio_path,
+                prompt_text=self.prompt_text,
+                prompt_lang=self.prompt_lang,
+                aux_ref_audio_paths=self.aux_ref_audio_paths,
+                top_k=self.top_k,
+                top_p=self.top_p,
+                temperature=self.temperature,
+                text_split_method=self.text_split_method,
+                batch_size=self.batch_size,
+                speed_factor=self.speed_factor,
+                seed=self.seed,
+                parallel_infer=self.parallel_infer,
+                repetition_penalty=self.repetition_penalty,
+                timeout=self.timeout,
+            )
+        except Exception as e:
+            logger.critical(
+                f"{self.SLUG} 流式合成失败：{type(e).__name__}: {str(e)}",
+                stack_info=True
+            )
+            return None
+        logger.info(f"{self.SLUG} 开始接收流式语音，文本长度: {len(phrase)}")
+        return AudioStream.PCMStream(
+            response.iter_content(chunk_size=4096), close=response.close
+        )
+
+
+def get_engine_by_voice(voice_config):
+    """
+    根据角色语音配置创建 TTS 引擎
+
+    :param voice_config: CharacterVoice 中的语音配置，engine 字段为引擎 SLUG
+                         （不区分大小写，如 "vits" 也能匹配 VITS），
+                         其余字段（description 除外）覆盖该引擎在配置文件中
+                         的同名参数，没有写的参数沿用配置文件
+    :returns: TTS 引擎实例
+
+    Raises:
+        ValueError if no engine matches the slug
+    """
+    slug = voice_config.get("engine") or ""
+    selected_engines = [
+        engine for engine in get_engines() if engine.SLUG.lower() == slug.lower()
+    ]
+    if len(selected_engines) == 0:
+        raise ValueError(f"错误：找不到名为 {slug} 的 TTS 引擎")
+    engine = selected_engines[0]
+    params = dict(engine.get_config() or {})
+    params.update(
+        (key, value)
+        for key, value in voice_config.items()
+        if key not in ("engine", "description")
+    )
+    return engine(**params)
+
+
 def get_engines():
     def get_subclasses(cls):
         subclasses = set()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+TTS 语音缓存
+
+两级缓存：进程内维护一个 LRU 索引，磁盘上按缓存键的 md5 存放音频文件。
+- 查询只访问内存索引，不再逐个探测文件是否存在；命中时确认文件还在，
+  被外部删除的条目当作未命中并移出索引
+- 缓存键包含 TTS 引擎的身份（引擎、发音人、语速等），切换角色语音后不会命中其他音色的缓存
+- 按条目数和总字节数做 LRU 淘汰，淘汰在进程内完成，不再调用 find
+- 统计命中、未命中和淘汰次数
+
+启动时扫描一次缓存目录重建索引，并清理超过 lru_cache.days 天未修改的文件。
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from collections import OrderedDict
+from robot import config, constants, logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join(constants.TEMP_PATH, "tts_cache")
+
+
+def namespace(tts):
+    """
+    TTS 引擎实例对应的缓存命名空间
+
+    :param tts: TTS 引擎实例，为 None 时使用公共命名空间
+    :returns: 命名空间字符串
+    """
+    if tts is None:
+        return ""
+    if hasattr(tts, "cache_namespace"):
+        return tts.cache_namespace()
+    slug = getattr(tts, "SLUG", type(tts).__name__)
+    voice = getattr(tts, "voice", "")
+    return f"{slug}:{voice}"
+
+
+def make_key(msg, tts=None):
+    """
+    计算缓存键
+
+    :param msg: 要朗读的文本
+    :param tts: 合成所用的 TTS 引擎实例
+    :returns: 缓存键（md5）
+    """
+    raw = f"{namespace(tts)}|{msg}"
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache(object):
+    """
+    带索引的 TTS 语音缓存
+
+    :param path: 缓存目录
+    :param max_entries: 最大缓存条目数，<= 0 表示不限制
+    :param max_bytes: 最大缓存字节数，<= 0 表示不限制
+    :param days: 启动时清理超过多少天未修改的文件，<= 0 表示不清理
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=1000, max_bytes=0, days=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.days = days
+        self.lock = threading.Lock()
+        self.index = OrderedDict()  # key -> (文件路径, 字节数)，按最近使用排序
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    def _load(self):
+        """扫描缓存目录，重建内存索引"""
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+            return
+        expire = time.time() - self.days * 86400 if self.days > 0 else 0
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime < expire:
+                    self._remove(entry.path)
+                    continue
+                key, _ = os.path.splitext(entry.name)
+                entries.append((stat.st_mtime, key, entry.path, stat.st_size))
+        for _, key, path, size in sorted(entries):
+            self.index[key] = (path, size)
+            self.total_bytes += size
+        with self.lock:
+            self._trim()
+        logger.info(f"TTS 缓存索引已加载：{len(self.index)} 条，{self.total_bytes} 字节")
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _trim(self):
+        """按 LRU 淘汰超出限制的条目，调用方需持有锁"""
+        while self.index and (
+            (self.max_entries > 0 and len(self.index) > self.max_entries)
+            or (self.max_bytes > 0 and self.total_bytes > self.max_bytes)
+        ):
+            _, (path, size) = self.index.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            self._remove(path)
+
+    def get(self, msg, tts=None):
+        """
+        查询缓存
+
+        :param msg: 要朗读的文本
+        :param tts: 合成所用的 TTS 引擎实例
+        :returns: 缓存的音频路径，未命中返回 None
+        """
+        key = make_key(msg, tts)
+        with self.lock:
+            item = self.index.get(key)
+        if item is not None and not os.path.exists(item[0]):
+            logger.warning(f"TTS 缓存文件已不存在，移出索引：{item[0]}")
+            with self.lock:
+                if self.index.get(key) == item:
+                    del self.index[key]
+                    self.total_bytes -= item[1]
+            item = None
+        with self.lock:
+            if item is None:
+                self.misses += 1
+                return None
+            self.index.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, voice, msg, tts=None, move=True):
+        """
+        把合成好的音频加入缓存
+
+        :param voice: 音频文件路径
+        :param msg: 要朗读的文本
+        :param tts: 合成所用的 TTS 引擎实例
+        :param move: True: 直接把文件移动到缓存目录; False: 复制一份
+        :returns: 缓存后的音频路径
+        """
+        key = make_key(msg, tts)
+        _, ext = os.path.splitext(voice)
+        target = os.path.join(self.path, key + ext)
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        if move:
+            shutil.move(voice, target)
+        else:
+            shutil.copyfile(voice, target)
+        size = os.path.getsize(target)
+        with self.lock:
+            old = self.index.pop(key, None)
+            if old:
+                self.total_bytes -= old[1]
+                if old[0] != target:
+                    self._remove(old[0])
+            self.index[key] = (target, size)
+            self.total_bytes += size
+            self._trim()
+        return target
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            for path, _ in self.index.values():
+                self._remove(path)
+            self.index.clear()
+            self.total_bytes = 0
+
+    def trim(self):
+        """按当前配置执行一次淘汰"""
+        with self.lock:
+            self._trim()
+
+    def stats(self):
+        """缓存统计信息"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.index),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+
+# 全局单例
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """获取全局 TTS 缓存实例"""
+    global _tts_cache
+    if _tts_cache is None:
+        with _tts_cache_lock:
+            if _tts_cache is None:
+                enable = config.get("/lru_cache/enable", True)
+                _tts_cache = TTSCache(
+                    max_entries=config.get("/lru_cache/max_entries", 1000),
+                    max_bytes=config.get("/lru_cache/max_size", 200) * 1024 * 1024,
+                    days=config.get("/lru_cache/days", 7) if enable else 0,
+                )
+    return _tts_cache
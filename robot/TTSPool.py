@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+角色 TTS 引擎池
+
+按角色缓存 TTS 引擎实例：每个角色的引擎只在第一次使用时构建，之后的切换
+只是替换引用。每次取用时比对 CharacterVoice 中该角色配置的指纹，配置变化
+（如 add_character_voice 修改了角色）时才重新构建。合成失败的引擎由
+discard() 移出池，下次取用时重新构建，不会一直交出坏掉的实例。
+"""
+
+import json
+import threading
+
+from collections import Counter
+from robot import logging, CharacterVoice, TTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEY = "__default__"
+
+
+def fingerprint(voice_config):
+    """
+    语音配置的指纹
+
+    :param voice_config: CharacterVoice 中的语音配置
+    :returns: 指纹字符串
+    """
+    return json.dumps(voice_config, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class TTSEnginePool(object):
+    """
+    按角色复用的 TTS 引擎池
+
+    :param factory: 根据语音配置构建引擎的函数，默认 TTS.get_engine_by_voice
+    """
+
+    def __init__(self, factory=None):
+        self.factory = factory or TTS.get_engine_by_voice
+        self.lock = threading.Lock()
+        self.engines = {}  # key -> (配置指纹, 引擎实例)
+        self.building = {}  # key -> 正在构建的 threading.Event
+        self.constructions = Counter()
+        self.failures = Counter()
+        self.evictions = Counter()
+        self.hits = 0
+
+    def get(self, key, voice_config):
+        """
+        获取某个角色的引擎，必要时构建
+
+        :param key: 角色名
+        :param voice_config: 该角色当前的语音配置
+        :returns: TTS 引擎实例
+
+        Raises:
+            构建失败时抛出 factory 的异常
+
+        构建可能很慢（加载模型、建立连接），因此在锁外进行：同一角色同时只有
+        一个线程在构建，其他线程等它结束后重新检查，不同角色互不阻塞。
+        """
+        fp = fingerprint(voice_config)
+        while True:
+            with self.lock:
+                item = self.engines.get(key)
+                if item and item[0] == fp:
+                    self.hits += 1
+                    return item[1]
+                pending = self.building.get(key)
+                if pending is None:
+                    done = self.building[key] = threading.Event()
+                    break
+            pending.wait()
+        try:
+            engine = self.factory(voice_config)
+        except Exception:
+            with self.lock:
+                self.failures[key] += 1
+                del self.building[key]
+            done.set()
+            raise
+        with self.lock:
+            self.constructions[key] += 1
+            self.engines[key] = (fp, engine)
+            del self.building[key]
+        done.set()
+        if item:
+            logger.info(f"角色 {key} 的语音配置已变化，重新构建 {voice_config.get('engine')} 引擎")
+        else:
+            logger.info(f"为角色 {key} 构建 {voice_config.get('engine')} 引擎")
+        return engine
+
+    def get_character(self, character_name):
+        """
+        获取角色对应的引擎，未配置的角色使用默认语音
+
+        :param character_name: 角色名
+        :returns: TTS 引擎实例
+        """
+        if character_name in CharacterVoice.CHARACTER_VOICE_MAP:
+            return self.get(character_name, CharacterVoice.CHARACTER_VOICE_MAP[character_name])
+        return self.get_default()
+
+    def get_default(self):
+        """获取默认语音的引擎"""
+        return self.get(DEFAULT_KEY, CharacterVoice.DEFAULT_VOICE)
+
+    def invalidate(self, key=None):
+        """
+        丢弃引擎，下次取用时重新构建
+
+        :param key: 角色名，为 None 时清空整个池
+        """
+        with self.lock:
+            if key is None:
+                self.engines.clear()
+            else:
+                self.engines.pop(key, None)
+
+    def discard(self, engine):
+        """
+        合成失败时丢弃引擎，下次取用该角色时重新构建
+
+        :param engine: 出错的引擎实例，不在池中时忽略
+        :returns: 被丢弃的角色名列表
+        """
+        with self.lock:
+            keys = [k for k, (_, e) in self.engines.items() if e is engine]
+            for key in keys:
+                del self.engines[key]
+                self.evictions[key] += 1
+        keys and logger.warning(f"角色 {', '.join(keys)} 的 TTS 引擎合成失败，已移出引擎池")
+        return keys
+
+    def stats(self):
+        """引擎池统计信息"""
+        with self.lock:
+            return {
+                "engines": len(self.engines),
+                "hits": self.hits,
+                "constructions": dict(self.constructions),
+                "total_constructions": sum(self.constructions.values()),
+                "failures": dict(self.failures),
+                "evictions": dict(self.evictions),
+            }
+
+
+# 全局单例
+_tts_pool = None
+_tts_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取全局 TTS 引擎池实例"""
+    global _tts_pool
+    if _tts_pool is None:
+        with _tts_pool_lock:
+            if _tts_pool is None:
+                _tts_pool = TTSEnginePool()
+    return _tts_pool
@@ -1,8 +1,20 @@
-import webrtcvad
+import threading
+from abc import ABCMeta, abstractmethod
+
 import numpy as np
 
+from robot import config, constants, logging
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+
 class OptimizedVAD:
     def __init__(self, sample_rate=16000, frame_duration=30, level=3):
+        import webrtcvad
+
         self.vad = webrtcvad.Vad(level)
         self.sample_rate = sample_rate
         self.frame_size = int(sample_rate * frame_duration / 1000)
@@ -17,4 +29,324 @@ class OptimizedVAD:
         is_speech_vad = self.vad.is_speech(frame, self.sample_rate)
         
         # 结合两者：能量需超过阈值且 VAD 判定为语音
-        return is_speech_vad and energy > self.energy_threshold
\ No newline at end of file
+        return is_speech_vad and energy > self.energy_threshold
+
+
+class AbstractVAD(metaclass=ABCMeta):
+    """
+    逐段判断录音中是否有人说话，输入均为 16kHz 16bit 单声道 PCM
+    """
+
+    SLUG = None
+
+    def reset(self):
+        """开始新的一段录音"""
+        pass
+
+    @abstractmethod
+    def is_speech(self, data, status=None):
+        """
+        :param data: 一段 PCM（通常是 snowboy 的一帧，512 个采样）
+        :param status: snowboy RunDetection 对这段音频的返回值
+        :returns: 是否包含语音
+        """
+        pass
+
+
+class SnowboyVAD(AbstractVAD):
+    """沿用 snowboy 的判断：RunDetection 返回 -2 即为静音"""
+
+    SLUG = "snowboy"
+
+    def is_speech(self, data, status=None):
+        return status != -2
+
+
+class FramedVAD(AbstractVAD):
+    """
+    需要固定帧长的 VAD：输入先攒成整帧，不足一帧的部分留到下一次
+
+    :param frame_samples: 每帧的采样数
+    """
+
+    def __init__(self, frame_samples):
+        self.frame_bytes = frame_samples * SAMPLE_WIDTH
+        self.buffer = bytearray()
+        self.last = False
+
+    def reset(self):
+        self.buffer.clear()
+        self.last = False
+
+    def is_speech(self, data, status=None):
+        self.buffer += data
+        n = len(self.buffer) // self.frame_bytes
+        if n == 0:
+            return self.last
+        frames = bytes(self.buffer[: n * self.frame_bytes])
+        del self.buffer[: n * self.frame_bytes]
+        self.last = self.frames_speech(frames, n)
+        return self.last
+
+    @abstractmethod
+    def frames_speech(self, frames, n):
+        """
+        :param frames: n 个整帧拼成的 PCM
+        :returns: 其中是否有语音帧
+        """
+        pass
+
+
+class WebRTCVAD(FramedVAD):
+    """
+    WebRTC VAD，帧长 30ms
+
+    :param level: 激进程度 0-3，越大越容易判为静音
+    """
+
+    SLUG = "webrtc"
+
+    def __init__(self, level=2, **args):
+        import webrtcvad
+
+        super(WebRTCVAD, self).__init__(SAMPLE_RATE * 30 // 1000)
+        self.vad = webrtcvad.Vad(level)
+
+    def frames_speech(self, frames, n):
+        fb = self.frame_bytes
+        return any(
+            self.vad.is_speech(frames[i * fb : (i + 1) * fb], SAMPLE_RATE)
+            for i in range(n)
+        )
+
+
+class SileroModel(object):
+    """
+    Silero VAD v5 ONNX 模型（static/silero_vad.onnx）
+
+    模型是循环网络，同一路音频的帧必须依次推理；batch 维度用来同时推理
+    多路独立的音频，每一路有自己的状态。导出的模型每次只接受一个 512 个
+    采样的窗口（加上 64 个采样的上下文），同一路积压的多帧没法合成一次
+    run()，只能逐帧推理。
+
+    :param model_path: 模型路径
+    """
+
+    FRAME_SAMPLES = 512
+    CONTEXT_SAMPLES = 64
+
+    def __init__(self, model_path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        # 每次只推理一帧，多线程的调度开销比计算本身还大
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.sr = np.array(SAMPLE_RATE, dtype=np.int64)
+
+    def initial_state(self, batch=1):
+        """
+        :param batch: 同时推理几路音频
+        :returns: 初始状态
+        """
+        return (
+            np.zeros((2, batch, 128), dtype=np.float32),
+            np.zeros((batch, self.CONTEXT_SAMPLES), dtype=np.float32),
+        )
+
+    def run(self, frames, state):
+        """
+        推理一帧
+
+        :param frames: float32 数组，形状 [batch, 512]，取值 -1 ~ 1
+        :param state: initial_state() 或上一次 run() 返回的状态
+        :returns: (每一路的语音概率, 新的状态)
+        """
+        rnn, context = state
+        x = np.concatenate([context, frames], axis=1)
+        out, rnn = self.session.run(None, {"input": x, "state": rnn, "sr": self.sr})
+        return out[:, 0], (rnn, x[:, -self.CONTEXT_SAMPLES :])
+
+
+class SileroVAD(FramedVAD):
+    """
+    Silero VAD，帧长 512 个采样（32ms）
+
+    :param model: SileroModel 实例，多个录音共用同一个推理会话
+    :param threshold: 语音概率阈值
+    """
+
+    SLUG = "silero"
+
+    def __init__(self, model, threshold=0.5, **args):
+        super(SileroVAD, self).__init__(SileroModel.FRAME_SAMPLES)
+        self.model = model
+        self.threshold = threshold
+        self.state = model.initial_state()
+
+    def reset(self):
+        super(SileroVAD, self).reset()
+        self.state = self.model.initial_state()
+
+    def frames_speech(self, frames, n):
+        samples = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768
+        speech = False
+        for frame in samples.reshape(n, 1, SileroModel.FRAME_SAMPLES):
+            prob, self.state = self.model.run(frame, self.state)
+            speech = speech or prob[0] > self.threshold
+        return speech
+
+
+class Endpointer(object):
+    """
+    录音端点检测：用户开口后，静音持续 hangover_ms 即判定说完；
+    一直没有开口则 leading_ms 后结束
+
+    :param vad: VAD 引擎
+    :param hangover_ms: 说完后需要持续多久的静音
+    :param min_speech_ms: 连续多长的语音才算开口，用来过滤短促的噪声
+    :param leading_ms: 开口前最多等待多久
+    """
+
+    def __init__(self, vad, hangover_ms=600, min_speech_ms=90, leading_ms=5000):
+        self.vad = vad
+        self.hangover_ms = hangover_ms
+        self.min_speech_ms = min_speech_ms
+        self.leading_ms = leading_ms
+        self.reset()
+
+    def reset(self, leading_ms=None):
+        """
+        开始新的一段录音
+
+        :param leading_ms: 本次录音开口前最多等待多久，None 表示不变
+        """
+        if leading_ms is not None:
+            self.leading_ms = leading_ms
+        self.vad.reset()
+        self.triggered = False  # 用户是否已经开口
+        self.elapsed_ms = 0
+        self.speech_ms = 0
+        self.silence_ms = 0
+
+    def process(self, data, status=None):
+        """
+        :param data: 刚录到的一段 PCM
+        :param status: snowboy RunDetection 对这段音频的返回值
+        :returns: True 表示应当结束录音
+        """
+        ms = len(data) * 1000 / (SAMPLE_RATE * SAMPLE_WIDTH)
+        self.elapsed_ms += ms
+        if self.vad.is_speech(data, status):
+            self.speech_ms += ms
+            self.silence_ms = 0
+            if self.speech_ms >= self.min_speech_ms:
+                self.triggered = True
+        else:
+            self.speech_ms = 0
+            self.silence_ms += ms
+        if self.triggered:
+            return self.silence_ms >= self.hangover_ms
+        return self.elapsed_ms >= self.leading_ms
+
+    def onset(self, frames, statuses=None):
+        """
+        在预录音中找到用户开口的位置，会重置 VAD 的状态
+
+        :param frames: 预录音的帧列表，从旧到新
+        :param statuses: 每一帧的 snowboy RunDetection 返回值
+        :returns: 应当保留的第一帧的下标
+        """
+        return speech_onset(frames, self.vad, statuses)
+
+
+def speech_onset(frames, vad, statuses=None, min_gap_ms=200):
+    """
+    在预录音中找到用户开口的位置：从最新的一帧往前，找到一直延续到
+    现在的那段语音的起点，短于 min_gap_ms 的停顿（字与字之间）不算断开
+
+    :param frames: 预录音的帧列表，从旧到新
+    :param vad: VAD 引擎
+    :param statuses: 每一帧的 snowboy RunDetection 返回值
+    :param min_gap_ms: 多长的静音算作断开
+    :returns: 应当保留的第一帧的下标，最近没有人说话时返回 len(frames)
+    """
+    if not frames:
+        return 0
+    vad.reset()
+    statuses = statuses or [None] * len(frames)
+    speech = [vad.is_speech(f, s) for f, s in zip(frames, statuses)]
+    vad.reset()
+    frame_ms = len(frames[0]) * 1000 / (SAMPLE_RATE * SAMPLE_WIDTH)
+    max_gap = max(1, round(min_gap_ms / frame_ms))
+    start, gap = len(frames), 0
+    for i in range(len(frames) - 1, -1, -1):
+        if speech[i]:
+            start, gap = i, 0
+        else:
+            gap += 1
+            if gap >= max_gap:
+                break
+    if start == len(frames):
+        return start
+    # 多留一帧，避免切掉辅音的开头
+    return max(0, start - 1)
+
+
+# Silero 推理会话全局共享
+_silero_model = None
+_silero_lock = threading.Lock()
+
+
+def get_silero_model():
+    global _silero_model
+    if _silero_model is None:
+        with _silero_lock:
+            if _silero_model is None:
+                _silero_model = SileroModel(
+                    config.get(
+                        "/endpointing/silero_model", constants.getData("silero_vad.onnx")
+                    )
+                )
+    return _silero_model
+
+
+def get_vad(engine):
+    """
+    :param engine: VAD 引擎名称（snowboy/webrtc/silero）
+    :returns: VAD 引擎实例
+
+    Raises:
+        ValueError if engine is unknown
+    """
+    if engine == SnowboyVAD.SLUG:
+        return SnowboyVAD()
+    if engine == WebRTCVAD.SLUG:
+        return WebRTCVAD(level=config.get("/endpointing/webrtc_level", 2))
+    if engine == SileroVAD.SLUG:
+        return SileroVAD(
+            get_silero_model(), threshold=config.get("/endpointing/silero_threshold", 0.5)
+        )
+    raise ValueError(f"错误：找不到名为 {engine} 的 VAD 引擎")
+
+
+def get_endpointer():
+    """
+    根据配置创建录音端点检测器
+
+    :returns: Endpointer 实例，VAD 引擎不可用时返回 None（沿用 snowboy 的静音计数）
+    """
+    engine = config.get("/endpointing/engine", "silero")
+    try:
+        vad = get_vad(engine)
+    except Exception as e:
+        logger.warning(f"{engine} VAD 初始化失败，沿用 snowboy 静音计数：{e}")
+        return None
+    return Endpointer(
+        vad,
+        hangover_ms=config.get("/endpointing/hangover_ms", 600),
+        min_speech_ms=config.get("/endpointing/min_speech_ms", 90),
+    )
@@ -1,7 +1,8 @@
+import array
 import time
 
 from snowboy import snowboydecoder
-from robot import config, logging, utils, constants
+from robot import config, logging, utils, constants, AudioCapture, VAD
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,6 @@ def initDetector(wukong):
         logger.info("使用 porcupine 进行离线唤醒")
 
         import pvporcupine
-        from pvrecorder import PvRecorder
 
         access_key = config.get("/porcupine/access_key")
         keyword_paths = config.get("/porcupine/keyword_paths")
@@ -37,15 +37,20 @@ def initDetector(wukong):
                 sensitivities=[config.get("sensitivity", 0.5)] * len(keywords),
             )
 
-        recorder = PvRecorder(device_index=-1, frame_length=porcupine.frame_length)
-        recorder.start()
+        # 与主动聆听共用常驻的麦克风输入流
+        recorder = AudioCapture.get_capture().subscribe()
+        frame_bytes = porcupine.frame_length * AudioCapture.SAMPLE_WIDTH
 
         try:
             while True:
-                pcm = recorder.read()
+                data = recorder.read(frame_bytes)
+                if not data:
+                    break
+                pcm = array.array("h", data)
 
                 result = porcupine.process(pcm)
                 if result >= 0:
+                    detected_at = time.perf_counter()
                     kw = keyword_paths[result] if keyword_paths else keywords[result]
                     logger.info(
                         "[porcupine] Keyword {} Detected at time {}".format(
@@ -55,12 +60,12 @@ def initDetector(wukong):
                             ),
                         )
                     )
-                    wukong._detected_callback(False)
-                    recorder.stop()
+                    wukong._detected_callback(False, detected_at)
                     wukong.conversation.interrupt()
                     query = wukong.conversation.activeListen()
                     wukong.conversation.doResponse(query)
-                    recorder.start()
+                    # 丢弃对话期间的录音
+                    recorder.skip()
         except pvporcupine.PorcupineActivationError as e:
             logger.error("[Porcupine] AccessKey activation error", stack_info=True)
             raise e
@@ -88,7 +93,7 @@ def initDetector(wukong):
             logger.info("Stopping ...")
         finally:
             porcupine and porcupine.delete()
-            recorder and recorder.delete()
+            recorder and recorder.close()
 
     else:
         logger.info("使用 snowboy 进行离线唤醒")
@@ -99,14 +104,19 @@ def initDetector(wukong):
         )
         # main loop
         try:
-            callbacks = wukong._detected_callback
+            # 把检测到唤醒词的时刻带给回调，用于统计提示音延迟
+            callbacks = lambda: wukong._detected_callback(
+                detected_at=detector.detected_at
+            )
             detector.start(
                 detected_callback=callbacks,
                 audio_recorder_callback=wukong.conversation.converse,
                 interrupt_check=wukong._interrupt_callback,
                 silent_count_threshold=config.get("silent_threshold", 15),
                 recording_timeout=config.get("recording_timeout", 5) * 4,
-                sleep_time=0.03,
+                sleep_time=0.1,
+                stream_callback=wukong.conversation.createASRStream,
+                endpointer=VAD.get_endpointer(),
             )
             detector.terminate()
         except Exception as e:
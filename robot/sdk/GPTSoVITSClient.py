@@ -8,6 +8,7 @@ GPT-SoVITS 项目地址：https://github.com/RVC-Boss/GPT-SoVITS
 
 import requests
 from robot import logging
+from robot.sdk import HttpClient
 
 logger = logging.getLogger(__name__)
 
@@ -94,8 +95,8 @@ def tts(
     logger.info(f"  参数: text_lang={text_lang}, 参考音频={'已提供' if ref_audio_path else '未提供'}")
     
     try:
-        # 使用 json 参数发送 JSON body
-        response = requests.post(
+        # 使用 json 参数发送 JSON body，复用到服务器的长连接
+        response = HttpClient.post(
             f"{server_url}/tts",
             json=payload,  # JSON body 格式
             timeout=timeout,
@@ -144,3 +145,55 @@ def tts(
     except Exception as e:
         logger.error(f"GPT-SoVITS TTS 未知错误: {type(e).__name__}: {str(e)}")
         raise
+
+
+def tts_stream(text, server_url, timeout=30, **kwargs):
+    """
+    以流式模式调用 GPT-SoVITS API，服务端边合成边返回音频
+
+    Args:
+        text: 要合成的文本
+        server_url: GPT-SoVITS 服务器地址
+        timeout: 连接及两次数据块之间的超时时间（秒）
+        kwargs: 其余合成参数，与 tts() 相同
+
+    Returns:
+        requests.Response: 已确认状态码为 200 的响应，
+        调用方通过 response.iter_content() 逐块读取 WAV 数据，读完后需要 close()
+
+    Raises:
+        requests.exceptions.RequestException: 请求失败时抛出
+    """
+    payload = {
+        "text": text,
+        "text_lang": kwargs.get("text_lang", "zh"),
+        "prompt_lang": kwargs.get("prompt_lang", "zh"),
+        "top_k": kwargs.get("top_k", 5),
+        "top_p": kwargs.get("top_p", 1.0),
+        "temperature": kwargs.get("temperature", 1.0),
+        "text_split_method": kwargs.get("text_split_method", "cut5"),
+        "batch_size": kwargs.get("batch_size", 1),
+        "speed_factor": kwargs.get("speed_factor", 1.0),
+        "seed": kwargs.get("seed", -1),
+        "parallel_infer": kwargs.get("parallel_infer", True),
+        "repetition_penalty": kwargs.get("repetition_penalty", 1.35),
+        "media_type": "wav",
+        "streaming_mode": True,
+    }
+    if kwargs.get("ref_audio_path"):
+        payload["ref_audio_path"] = kwargs["ref_audio_path"]
+        if kwargs.get("prompt_text"):
+            payload["prompt_text"] = kwargs["prompt_text"]
+    if kwargs.get("aux_ref_audio_paths"):
+        payload["aux_ref_audio_paths"] = kwargs["aux_ref_audio_paths"]
+
+    server_url = server_url.rstrip("/")
+    logger.info(f"GPT-SoVITS 流式 TTS 请求: {server_url}/tts")
+    response = HttpClient.post(
+        f"{server_url}/tts", json=payload, timeout=timeout, stream=True
+    )
+    if response.status_code != 200:
+        error_text = response.text[:1000] if response.text else "无错误信息"
+        logger.error(f"GPT-SoVITS 服务器返回错误（{response.status_code}）: {error_text}")
+        response.raise_for_status()
+    return response
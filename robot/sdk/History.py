@@ -1,7 +1,19 @@
 # -*- coding: utf-8 -*-
 # 用于维护历史消息
+import atexit
+import threading
+from collections import deque
+from itertools import islice
+
+import sqlite3
+import tornado.ioloop
 import tornado.locks
 
+from robot import config, constants, logging
+from robot.sdk.HistoryStore import HistoryStore
+
+logger = logging.getLogger(__name__)
+
 
 def Singleton(cls):
     _instance = {}
@@ -16,27 +28,144 @@ def Singleton(cls):
 
 @Singleton
 class History(object):
-    def __init__(self):
-        # cond is notified whenever the message cache is updated
+    """
+    最近的聊天记录
+
+    每条消息按加入的顺序分配一个递增的序号 seq，长轮询的客户端用上次收到的
+    最后一条消息的 seq 作为游标，按序号直接定位，不需要扫描整个缓存。
+    add_message 可以在任意线程调用，通知会转交给后台管理端的 IOLoop 线程。
+    开启 history.persist 时，消息同时追加到 HistoryStore，重启后从中恢复，
+    更早的记录可以分页读取和检索。
+    """
+
+    def __init__(self, cache_size=200):
+        self.cache_size = cache_size
+        self.cache = deque(maxlen=cache_size)
+        self.seq = 0
+        self.uuids = {}  # uuid -> 最后一条该 uuid 消息的 seq，兼容旧的 uuid 游标
+        self.lock = threading.Lock()
+        # cond 只能在 IOLoop 线程里使用，有新消息时由 add_message 转交 IOLoop 通知
         self.cond = tornado.locks.Condition()
-        self.cache = []
-        self.cache_size = 200
+        self.loop = None
+        self.store = None
+        if config.get("/history/persist", True):
+            self._open_store()
+
+    def _open_store(self):
+        """打开持久化存储，恢复最近的消息"""
+        try:
+            self.store = HistoryStore(
+                constants.getConfigData("history.db"),
+                max_messages=config.get("/history/max_messages", 10000),
+                max_days=config.get("/history/max_days", 0),
+            )
+            atexit.register(self.store.close)
+            self.seq = self.store.last_seq()
+            for message in self.store.page(limit=self.cache_size):
+                self.cache.append(message)
+                self.uuids[message["uuid"]] = message["seq"]
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"打开聊天记录存储失败，只在内存中保留：{e}", stack_info=True)
+            self.store = None
+
+    def attach(self):
+        """在 IOLoop 线程中调用，之后的新消息会通知到该 IOLoop 上的 cond"""
+        self.loop = tornado.ioloop.IOLoop.current()
+
+    def _index(self, cursor):
+        """游标之后第一条消息在缓存中的位置"""
+        if cursor is None or cursor == "":
+            return 0
+        cursor = str(cursor)
+        if cursor.isdigit():
+            seq = int(cursor)
+        elif cursor in self.uuids:
+            seq = self.uuids[cursor]
+        else:
+            # 游标对应的消息已经被挤出缓存，返回全部
+            return 0
+        if seq > self.seq:
+            # 游标来自重启之前，返回全部
+            return 0
+        first = self.seq - len(self.cache) + 1
+        return min(max(0, seq - first + 1), len(self.cache))
 
     def get_messages_since(self, cursor):
         """Returns a list of messages newer than the given cursor.
 
-        ``cursor`` should be the ``uuid`` of the last message received.
+        ``cursor`` should be the ``seq`` of the last message received
+        (the ``uuid`` of that message is also accepted).
+        """
+        with self.lock:
+            # 从尾部往前只取新消息，开销与新消息条数成正比
+            count = len(self.cache) - self._index(cursor)
+            messages = list(islice(reversed(self.cache), count))
+        messages.reverse()
+        return messages
+
+    def get_messages(self):
+        """返回缓存中的全部消息"""
+        with self.lock:
+            return list(self.cache)
+
+    def page(self, before=None, limit=50):
         """
-        results = []
-        for msg in reversed(self.cache):
-            if msg["uuid"] == cursor:
-                break
-            results.append(msg)
-        results.reverse()
-        return results
+        按序号倒序分页读取聊天记录
+
+        :param before: 只返回序号小于 before 的消息，None 表示从最新的开始
+        :param limit: 最多返回的条数
+        :returns: 按序号升序排列的消息
+        """
+        with self.lock:
+            first = self.cache[0]["seq"] if self.cache else self.seq + 1
+            end = len(self.cache) if before is None else max(0, before - first)
+            start = max(0, end - limit)
+            messages = list(islice(self.cache, start, end))
+        # 缓存里不够时，其余的从存储里读
+        if len(messages) < limit and self.store and first > 1:
+            older = self.store.page(
+                first if before is None else min(first, before), limit - len(messages)
+            )
+            messages = older + messages
+        return messages
+
+    def search(self, keyword, before=None, limit=50):
+        """
+        在聊天记录的正文中检索
+
+        :param keyword: 关键词
+        :param before: 只返回序号小于 before 的消息
+        :param limit: 最多返回的条数
+        :returns: 按序号升序排列的消息
+        """
+        if self.store:
+            return self.store.search(keyword, before, limit)
+        with self.lock:
+            messages = [
+                m
+                for m in self.cache
+                if keyword in m["text"] and (before is None or m["seq"] < before)
+            ]
+        return messages[-limit:]
+
+    def close(self):
+        """把还没写入的消息写完"""
+        if self.store:
+            self.store.close()
 
     def add_message(self, message):
-        self.cache.append(message)
-        if len(self.cache) > self.cache_size:
-            self.cache = self.cache[-self.cache_size :]
-        self.cond.notify_all()
+        with self.lock:
+            self.seq += 1
+            message["seq"] = self.seq
+            if len(self.cache) == self.cache_size:
+                evicted = self.cache[0]
+                if self.uuids.get(evicted["uuid"]) == evicted["seq"]:
+                    del self.uuids[evicted["uuid"]]
+            self.cache.append(message)
+            self.uuids[message["uuid"]] = self.seq
+            loop = self.loop
+        if self.store:
+            self.store.append(message)
+        if loop is not None:
+            # tornado 的 Condition 不是线程安全的，交给 IOLoop 线程去通知
+            loop.add_callback(self.cond.notify_all)
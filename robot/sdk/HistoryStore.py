@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+持久化的聊天记录
+
+聊天记录按序号 seq 追加写入 SQLite（WAL 模式），重启后不会丢失：
+- 写入由后台线程批量完成，append 只是入队，不会阻塞对话线程
+- 按序号分页读取，正文支持全文检索（SQLite 不支持 FTS5 时退化为 LIKE 查询）
+- 后台定期压缩：只保留最近 max_messages 条、max_days 天内的记录，
+  并截断 WAL、回收空闲页
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from robot import logging
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("seq", "uuid", "type", "text", "plugin", "time")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY,
+    uuid TEXT,
+    type INTEGER,
+    text TEXT,
+    plugin TEXT,
+    time TEXT,
+    created REAL
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='seq', tokenize='trigram'
+);
+"""
+
+
+class HistoryStore(object):
+    """
+    只追加的聊天记录存储
+
+    :param path: 数据库文件路径
+    :param max_messages: 最多保留多少条记录，<= 0 表示不限制
+    :param max_days: 最多保留多少天的记录，<= 0 表示不限制
+    :param compact_interval: 后台压缩的间隔（秒）
+    """
+
+    def __init__(self, path, max_messages=10000, max_days=0, compact_interval=3600):
+        self.path = path
+        self.max_messages = max_messages
+        self.max_days = max_days
+        self.compact_interval = compact_interval
+        self.queue = queue.Queue()
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite 不支持 FTS5 全文检索，改用 LIKE 查询：{e}")
+            self.fts = False
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        """每个线程各用一个连接，WAL 模式下读写互不阻塞"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def append(self, message):
+        """追加一条记录（只入队，由后台线程写入）"""
+        self.queue.put(dict(message))
+
+    def flush(self, timeout=None):
+        """等待已入队的记录全部写入"""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5):
+        """写完已入队的记录后停止后台线程"""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join(timeout)
+
+    def _write_loop(self):
+        conn = self._connect()
+        last_compact = time.time()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.compact_interval)
+            except queue.Empty:
+                item = ()
+            # 一次取出所有排队的记录，在同一个事务里写入
+            batch = [item]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            messages = [m for m in batch if isinstance(m, dict)]
+            if messages:
+                try:
+                    self._insert(conn, messages)
+                except sqlite3.Error as e:
+                    logger.error(f"写入聊天记录失败：{e}", stack_info=True)
+            for m in batch:
+                if isinstance(m, threading.Event):
+                    m.set()
+            if time.time() - last_compact >= self.compact_interval:
+                self.compact()
+                last_compact = time.time()
+            if None in batch:
+                conn.close()
+                self.local.conn = None
+                return
+
+    def _insert(self, conn, messages):
+        now = time.time()
+        rows = [tuple(m.get(f, "") for f in FIELDS) + (now,) for m in messages]
+        with conn:
+            if not self.fts:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                return
+            # 外部内容的 FTS 表不会跟着 REPLACE 更新，序号重复时（如重启前
+            # 还没写完）先从索引里删掉旧正文，否则旧正文仍能被检索到
+            for row in rows:
+                conn.execute(
+                    "INSERT INTO messages_fts(messages_fts, rowid, text) "
+                    "SELECT 'delete', seq, text FROM messages WHERE seq = ?",
+                    (row[0],),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", row
+                )
+                conn.execute(
+                    "INSERT INTO messages_fts(rowid, text) VALUES (?, ?)",
+                    (row[0], row[3]),
+                )
+
+    def _rows(self, sql, args):
+        cursor = self._connect().execute(sql, args)
+        return [dict(zip(FIELDS, row)) for row in cursor.fetchall()]
+
+    def last_seq(self):
+        """已写入的最大序号"""
+        row = self._connect().execute("SELECT MAX(seq) FROM messages").fetchone()
+        return row[0] or 0
+
+    def page(self, before=None, limit=50):
+        """
+        按序号倒序分页
+
+        :param before: 只返回序号小于 before 的记录，None 表示从最新的开始
+        :param limit: 最多返回的条数
+        :returns: 按序号升序排列的记录
+        """
+        if before is None:
+            rows = self._rows(
+                f"SELECT {', '.join(FIELDS)} FROM messages ORDER BY seq DESC LIMIT ?",
+                (limit,),
+            )
+        else:
+            rows = self._rows(
+                f"SELECT {', '.join(FIELDS)} FROM messages WHERE seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (before, limit),
+            )
+        rows.reverse()
+        return rows
+
+    def search(self, keyword, before=None, limit=50):
+        """
+        全文检索
+
+        :param keyword: 关键词
+        :param before: 只返回序号小于 before 的记录
+        :param limit: 最多返回的条数
+        :returns: 按序号升序排列的记录
+        """
+        before = before if before is not None else self.last_seq() + 1
+        columns = ", ".join(f"m.{f}" for f in FIELDS)
+        # trigram 分词只能匹配三个字以上的关键词，更短的仍用 LIKE
+        if self.fts and len(keyword) >= 3:
+            phrase = '"' + keyword.replace('"', '""') + '"'
+            rows = self._rows(
+                f"SELECT {columns} FROM messages_fts f JOIN messages m ON m.seq = f.rowid "
+                "WHERE messages_fts MATCH ? AND m.seq < ? ORDER BY m.seq DESC LIMIT ?",
+                (phrase, before, limit),
+            )
+        else:
+            pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = self._rows(
+                f"SELECT {columns} FROM messages m WHERE m.text LIKE ? ESCAPE '\\' "
+                "AND m.seq < ? ORDER BY m.seq DESC LIMIT ?",
+                (pattern, before, limit),
+            )
+        rows.reverse()
+        return rows
+
+    def compact(self):
+        """删除超出保留条数和天数的记录，截断 WAL 并回收空闲页"""
+        conn = self._connect()
+        try:
+            bounds = []
+            if self.max_messages > 0:
+                bounds.append(("seq <= ?", self.last_seq() - self.max_messages))
+            if self.max_days > 0:
+                bounds.append(("created < ?", time.time() - self.max_days * 86400))
+            deleted = 0
+            with conn:
+                for where, value in bounds:
+                    if self.fts:
+                        conn.execute(
+                            "INSERT INTO messages_fts(messages_fts, rowid, text) "
+                            f"SELECT 'delete', seq, text FROM messages WHERE {where}",
+                            (value,),
+                        )
+                    deleted += conn.execute(
+                        f"DELETE FROM messages WHERE {where}", (value,)
+                    ).rowcount
+            if deleted:
+                conn.execute("PRAGMA incremental_vacuum")
+                logger.info(f"聊天记录压缩完成，删除 {deleted} 条")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            logger.error(f"压缩聊天记录失败：{e}", stack_info=True)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+共享 HTTP 连接池
+
+各个在线引擎（GPT-SoVITS、VITS、Azure、火山引擎、扣子、AnyQ、UNIT 等）
+按主机共用 requests.Session，保持长连接，避免每句话都重新建立 TCP/TLS 连接。
+连接池大小和重试策略在 http_pool 配置项中设置，可以按主机单独覆盖。
+
+默认只有幂等的请求方法会在读取超时或服务端出错时重试；POST 等请求只在
+连接失败（请求还没有发出）时重试，对话和合成请求不会被执行两次。确认
+某个服务可以安全重复执行时，再在 http_pool.hosts 中为它加上 POST。
+"""
+
+import threading
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.util.retry import Retry
+from robot import config, logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    "pool_connections": 10,  # 每个 Session 缓存的连接池个数
+    "pool_maxsize": 10,  # 每个连接池保持的最大连接数
+    "retries": 2,  # 失败重试次数，0 表示不重试
+    "backoff_factor": 0.3,  # 重试退避系数，第 n 次重试前等待 backoff_factor * 2^(n-1) 秒
+    "status_forcelist": [502, 503, 504],  # 遇到这些状态码时重试
+    # 读取超时、遇到上面的状态码时也重试的请求方法，其他方法只重试连接失败
+    "retry_methods": ["GET", "HEAD", "OPTIONS"],
+}
+
+
+def host_of(url):
+    """
+    URL 对应的连接池键
+
+    :param url: 请求地址
+    :returns: scheme://host:port
+    """
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_options(host):
+    """
+    某个主机的连接池配置：默认值 < http_pool < http_pool.hosts.<host:port>
+
+    :param host: scheme://host:port
+    :returns: 配置字典
+    """
+    options = dict(DEFAULT_OPTIONS)
+    profile = config.get("http_pool", {}) or {}
+    options.update({k: v for k, v in profile.items() if k != "hosts"})
+    hosts = profile.get("hosts") or {}
+    netloc = urlsplit(host).netloc
+    options.update(hosts.get(host) or hosts.get(netloc) or {})
+    return options
+
+
+def build_session(options):
+    """
+    按配置创建一个带连接池和重试策略的 Session
+
+    :param options: 连接池配置
+    :returns: requests.Session
+    """
+    retry = Retry(
+        total=options["retries"],
+        backoff_factor=options["backoff_factor"],
+        status_forcelist=options["status_forcelist"],
+        allowed_methods=frozenset(m.upper() for m in options["retry_methods"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=options["pool_connections"],
+        pool_maxsize=options["pool_maxsize"],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url):
+    """
+    获取某个主机共用的 Session
+
+    :param url: 请求地址
+    :returns: requests.Session
+    """
+    host = host_of(url)
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                options = get_options(host)
+                session = build_session(options)
+                _sessions[host] = session
+                logger.debug(f"为 {host} 创建 HTTP 连接池：{options}")
+    return session
+
+
+def request(method, url, **kwargs):
+    """
+    通过共享连接池发送请求，参数与 requests.request 相同
+    """
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    """通过共享连接池发送 GET 请求"""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """通过共享连接池发送 POST 请求"""
+    return request("POST", url, **kwargs)
+
+
+def close():
+    """关闭所有连接池"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
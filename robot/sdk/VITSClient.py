@@ -3,7 +3,7 @@
 
 """VITS TTS API"""
 
-import requests
+from robot.sdk import HttpClient
 
 
 def tts(text, server_url, api_key, speaker_id, length, noise, noisew, max, timeout):
@@ -19,6 +19,6 @@ def tts(text, server_url, api_key, speaker_id, length, noise, noisew, max, timeo
     }
     headers = {"X-API-KEY": api_key}
     url = f"{server_url}/voice"
-    res = requests.post(url=url, data=data, headers=headers, timeout=timeout)
+    res = HttpClient.post(url, data=data, headers=headers, timeout=timeout)
     res.raise_for_status()
     return res.content
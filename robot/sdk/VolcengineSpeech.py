@@ -13,7 +13,6 @@ from cProfile import run
 import gzip
 import hmac
 import json
-import requests
 import logging
 import os
 from typing_extensions import Self
@@ -27,6 +26,7 @@ from urllib.parse import urlparse
 import time
 import websockets
 from robot import config
+from robot.sdk import HttpClient
 
 
 audio_format = "wav"   # wav 或者 mp3，根据实际音频格式设置
@@ -195,6 +195,7 @@ class AsrWsClient:
         self.secret = kwargs.get("secret", "access_secret")
         self.auth_method = kwargs.get("auth_method", "token")
         self.mp3_seg_size = int(kwargs.get("mp3_seg_size", 10000))
+        self.stream_seg_duration = int(kwargs.get("stream_seg_duration", 200))
 
     def construct_request(self, reqid):
         req = {
@@ -266,15 +267,67 @@ class AsrWsClient:
                                                                                               str(mac, 'utf-8'), auth_headers)
         return header_dicts
 
-    async def segment_data_processor(self, wav_data: bytes, segment_size: int):
+    def _full_client_request(self):
         reqid = str(uuid.uuid4())
-        # 构建 full client request，并序列化压缩
         request_params = self.construct_request(reqid)
         payload_bytes = str.encode(json.dumps(request_params))
         payload_bytes = gzip.compress(payload_bytes)
         full_client_request = bytearray(generate_full_default_header())
         full_client_request.extend((len(payload_bytes)).to_bytes(4, 'big'))  # payload size(4 bytes)
         full_client_request.extend(payload_bytes)  # payload
+        return full_client_request
+
+    @staticmethod
+    def _audio_only_request(chunk: bytes, last: bool):
+        payload_bytes = gzip.compress(chunk)
+        if last:
+            audio_only_request = bytearray(generate_last_audio_default_header())
+        else:
+            audio_only_request = bytearray(generate_audio_default_header())
+        audio_only_request.extend((len(payload_bytes)).to_bytes(4, 'big'))  # payload size(4 bytes)
+        audio_only_request.extend(payload_bytes)  # payload
+        return audio_only_request
+
+    async def stream_processor(self, chunks):
+        """
+        边录音边上传，每攒够 stream_seg_duration 毫秒的音频发送一个分包
+        :param chunks: 原始 PCM 块的迭代器（会阻塞等待录音），迭代结束即录音结束
+        :return: 最后一个分包的识别结果
+        """
+        full_client_request = self._full_client_request()
+        header = None
+        if self.auth_method == "token":
+            header = self.token_auth()
+        elif self.auth_method == "signature":
+            header = self.signature_auth(full_client_request)
+        segment_size = int(self.channel * self.bits // 8 * self.rate * self.stream_seg_duration / 1000)
+        loop = asyncio.get_running_loop()
+        chunks = iter(chunks)
+        async with websockets.connect(self.ws_url, extra_headers=header, max_size=1000000000) as ws:
+            await ws.send(full_client_request)
+            result = parse_response(await ws.recv())
+            if 'payload_msg' in result and result['payload_msg']['code'] != self.success_code:
+                return result
+            buffer = bytearray()
+            while True:
+                # 在线程池里等待下一块录音，不阻塞事件循环
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                last = chunk is None
+                if not last:
+                    buffer.extend(chunk)
+                    if len(buffer) < segment_size:
+                        continue
+                await ws.send(self._audio_only_request(bytes(buffer), last))
+                buffer.clear()
+                result = parse_response(await ws.recv())
+                if 'payload_msg' in result and result['payload_msg']['code'] != self.success_code:
+                    return result
+                if last:
+                    return result
+
+    async def segment_data_processor(self, wav_data: bytes, segment_size: int):
+        # 构建 full client request，并序列化压缩
+        full_client_request = self._full_client_request()
         header = None
         if self.auth_method == "token":
             header = self.token_auth()
@@ -288,15 +341,8 @@ class AsrWsClient:
             if 'payload_msg' in result and result['payload_msg']['code'] != self.success_code:
                 return result
             for seq, (chunk, last) in enumerate(AsrWsClient.slice_data(wav_data, segment_size), 1):
-                # if no compression, comment this line
-                payload_bytes = gzip.compress(chunk)
-                audio_only_request = bytearray(generate_audio_default_header())
-                if last:
-                    audio_only_request = bytearray(generate_last_audio_default_header())
-                audio_only_request.extend((len(payload_bytes)).to_bytes(4, 'big'))  # payload size(4 bytes)
-                audio_only_request.extend(payload_bytes)  # payload
                 # 发送 audio-only client request
-                await ws.send(audio_only_request)
+                await ws.send(self._audio_only_request(chunk, last))
                 res = await ws.recv()
                 result = parse_response(res)
                 if 'payload_msg' in result and result['payload_msg']['code'] != self.success_code:
@@ -346,6 +392,26 @@ class VolcengineASR(object):
             text = ""
         return text
 
+    def execute_stream(self, chunks):
+        """
+        流式识别
+        :param chunks: 16kHz 16bit 单声道 PCM 块的迭代器，录音结束时迭代结束
+        :return: 识别结果
+        :raises RuntimeError: 服务端返回错误码时抛出，由调用方改为识别录音文件
+        """
+        asr_ws_client = AsrWsClient(
+            audio_path=None,
+            cluster=self.cluster,
+            appid=self.appid,
+            token=self.token,
+            format="raw",
+        )
+        result = asyncio.run(asr_ws_client.stream_processor(chunks))
+        payload = result.get('payload_msg', {})
+        if payload.get('code') != asr_ws_client.success_code:
+            raise RuntimeError(f"流式识别失败：{payload}")
+        return payload["result"][0]["text"]
+
 class VolcengineTTS(object):
     def __init__(self, appid, token, cluster, voice_type) -> None:
         self.appid, self.token, self.cluster, self.voice_type = appid, token, cluster, voice_type
@@ -379,7 +445,7 @@ class VolcengineTTS(object):
             }
         }
         try:
-            resp = requests.post(api_url, json.dumps(request_json), headers=header)
+            resp = HttpClient.post(api_url, data=json.dumps(request_json), headers=header)
             if "data" in resp.json():
                 data = resp.json()["data"]
                 return base64.b64decode(data)
@@ -12,6 +12,7 @@ from wsgiref.handlers import format_date_time
 from datetime import datetime
 from time import mktime
 import _thread as thread
+import threading
 
 from robot import logging
 
@@ -316,6 +317,102 @@ def transcribe(fpath, appid, api_key, api_secret):
     return gResult
 
 
+def _parse_asr_result(message):
+    """
+    解析一条识别结果消息
+
+    :returns: (本条消息的文字, 是否为最后一条)
+    """
+    message = json.loads(message)
+    if message["code"] != 0:
+        raise RuntimeError(
+            "sid:%s call error:%s code is:%s"
+            % (message.get("sid"), message.get("message"), message["code"])
+        )
+    data = message.get("data", {})
+    text = ""
+    for i in data.get("result", {}).get("ws", []):
+        for w in i["cw"]:
+            text += w["w"]
+    return text, data.get("status") == STATUS_LAST_FRAME
+
+
+def transcribe_stream(chunks, appid, api_key, api_secret, timeout=10):
+    """
+    科大讯飞流式ASR：边录音边上传
+
+    :param chunks: 16kHz 16bit 单声道 PCM 块的迭代器，录音结束时迭代结束
+    :param timeout: 发完最后一帧后等待结果的最长时间（秒）
+    :returns: 识别结果
+
+    Raises:
+        连接断开、服务端返回错误码或等待结果超时时抛出异常，不返回不完整的结果
+    """
+    param = ASR_Ws_Param(appid, api_key, APISecret=api_secret, AudioFile=None)
+    ws = websocket.create_connection(
+        param.create_url(), sslopt={"cert_reqs": ssl.CERT_NONE}
+    )
+    results = []
+    errors = []
+    finished = threading.Event()
+
+    def receive():
+        try:
+            while True:
+                text, last = _parse_asr_result(ws.recv())
+                results.append(text)
+                if last:
+                    return
+        except Exception as e:
+            if not finished.is_set():
+                errors.append(e)
+        finally:
+            finished.set()
+
+    receiver = threading.Thread(target=receive, daemon=True)
+    receiver.start()
+    frameSize = 1280  # 每一帧的音频大小上限
+    status = STATUS_FIRST_FRAME
+    try:
+        for chunk in chunks:
+            for offset in range(0, len(chunk), frameSize):
+                data = {
+                    "status": status,
+                    "format": "audio/L16;rate=16000",
+                    "audio": str(base64.b64encode(chunk[offset : offset + frameSize]), "utf-8"),
+                    "encoding": "raw",
+                }
+                if status == STATUS_FIRST_FRAME:
+                    d = {"common": param.CommonArgs, "business": param.BusinessArgs, "data": data}
+                    status = STATUS_CONTINUE_FRAME
+                else:
+                    d = {"data": data}
+                ws.send(json.dumps(d))
+            if finished.is_set():
+                break
+        if not finished.is_set():
+            data = {
+                "status": STATUS_LAST_FRAME,
+                "format": "audio/L16;rate=16000",
+                "audio": "",
+                "encoding": "raw",
+            }
+            if status == STATUS_FIRST_FRAME:
+                d = {"common": param.CommonArgs, "business": param.BusinessArgs, "data": data}
+            else:
+                d = {"data": data}
+            ws.send(json.dumps(d))
+            receiver.join(timeout)
+            if receiver.is_alive():
+                raise TimeoutError(f"{timeout} 秒内没有收到最终识别结果")
+    finally:
+        finished.set()
+        ws.close()
+    if errors:
+        raise errors[0]
+    return "".join(results)
+
+
 def synthesize(msg, appid, api_key, api_secret, voice_name="xiaoyan"):
     """
     科大讯飞TTS
@@ -6,6 +6,7 @@ import requests
 import datetime
 from uuid import getnode as get_mac
 from robot import constants, logging
+from robot.sdk import HttpClient
 from dateutil import parser as dparser
 
 logger = logging.getLogger(__name__)
@@ -31,7 +32,7 @@ def get_token(api_key, secret_key):
         "client_id": api_key,
         "client_secret": secret_key,
     }
-    r = requests.get(URL, params=params)
+    r = HttpClient.get(URL, params=params)
     try:
         r.raise_for_status()
         token = r.json()["access_token"]
@@ -65,7 +66,7 @@ def getUnit(query, service_id, api_key, secret_key):
     }
     try:
         headers = {"Content-Type": "application/json"}
-        request = requests.post(url, json=body, headers=headers)
+        request = HttpClient.post(url, json=body, headers=headers)
         return json.loads(request.text)
     except Exception:
         return None
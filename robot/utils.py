@@ -8,10 +8,9 @@ import re
 import time
 import json
 import yaml
-import hashlib
-import subprocess
 from . import constants, config
 from robot import logging
+from robot.TTSCache import get_cache
 from pydub import AudioSegment
 from pytz import timezone
 import _thread as thread
@@ -258,38 +257,32 @@ def getTimemStap():
     return str(time.time()).replace(".", "")
 
 
-def getCache(msg):
-    """获取缓存的语音"""
-    md5 = hashlib.md5(msg.encode("utf-8")).hexdigest()
-    cache_paths = [
-        os.path.join(constants.TEMP_PATH, md5 + ext)
-        for ext in [".mp3", ".wav", ".asiff"]
-    ]
-    return next((path for path in cache_paths if os.path.exists(path)), None)
+def getCache(msg, tts=None):
+    """
+    获取缓存的语音
 
+    :param msg: 文本
+    :param tts: 合成所用的 TTS 引擎实例
+    :returns: 缓存的音频路径，未命中返回 None
+    """
+    return get_cache().get(msg, tts)
 
-def saveCache(voice, msg):
-    """获取缓存的语音"""
-    _, ext = os.path.splitext(voice)
-    md5 = hashlib.md5(msg.encode("utf-8")).hexdigest()
-    target = os.path.join(constants.TEMP_PATH, md5 + ext)
-    shutil.copyfile(voice, target)
-    return target
 
+def saveCache(voice, msg, tts=None):
+    """
+    缓存合成好的语音
 
-def lruCache():
-    """清理最近未使用的缓存"""
+    :param voice: 音频文件路径（会复制一份，原文件保持不变）
+    :param msg: 文本
+    :param tts: 合成所用的 TTS 引擎实例
+    :returns: 缓存后的音频路径
+    """
+    return get_cache().put(voice, msg, tts, move=False)
 
-    def run(*args):
-        if config.get("/lru_cache/enable", True):
-            days = config.get("/lru_cache/days", 7)
-            subprocess.run(
-                'find . -name "*.mp3" -atime +%d -exec rm {} \;' % days,
-                cwd=constants.TEMP_PATH,
-                shell=True,
-            )
 
-    thread.start_new_thread(run, ())
+def lruCache():
+    """清理最近未使用的缓存"""
+    get_cache().trim()
 
 
 def validyaml(filename):
@@ -326,6 +319,18 @@ def getPunctuations():
     return [",", "，", ".", "。", "?", "？", "!", "！", "\n"]
 
 
+def splitSentences(msg):
+    """
+    把要朗读的内容切分成逐句合成的分段
+
+    :param msg: 内容
+    :returns: 分段列表（已去除首尾空白和空行）
+    """
+    msg = stripPunctuation(msg).strip()
+    lines = re.split(r"。|！|？|\!|\?|\n", msg)
+    return [line.strip() for line in lines if line.strip()]
+
+
 def stripPunctuation(s):
     """
     移除字符串末尾的标点
@@ -6,20 +6,23 @@ import base64
 import random
 import hashlib
 import asyncio
+import datetime
 import requests
 import markdown
 import threading
-import subprocess
 import tornado.web
 import tornado.ioloop
 import tornado.options
+import tornado.websocket
 import tornado.httpserver
 
+from concurrent.futures import ThreadPoolExecutor
 from tornado.websocket import WebSocketHandler
 from urllib.parse import unquote
+from uuid import uuid4
 
 from robot.sdk.History import History
-from robot import config, utils, logging, Updater, constants
+from robot import config, utils, logging, Updater, constants, Metrics, AudioCapture, RemoteAudio
 from robot.LatencyMonitor import get_monitor
 from tools import make_json, solr_tools
 
@@ -83,8 +86,12 @@ class MessageUpdatesHandler(BaseHandler):
     """Long-polling request for new messages.
 
     Waits until new messages are available before returning anything.
+    New messages are pushed to the waiters by ``History.add_message``,
+    so an idle long poll costs nothing.
     """
 
+    wait_future = None
+
     async def post(self):
         if not self.validate(self.get_argument("validate", default=None)):
             res = {"code": 1, "message": "illegal visit"}
@@ -92,11 +99,15 @@ class MessageUpdatesHandler(BaseHandler):
         else:
             cursor = self.get_argument("cursor", None)
             history = History()
+            history.attach()
             messages = history.get_messages_since(cursor)
             while not messages:
                 # Save the Future returned here so we can cancel it in
-                # on_connection_close.
-                self.wait_future = history.cond.wait(timeout=1)
+                # on_connection_close. A number would be an absolute
+                # deadline on the IOLoop clock, so pass a timedelta.
+                self.wait_future = history.cond.wait(
+                    timeout=datetime.timedelta(seconds=60)
+                )
                 try:
                     await self.wait_future
                 except asyncio.CancelledError:
@@ -109,7 +120,8 @@ class MessageUpdatesHandler(BaseHandler):
         self.finish()
 
     def on_connection_close(self):
-        self.wait_future.cancel()
+        if self.wait_future:
+            self.wait_future.cancel()
 
 
 """
@@ -169,6 +181,12 @@ class ChatWebSocketHandler(WebSocketHandler, BaseHandler):
         except Exception as e:
             logger.debug(f"处理WebSocket消息时出错: {e}")
 
+    @classmethod
+    def broadcast(cls, msg, uuid, plugin=""):
+        """在 IOLoop 线程中向所有客户端发送响应消息"""
+        for client in list(cls.clients):
+            client.send_response(msg, uuid, plugin)
+
     def send_response(self, msg, uuid, plugin=""):
         """
         向客户端发送响应消息
@@ -192,7 +210,54 @@ class ChatWebSocketHandler(WebSocketHandler, BaseHandler):
             monitor.record_ws_packet_loss()
 
 
+class ChatExecutor(object):
+    """
+    在 IOLoop 之外执行对话的线程池，排队的任务数有上限
+
+    :param workers: 同时执行的对话数
+    :param queue_size: 最多排队等待的对话数
+    """
+
+    def __init__(self, workers=1, queue_size=4):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="chat"
+        )
+        self.capacity = workers + queue_size
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """
+        提交任务
+
+        :returns: concurrent.futures.Future，队列已满时返回 None
+        """
+        with self.lock:
+            if self.pending >= self.capacity:
+                return None
+            self.pending += 1
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+
+
+chat_executor = None
+
+
 class ChatHandler(BaseHandler):
+    """
+    对话在 chat_executor 的线程里执行，IOLoop 不会被慢速的 ASR、AI、TTS 阻塞。
+    默认在对话进入队列后立即返回，回复通过 WebSocket 推送并写入对话历史；
+    wait 参数为 true 时等对话结束，期间回复通过 chunked 响应逐条返回。
+    每个客户端（session 参数，缺省为客户端 IP）各有一个会话，可以同时对话。
+    """
+
+    wait = False
+
     def onResp(self, msg, audio, plugin):
         logger.info(f"response msg: {msg}")
         res = {
@@ -202,6 +267,10 @@ class ChatHandler(BaseHandler):
             "audio": audio,
             "plugin": plugin,
         }
+        # 在对话线程里被调用，交给 IOLoop 线程写出
+        self.wait and self.loop.add_callback(self._write, res)
+
+    def _write(self, res):
         try:
             self.write(json.dumps(res))
             self.flush()
@@ -210,52 +279,262 @@ class ChatHandler(BaseHandler):
 
     def onStream(self, data, uuid):
         # 通过 ChatWebSocketHandler 发送给前端
-        for client in ChatWebSocketHandler.clients:
-            client.send_response(data, uuid, "")
+        self.loop.add_callback(ChatWebSocketHandler.broadcast, data, uuid)
+
+    def _response(self, key, query, uuid):
+        with conversation.use_session(conversation.get_session(key)):
+            conversation.doResponse(
+                query,
+                uuid,
+                onSay=lambda msg, audio, plugin: self.onResp(msg, audio, plugin),
+                onStream=lambda data, resp_uuid: self.onStream(data, resp_uuid),
+            )
 
-    def post(self):
-        global conversation
-        if self.validate(self.get_argument("validate", default=None)):
-            if self.get_argument("type") == "text":
-                query = self.get_argument("query")
-                uuid = self.get_argument("uuid")
-                if query == "":
-                    res = {"code": 1, "message": "query text is empty"}
-                    self.write(json.dumps(res))
-                else:
-                    conversation.doResponse(
-                        query,
-                        uuid,
-                        onSay=lambda msg, audio, plugin: self.onResp(
-                            msg, audio, plugin
-                        ),
-                        onStream=lambda data, resp_uuid: self.onStream(data, resp_uuid),
-                    )
-
-            elif self.get_argument("type") == "voice":
-                voice_data = self.get_argument("voice")
-                tmpfile = utils.write_temp_file(base64.b64decode(voice_data), ".wav")
-                fname, suffix = os.path.splitext(tmpfile)
-                nfile = fname + "-16k" + suffix
-                # downsampling
-                soxCall = "sox " + tmpfile + " " + nfile + " rate 16k"
-                subprocess.call([soxCall], shell=True, close_fds=True)
-                utils.check_and_delete(tmpfile)
-                conversation.doConverse(
-                    nfile,
-                    onSay=lambda msg, audio, plugin: self.onResp(msg, audio, plugin),
-                    onStream=lambda data, resp_uuid: self.onStream(
-                        data, resp_uuid)
+    def _converse(self, key, voice_data):
+        # 在内存中解码并重采样到 16k，支持流式识别的引擎直接识别内存中的 PCM
+        pcm = AudioCapture.decode(base64.b64decode(voice_data))
+        asr_stream = conversation.createASRStream()
+        if asr_stream:
+            for i in range(0, len(pcm), AudioCapture.FRAME_BYTES):
+                asr_stream.feed(pcm[i : i + AudioCapture.FRAME_BYTES])
+        # 声纹识别和不支持流式识别的引擎仍然读取录音文件
+        nfile = utils.write_temp_file(AudioCapture.to_wav(pcm), ".wav")
+        with conversation.use_session(conversation.get_session(key)):
+            conversation.doConverse(
+                nfile,
+                onSay=lambda msg, audio, plugin: self.onResp(msg, audio, plugin),
+                onStream=lambda data, resp_uuid: self.onStream(data, resp_uuid),
+                asr_stream=asr_stream,
+            )
 
-                )
-            else:
-                res = {"code": 1, "message": "illegal type"}
+    async def post(self):
+        global conversation
+        if not self.validate(self.get_argument("validate", default=None)):
+            res = {"code": 1, "message": "illegal visit"}
+            self.write(json.dumps(res))
+            self.finish()
+            return
+        task = None
+        key = self.get_argument("session", None) or f"web:{self.request.remote_ip}"
+        if self.get_argument("type") == "text":
+            query = self.get_argument("query")
+            uuid = self.get_argument("uuid")
+            if query == "":
+                res = {"code": 1, "message": "query text is empty"}
                 self.write(json.dumps(res))
+            else:
+                task = (self._response, key, query, uuid)
+        elif self.get_argument("type") == "voice":
+            task = (self._converse, key, self.get_argument("voice"))
         else:
-            res = {"code": 1, "message": "illegal visit"}
+            res = {"code": 1, "message": "illegal type"}
             self.write(json.dumps(res))
+        if task:
+            self.wait = self.get_argument("wait", "false") == "true"
+            self.loop = tornado.ioloop.IOLoop.current()
+            future = chat_executor.submit(*task)
+            if future is None:
+                logger.warning("对话任务过多，拒绝请求")
+                self.set_status(429)
+                self.set_header("Retry-After", "1")
+                res = {"code": 1, "message": "too many requests"}
+                self.write(json.dumps(res))
+            elif self.wait:
+                try:
+                    await asyncio.wrap_future(future)
+                except Exception as e:
+                    logger.error(f"对话失败：{e}", exc_info=e)
+            else:
+                future.add_done_callback(self._check)
+                res = {"code": 0, "message": "queued"}
+                self.write(json.dumps(res))
         self.finish()
 
+    def _check(self, future):
+        e = future.exception()
+        e and logger.error(f"对话失败：{e}", exc_info=e)
+
+
+class AudioWebSocketHandler(WebSocketHandler, BaseHandler):
+    """
+    远程麦克风：客户端用二进制消息发送 16bit 单声道 PCM，服务端做端点检测
+    并边收边识别（见 RemoteAudio），说完后执行对话。每个连接各有一个会话，
+    连接断开时关闭。重采样和 VAD 推理在每个连接自己的线程里按收到的顺序
+    执行，不阻塞 IOLoop。
+
+    客户端发送的文本消息（JSON）：
+    - {"action": "start", "rate": 16000, "endpointing": true}：开始，rate 为
+      PCM 采样率（8000~96000）；endpointing 为 false 时由客户端发送 end
+      结束每句话。start 消息不合法时回复 error 并断开连接
+    - {"action": "end"}：结束当前这句话
+    - {"action": "cancel"}：放弃当前这句话
+    服务端发送的消息：speech_start、speech_end、response（回复）、
+    new_message（流式输出）和 error。
+    """
+
+    listener = None
+    executor = None
+    closed = False
+
+    MIN_RATE = 8000
+    MAX_RATE = 96000
+
+    def open(self):
+        if not self.isValidated() and not self.validate(
+            self.get_argument("validate", default=None)
+        ):
+            self.close(1008, "illegal visit")
+            return
+        self.loop = tornado.ioloop.IOLoop.current()
+        self.session_key = f"remote:{uuid4()}"
+        # 单线程，音频帧和控制消息按收到的顺序处理
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="remote-audio"
+        )
+        self._submit(self._create)
+        logger.info(f"远程麦克风已连接: {self.request.remote_ip}")
+
+    def on_close(self):
+        self.closed = True
+        if self.executor:
+            self._submit(self._close)
+            self.executor.shutdown(wait=False)
+
+    def on_message(self, message):
+        if isinstance(message, bytes):
+            self._submit(self._write, message)
+            return
+        try:
+            data = json.loads(message)
+        except ValueError:
+            self._send({"action": "error", "message": "illegal message"})
+            return
+        action = data.get("action") if isinstance(data, dict) else None
+        if action == "start":
+            rate = data.get("rate", AudioCapture.RATE)
+            endpointing = data.get("endpointing", True)
+            if (
+                type(rate) is not int
+                or not self.MIN_RATE <= rate <= self.MAX_RATE
+                or not isinstance(endpointing, bool)
+            ):
+                self._fail("illegal start message")
+                return
+            self._submit(self._start, rate, endpointing)
+        elif action == "end":
+            self._submit(self._converse)
+        elif action == "cancel":
+            self._submit(self._cancel)
+
+    def _submit(self, fn, *args):
+        """在这个连接的线程里执行"""
+        self.executor.submit(fn, *args).add_done_callback(self._check)
+
+    def _check(self, future):
+        e = future.exception()
+        e and logger.error(f"处理远程音频失败：{e}", exc_info=e)
+
+    def _check_run(self, future):
+        e = future.exception()
+        if e:
+            logger.error(f"远程对话失败：{e}", exc_info=e)
+            self.loop.add_callback(
+                self._send, {"action": "error", "code": 500, "message": "conversation failed"}
+            )
+
+    def _fail(self, message):
+        """回复错误并断开连接，只在 IOLoop 里调用"""
+        self._send({"action": "error", "code": 400, "message": message})
+        self.close(1007, message)
+
+    # 以下方法都在这个连接的线程里执行
+
+    def _create(self, rate=AudioCapture.RATE, endpointing=True):
+        listener, self.listener = self.listener, None
+        listener and listener.cancel()
+        try:
+            self.listener = RemoteAudio.create(
+                conversation, rate=rate, endpointing=endpointing
+            )
+        except Exception as e:
+            logger.error(f"创建远程麦克风失败：{e}", exc_info=True)
+            self.loop.add_callback(self._fail, "failed to start listening")
+            return False
+        return True
+
+    def _start(self, rate, endpointing):
+        if self._create(rate, endpointing):
+            self.loop.add_callback(
+                self._send,
+                {"action": "listening", "endpointing": self.listener.endpointing},
+            )
+
+    def _write(self, data):
+        if self.listener is None:
+            return
+        for event in self.listener.write(data):
+            self.loop.add_callback(self._send, {"action": event})
+            if event == RemoteAudio.SPEECH_END:
+                self._converse()
+
+    def _cancel(self):
+        self.listener and self.listener.cancel()
+
+    def _close(self):
+        self.listener and self.listener.cancel()
+        conversation.close_session(self.session_key)
+
+    def _converse(self):
+        if self.listener is None:
+            return
+        pcm, asr_stream = self.listener.finish()
+        if not pcm:
+            return
+        future = chat_executor.submit(self._run, pcm, asr_stream)
+        if future is None:
+            logger.warning("对话任务过多，丢弃远程录音")
+            asr_stream and asr_stream.cancel()
+            self.loop.add_callback(
+                self._send, {"action": "error", "code": 429, "message": "too many requests"}
+            )
+            return
+        future.add_done_callback(self._check_run)
+
+    def _run(self, pcm, asr_stream):
+        # 在共用的对话线程池里执行，可能在连接断开之后才开始
+        if self.closed:
+            logger.info("远程麦克风已断开，丢弃录音")
+            asr_stream and asr_stream.cancel()
+            return
+        # 声纹识别和不支持流式识别的引擎仍然读取录音文件
+        fp = utils.write_temp_file(AudioCapture.to_wav(pcm), ".wav")
+        try:
+            with conversation.use_session(conversation.get_session(self.session_key)):
+                conversation.doConverse(
+                    fp,
+                    onSay=lambda msg, audio, plugin: self.loop.add_callback(
+                        self._send,
+                        {"action": "response", "text": msg, "audio": audio, "plugin": plugin},
+                    ),
+                    onStream=lambda data, resp_uuid: self.loop.add_callback(
+                        self._stream, data, resp_uuid
+                    ),
+                    asr_stream=asr_stream,
+                )
+        finally:
+            # 对话期间连接断开时，get_session 可能已为它重新创建了会话
+            self.closed and conversation.close_session(self.session_key)
+
+    def _stream(self, data, uuid):
+        ChatWebSocketHandler.broadcast(data, uuid)
+        self._send({"action": "new_message", "type": 1, "text": data, "uuid": uuid})
+
+    def _send(self, res):
+        try:
+            self.write_message(json.dumps(res))
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
 
 class GetHistoryHandler(BaseHandler):
     def get(self):
@@ -264,10 +543,26 @@ class GetHistoryHandler(BaseHandler):
             res = {"code": 1, "message": "illegal visit"}
             self.write(json.dumps(res))
         else:
+            try:
+                before = self.get_argument("before", None)
+                before = int(before) if before else None
+                limit = min(max(1, int(self.get_argument("limit", 200))), 1000)
+            except ValueError:
+                res = {"code": 1, "message": "illegal argument"}
+                self.write(json.dumps(res))
+                self.finish()
+                return
+            keyword = self.get_argument("keyword", "")
+            history = conversation.getHistory()
+            if keyword:
+                messages = history.search(keyword, before, limit)
+            else:
+                messages = history.page(before, limit)
             res = {
                 "code": 0,
                 "message": "ok",
-                "history": json.dumps(conversation.getHistory().cache),
+                "history": messages,
+                "before": messages[0]["seq"] if messages else None,
             }
             self.write(json.dumps(res))
         self.finish()
@@ -285,6 +580,23 @@ class GetLogHandler(BaseHandler):
         self.finish()
 
 
+class MetricsHandler(BaseHandler):
+    def get(self):
+        """
+        Prometheus 指标，抓取时用 params 带上 validate 参数
+        """
+        global conversation
+        if not self.isValidated() and not self.validate(
+            self.get_argument("validate", default=None)
+        ):
+            self.set_status(401)
+            self.finish()
+            return
+        self.set_header("Content-Type", Metrics.CONTENT_TYPE)
+        self.write(Metrics.render(conversation))
+        self.finish()
+
+
 class LogPageHandler(BaseHandler):
     def get(self):
         if not self.isValidated():
@@ -513,12 +825,14 @@ application = tornado.web.Application(
         (r"/history", GetHistoryHandler),
         (r"/chat", ChatHandler),
         (r"/websocket", ChatWebSocketHandler),
+        (r"/audio/stream", AudioWebSocketHandler),
         (r"/chat/updates", MessageUpdatesHandler),
         (r"/config", ConfigHandler),
         (r"/configpage", ConfigPageHandler),
         (r"/operate", OperateHandler),
         (r"/logpage", LogPageHandler),
         (r"/log", GetLogHandler),
+        (r"/metrics", MetricsHandler),
         (r"/logout", LogoutHandler),
         (r"/api", APIHandler),
         (r"/qa", QAHandler),
@@ -545,9 +859,13 @@ application = tornado.web.Application(
 
 
 def start_server(con, wk):
-    global conversation, wukong
+    global conversation, wukong, chat_executor
     conversation = con
     wukong = wk
+    chat_executor = ChatExecutor(
+        workers=config.get("/server/chat_workers", 4),
+        queue_size=config.get("/server/chat_queue", 4),
+    )
     if config.get("/server/enable", False):
         port = config.get("/server/port", "5001")
         try:
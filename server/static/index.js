@@ -240,7 +240,9 @@ var updater = {
     newMessages: function(response) {
         if (response.code != 0 || !response.history) return;
         var messages = JSON.parse(response.history);
-        updater.cursor = messages[messages.length - 1].uuid;
+        if (messages.length == 0) return;
+        var last = messages[messages.length - 1];
+        updater.cursor = last.seq != undefined ? last.seq : last.uuid;
         console.log(messages.length, "new messages, cursor:", updater.cursor);
         for (var i = 0; i < messages.length; i++) {
             updater.showMessage(messages[i]);
@@ -3,7 +3,7 @@
 import collections
 import pyaudio
 from . import snowboydetect
-from robot import utils, logging
+from robot import utils, logging, AudioCapture
 import time
 import wave
 import os
@@ -19,6 +19,12 @@ RESOURCE_FILE = os.path.join(TOP_DIR, "resources/common.res")
 DETECT_DING = os.path.join(TOP_DIR, "resources/ding.wav")
 DETECT_DONG = os.path.join(TOP_DIR, "resources/dong.wav")
 
+# frames per PortAudio callback, also the fixed frame size fed to RunDetection
+FRAMES_PER_BUFFER = AudioCapture.FRAMES_PER_BUFFER
+# silent_count_threshold and recording_timeout are counted in chunks of
+# this many frames (the original capture chunk size)
+COUNT_FRAMES = 2048
+
 
 def py_error_handler(filename, line, function, err, fmt):
     pass
@@ -41,23 +47,6 @@ def no_alsa_error():
         pass
 
 
-class RingBuffer(object):
-    """Ring buffer to hold audio from PortAudio"""
-
-    def __init__(self, size=4096):
-        self._buf = collections.deque(maxlen=size)
-
-    def extend(self, data):
-        """Adds data to the end of buffer"""
-        self._buf.extend(data)
-
-    def get(self):
-        """Retrieves data from the beginning of buffer and clears it"""
-        tmp = bytes(bytearray(self._buf))
-        self._buf.clear()
-        return tmp
-
-
 def play_audio_file(fname=DETECT_DING):
     """Simple callback function to play a wave file. By default it plays
     a Ding sound.
@@ -65,6 +54,13 @@ def play_audio_file(fname=DETECT_DING):
     :param str fname: wave file name
     :return: None
     """
+    from robot import Earcon
+
+    name = os.path.splitext(os.path.basename(fname))[0]
+    earcons = Earcon.get_earcons()
+    if earcons and earcons.play(name):
+        # 使用预加载的提示音，不再每次打开文件和 PyAudio
+        return
     ding_wav = wave.open(fname, "rb")
     ding_data = ding_wav.readframes(ding_wav.getnframes())
     with no_alsa_error():
@@ -94,16 +90,23 @@ class ActiveListener(object):
         self.detector = snowboydetect.SnowboyDetect(
             resource_filename=resource.encode(), model_str=model_str.encode()
         )
-        self.ring_buffer = RingBuffer(
-            self.detector.NumChannels() * self.detector.SampleRate() * 5
+        self.frame_bytes = (
+            FRAMES_PER_BUFFER
+            * self.detector.NumChannels()
+            * self.detector.BitsPerSample()
+            // 8
         )
 
     def listen(
         self,
         interrupt_check=lambda: False,
-        sleep_time=0.03,
+        sleep_time=0.1,
         silent_count_threshold=15,
         recording_timeout=100,
+        asr_stream=None,
+        endpointer=None,
+        preroll_ms=0,
+        since=None,
     ):
         """
         :param interrupt_check: a function that returns True if the main loop
@@ -111,48 +114,94 @@ class ActiveListener(object):
         :param silent_count_threshold: indicates how long silence must be heard
                                        to mark the end of a phrase that is
                                        being recorded.
-        :param float sleep_time: how much time in second every loop waits.
+        :param float sleep_time: the longest time in second every loop blocks
+                                 waiting for audio before checking
+                                 `interrupt_check` again.
         :param recording_timeout: limits the maximum length of a recording.
+        :param asr_stream: if specified, every recorded frame is also fed to
+                           it as soon as it is captured (see ASR.ASRStream).
+        :param endpointer: if specified, it decides when the phrase ends
+                           (see VAD.Endpointer) instead of counting snowboy
+                           silence; `silent_count_threshold` then only limits
+                           how long to wait before the user starts talking.
+        :param preroll_ms: also look at up to this much audio captured
+                           before this call, but never before `since`; speech
+                           that is still going on (as judged by the
+                           endpointer's VAD) is prepended to the recording.
+        :param since: capture position (see AudioCapture.position) where
+                      listening started, e.g. right after the robot finished
+                      speaking. The pre-roll never reaches back past it, so
+                      the wake word and the robot's own voice are not
+                      recorded. None means no pre-roll.
         :return: recorded file path
         """
         logger.debug("activeListen listen()")
 
         self._running = True
+        self.recordedData = []
+        self.detector.Reset()
 
-        def audio_callback(in_data, frame_count, time_info, status):
-            self.ring_buffer.extend(in_data)
-            play_data = chr(0) * len(in_data)
-            return play_data, pyaudio.paContinue
-
-        with no_alsa_error():
-            self.audio = pyaudio.PyAudio()
-
-        logger.debug("opening audio stream")
+        if since is None:
+            preroll_ms = 0
 
         try:
-            self.stream_in = self.audio.open(
-                input=True,
-                output=False,
-                format=self.audio.get_format_from_width(
-                    self.detector.BitsPerSample() / 8
-                ),
-                channels=self.detector.NumChannels(),
-                rate=self.detector.SampleRate(),
-                frames_per_buffer=2048,
-                stream_callback=audio_callback,
+            # the shared microphone stream is already open, no frames are lost
+            self.mic = AudioCapture.get_capture().subscribe(
+                preroll=int(preroll_ms * self.detector.SampleRate() / 1000)
+                * self.detector.NumChannels()
+                * self.detector.BitsPerSample()
+                // 8,
+                since=since,
             )
         except Exception as e:
             logger.critical(e, stack_info=True)
             return
 
-        logger.debug("audio stream opened")
+        try:
+            return self._listen(
+                interrupt_check,
+                sleep_time,
+                silent_count_threshold,
+                recording_timeout,
+                asr_stream,
+                endpointer,
+            )
+        finally:
+            self.mic.close()
 
+    def _listen(
+        self,
+        interrupt_check,
+        sleep_time,
+        silent_count_threshold,
+        recording_timeout,
+        asr_stream,
+        endpointer,
+    ):
         if interrupt_check():
             logger.debug("detect voice return")
             return
 
         silentCount = 0
         recordingCount = 0
+        step = FRAMES_PER_BUFFER / COUNT_FRAMES
+
+        # pre-roll: the user may have started talking before we listened
+        preroll = [
+            self.mic.read(self.frame_bytes)
+            for _ in range(len(self.mic) // self.frame_bytes)
+        ]
+        statuses = [self.detector.RunDetection(data) for data in preroll]
+        trim = endpointer.onset(preroll, statuses) if endpointer and preroll else 0
+        pending = collections.deque(zip(preroll[trim:], statuses[trim:]))
+        if preroll:
+            logger.debug(
+                "pre-roll: %d of %d frames kept" % (len(pending), len(preroll))
+            )
+
+        endpointer and endpointer.reset(
+            silent_count_threshold * COUNT_FRAMES * 1000 / self.detector.SampleRate()
+        )
 
         logger.debug("begin activeListen loop")
 
@@ -161,31 +210,35 @@ class ActiveListener(object):
             if interrupt_check():
                 logger.debug("detect voice break")
                 break
-            data = self.ring_buffer.get()
-            if len(data) == 0:
-                time.sleep(sleep_time)
-                continue
-
-            status = self.detector.RunDetection(data)
+            if pending:
+                data, status = pending.popleft()
+            else:
+                data = self.mic.read(self.frame_bytes, timeout=sleep_time)
+                if len(data) == 0:
+                    continue
+                status = self.detector.RunDetection(data)
             if status == -1:
                 logger.warning("Error initializing streams or reading audio data")
 
             stopRecording = False
             if recordingCount > recording_timeout:
                 stopRecording = True
+            elif endpointer:
+                stopRecording = endpointer.process(data, status)
             elif status == -2:  # silence found
                 if silentCount > silent_count_threshold:
                     stopRecording = True
                 else:
-                    silentCount = silentCount + 1
+                    silentCount = silentCount + step
             elif status == 0:  # voice found
                 silentCount = 0
 
             if stopRecording == True:
                 return self.saveMessage()
 
-            recordingCount = recordingCount + 1
+            recordingCount = recordingCount + step
             self.recordedData.append(data)
+            asr_stream and asr_stream.feed(data)
 
         logger.debug("finished.")
 
@@ -201,20 +254,11 @@ class ActiveListener(object):
         # use wave to save data
         wf = wave.open(filename, "wb")
         wf.setnchannels(self.detector.NumChannels())
-        wf.setsampwidth(
-            self.audio.get_sample_size(
-                self.audio.get_format_from_width(self.detector.BitsPerSample() / 8)
-            )
-        )
+        wf.setsampwidth(self.detector.BitsPerSample() // 8)
         wf.setframerate(self.detector.SampleRate())
         wf.writeframes(data)
         wf.close()
         logger.debug("finished saving: " + filename)
-
-        self.stream_in.stop_stream()
-        self.stream_in.close()
-        self.audio.terminate()
-
         return filename
 
 
@@ -243,6 +287,8 @@ class HotwordDetector(object):
     ):
 
         self._running = False
+        # perf_counter() timestamp of the last keyword detection
+        self.detected_at = None
 
         tm = type(decoder_model)
         ts = type(sensitivity)
@@ -270,33 +316,45 @@ class HotwordDetector(object):
         if len(sensitivity) != 0:
             self.detector.SetSensitivity(sensitivity_str.encode())
 
-        self.ring_buffer = RingBuffer(
-            self.detector.NumChannels() * self.detector.SampleRate() * 5
+        self.frame_bytes = (
+            FRAMES_PER_BUFFER
+            * self.detector.NumChannels()
+            * self.detector.BitsPerSample()
+            // 8
         )
 
     def start(
         self,
         detected_callback=play_audio_file,
         interrupt_check=lambda: False,
-        sleep_time=0.03,
+        sleep_time=0.1,
         audio_recorder_callback=None,
         silent_count_threshold=15,
         recording_timeout=100,
+        stream_callback=None,
+        endpointer=None,
     ):
         """
-        Start the voice detector. For every `sleep_time` second it checks the
-        audio buffer for triggering keywords. If detected, then call
+        Start the voice detector. It blocks until a frame of audio has been
+        captured and checks it for triggering keywords. If detected, then call
         corresponding function in `detected_callback`, which can be a single
         function (single model) or a list of callback functions (multiple
         models). Every loop it also calls `interrupt_check` -- if it returns
         True, then breaks from the loop and return.
 
+        The recording starts with the frame right after the one the keyword
+        was detected in, so the keyword itself is never recorded. Frames
+        captured while `detected_callback` runs stay buffered in the shared
+        capture, so words said right after the keyword are not lost.
+
         :param detected_callback: a function or list of functions. The number of
                                   items must match the number of models in
                                   `decoder_model`.
         :param interrupt_check: a function that returns True if the main loop
                                 needs to stop.
-        :param float sleep_time: how much time in second every loop waits.
+        :param float sleep_time: the longest time in second every loop blocks
+                                 waiting for audio before checking
+                                 `interrupt_check` again.
         :param audio_recorder_callback: if specified, this will be called after
                                         a keyword has been spoken and after the
                                         phrase immediately after the keyword has
@@ -307,29 +365,21 @@ class HotwordDetector(object):
                                        to mark the end of a phrase that is
                                        being recorded.
         :param recording_timeout: limits the maximum length of a recording.
+        :param stream_callback: if specified, this will be called when the
+                                recording of a phrase starts. It returns a
+                                stream (see ASR.ASRStream) or None; every
+                                recorded frame is fed to the stream as soon
+                                as it is captured, and the stream is passed
+                                to `audio_recorder_callback` as the
+                                `asr_stream` keyword argument.
+        :param endpointer: if specified, it decides when the phrase ends
+                           (see VAD.Endpointer) instead of counting snowboy
+                           silence; `silent_count_threshold` then only limits
+                           how long to wait before the user starts talking.
         :return: None
         """
         self._running = True
-
-        def audio_callback(in_data, frame_count, time_info, status):
-            if utils.isRecordable():
-                self.ring_buffer.extend(in_data)
-                play_data = chr(0) * len(in_data)
-            else:
-                play_data = chr(0)
-            return play_data, pyaudio.paContinue
-
-        with no_alsa_error():
-            self.audio = pyaudio.PyAudio()
-        self.stream_in = self.audio.open(
-            input=True,
-            output=False,
-            format=self.audio.get_format_from_width(self.detector.BitsPerSample() / 8),
-            channels=self.detector.NumChannels(),
-            rate=self.detector.SampleRate(),
-            frames_per_buffer=2048,
-            stream_callback=audio_callback,
-        )
+        self.mic = AudioCapture.get_capture().subscribe()
 
         if interrupt_check():
             logger.debug("detect voice return")
@@ -349,13 +399,14 @@ class HotwordDetector(object):
         logger.debug("detecting...")
 
         state = "PASSIVE"
+        step = FRAMES_PER_BUFFER / COUNT_FRAMES
+        asr_stream = None
         while self._running is True:
             if interrupt_check():
                 logger.debug("detect voice break")
                 break
-            data = self.ring_buffer.get()
-            if len(data) == 0:
-                time.sleep(sleep_time)
+            data = self.mic.read(self.frame_bytes, timeout=sleep_time)
+            if len(data) == 0 or not utils.isRecordable():
                 continue
 
             status = self.detector.RunDetection(data)
@@ -365,9 +416,9 @@ class HotwordDetector(object):
             # small state machine to handle recording of phrase after keyword
             if state == "PASSIVE":
                 if status > 0:  # key word found
-
+                    self.detected_at = time.perf_counter()
+                    # everything up to the detection is the keyword itself
                     self.recordedData = []
-                    self.recordedData.append(data)
                     silentCount = 0
                     recordingCount = 0
                     message = "Keyword " + str(status) + " detected at time: "
@@ -384,29 +435,46 @@ class HotwordDetector(object):
                         and utils.is_proper_time()
                     ):
                         state = "ACTIVE"
+                        asr_stream = stream_callback and stream_callback()
+                        endpointer and endpointer.reset(
+                            silent_count_threshold
+                            * COUNT_FRAMES
+                            * 1000
+                            / self.detector.SampleRate()
+                        )
                     continue
 
             elif state == "ACTIVE":
                 stopRecording = False
                 if recordingCount > recording_timeout:
                     stopRecording = True
+                elif endpointer:
+                    stopRecording = endpointer.process(data, status)
                 elif status == -2:  # silence found
                     if silentCount > silent_count_threshold:
                         stopRecording = True
                     else:
-                        silentCount = silentCount + 1
+                        silentCount = silentCount + step
                 elif status == 0:  # voice found
                     silentCount = 0
 
                 if stopRecording == True:
                     fname = self.saveMessage()
-                    audio_recorder_callback(fname)
+                    if asr_stream:
+                        audio_recorder_callback(fname, asr_stream=asr_stream)
+                    else:
+                        audio_recorder_callback(fname)
+                    asr_stream = None
                     state = "PASSIVE"
+                    # drop what was captured while the phrase was handled
+                    self.mic.skip()
                     continue
 
-                recordingCount = recordingCount + 1
+                recordingCount = recordingCount + step
                 self.recordedData.append(data)
+                asr_stream and asr_stream.feed(data)
 
+        asr_stream and asr_stream.cancel()
         logger.debug("finished.")
 
     def saveMessage(self):
@@ -421,11 +489,7 @@ class HotwordDetector(object):
         # use wave to save data
         wf = wave.open(filename, "wb")
         wf.setnchannels(self.detector.NumChannels())
-        wf.setsampwidth(
-            self.audio.get_sample_size(
-                self.audio.get_format_from_width(self.detector.BitsPerSample() / 8)
-            )
-        )
+        wf.setsampwidth(self.detector.BitsPerSample() // 8)
         wf.setframerate(self.detector.SampleRate())
         wf.writeframes(data)
         wf.close()
@@ -438,7 +502,5 @@ class HotwordDetector(object):
         :return: None
         """
         if self._running:
-            self.stream_in.stop_stream()
-            self.stream_in.close()
-            self.audio.terminate()
+            self.mic.close()
             self._running = False
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+单元测试
+
+在仓库根目录运行：
+    python -m unittest discover -s tests -t .
+
+测试使用默认配置（static/default.yml），不读取 ~/.wukong 下的配置。
+"""
+from robot import config, constants
+
+config.doInit(constants.getDefaultConfigPath())
+config.has_init = True
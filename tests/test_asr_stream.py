@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import json
+import queue
+import threading
+import unittest
+from unittest import mock
+
+import websocket
+
+from robot import ASR
+from robot.LatencyMonitor import LatencyMonitor
+from robot.sdk import XunfeiSpeech, VolcengineSpeech
+
+try:
+    from robot.Conversation import Conversation
+except Exception:  # 缺少 snowboy 等依赖
+    Conversation = None
+
+
+def xunfei_result(text, last=False):
+    return json.dumps(
+        {
+            "code": 0,
+            "data": {
+                "status": XunfeiSpeech.STATUS_LAST_FRAME if last else 1,
+                "result": {"ws": [{"cw": [{"w": text}]}]},
+            },
+        }
+    )
+
+
+class FakeWebSocket(object):
+    """按顺序返回预先排好的消息，元素为异常时抛出"""
+
+    def __init__(self, replies, reply_after_last=True):
+        self.replies = replies
+        self.reply_after_last = reply_after_last
+        self.inbox = queue.Queue()
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+        if len(self.sent) == 1 or (
+            self.reply_after_last
+            and self.sent[-1]["data"]["status"] == XunfeiSpeech.STATUS_LAST_FRAME
+        ):
+            for reply in self.replies:
+                self.inbox.put(reply)
+
+    def recv(self):
+        reply = self.inbox.get()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def close(self):
+        self.inbox.put(websocket.WebSocketConnectionClosedException("closed"))
+
+
+def xunfei_stream(ws, timeout=10):
+    with mock.patch.object(websocket, "create_connection", return_value=ws):
+        stream = ASR.ASRStream(
+            lambda chunks: XunfeiSpeech.transcribe_stream(
+                chunks, "appid", "key", "secret", timeout=timeout
+            ),
+            "xunfei-asr",
+        )
+        for _ in range(3):
+            stream.feed(b"\0" * 3200)
+        return stream, stream.finish(5)
+
+
+class XunfeiStreamTest(unittest.TestCase):
+    def test_result(self):
+        ws = FakeWebSocket([xunfei_result("今天"), xunfei_result("天气", last=True)])
+        stream, result = xunfei_stream(ws)
+        self.assertEqual("今天天气", result)
+        self.assertIsNone(stream.error)
+        self.assertEqual(XunfeiSpeech.STATUS_LAST_FRAME, ws.sent[-1]["data"]["status"])
+
+    def test_error_code_fails_the_stream(self):
+        error = json.dumps({"code": 10165, "message": "invalid handle", "sid": "x"})
+        stream, result = xunfei_stream(FakeWebSocket([xunfei_result("今天"), error]))
+        self.assertIsNone(result)
+        self.assertIsInstance(stream.error, RuntimeError)
+
+    def test_dropped_connection_fails_the_stream(self):
+        ws = FakeWebSocket(
+            [xunfei_result("今天"), websocket.WebSocketConnectionClosedException("dropped")]
+        )
+        stream, result = xunfei_stream(ws)
+        self.assertIsNone(result)
+        self.assertIsInstance(stream.error, websocket.WebSocketConnectionClosedException)
+
+    def test_missing_final_result_times_out(self):
+        ws = FakeWebSocket([xunfei_result("今天")], reply_after_last=False)
+        stream, result = xunfei_stream(ws, timeout=0.1)
+        self.assertIsNone(result)
+        self.assertIsInstance(stream.error, TimeoutError)
+
+
+class VolcengineStreamTest(unittest.TestCase):
+    def execute(self, result):
+        async def stream_processor(client, chunks):
+            list(chunks)
+            return result
+
+        asr = VolcengineSpeech.VolcengineASR.__new__(VolcengineSpeech.VolcengineASR)
+        asr.cluster, asr.appid, asr.token = "cluster", "appid", "token"
+        with mock.patch.object(VolcengineSpeech.AsrWsClient, "stream_processor", stream_processor):
+            return asr.execute_stream(iter([b"\0" * 3200]))
+
+    def test_result(self):
+        result = {"payload_msg": {"code": 1000, "result": [{"text": "今天天气"}]}}
+        self.assertEqual("今天天气", self.execute(result))
+
+    def test_error_code_raises(self):
+        with self.assertRaises(RuntimeError):
+            self.execute({"payload_msg": {"code": 1013, "message": "silence"}})
+
+
+class FakeASR(object):
+    SLUG = "fake-asr"
+
+    def __init__(self):
+        self.files = []
+
+    def transcribe(self, fp):
+        self.files.append(fp)
+        return "录音文件的识别结果"
+
+
+@unittest.skipIf(Conversation is None, "需要 snowboy")
+class DoConverseFallbackTest(unittest.TestCase):
+    def conversation(self):
+        conversation = object.__new__(Conversation)
+        conversation.local = threading.local()
+        conversation.default_session = mock.Mock()
+        conversation.latency_monitor = LatencyMonitor()
+        conversation.asr = FakeASR()
+        conversation.interrupt = lambda: None
+        conversation.identify_speaker = lambda fp, session: None
+        conversation.queries = []
+        conversation.doResponse = lambda query, *args: conversation.queries.append(query)
+        return conversation
+
+    def failed_stream(self):
+        def worker(chunks):
+            list(chunks)
+            raise websocket.WebSocketConnectionClosedException("dropped")
+
+        return ASR.ASRStream(worker, "fake-asr")
+
+    def test_failed_stream_falls_back_to_the_recording(self):
+        conversation = self.conversation()
+        conversation.doConverse("missing.wav", asr_stream=self.failed_stream())
+        self.assertEqual(["missing.wav"], conversation.asr.files)
+        self.assertEqual(["录音文件的识别结果"], conversation.queries)
+        self.assertEqual({("asr", "fake-asr"): 1}, conversation.latency_monitor.get_error_counts())
+
+    def test_streamed_result_is_used(self):
+        conversation = self.conversation()
+        stream = ASR.ASRStream(lambda chunks: "流式识别结果", "fake-asr")
+        conversation.doConverse("missing.wav", asr_stream=stream)
+        self.assertEqual([], conversation.asr.files)
+        self.assertEqual(["流式识别结果"], conversation.queries)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import sys
+import tempfile
+import unittest
+import wave
+from unittest import mock
+
+import numpy as np
+
+from robot import AudioCapture
+
+try:
+    import scipy.signal
+except ImportError:
+    scipy = None
+
+
+def tone(freq, rate, seconds=1.0, channels=1, amplitude=8000):
+    """正弦波的 16bit PCM"""
+    t = np.arange(int(rate * seconds)) / rate
+    samples = np.round(amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+    return np.repeat(samples, channels).tobytes()
+
+
+def wav_bytes(pcm, rate, channels, width=2):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def peak_frequency(pcm):
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    spectrum = np.abs(np.fft.rfft(samples))
+    return np.argmax(spectrum) * AudioCapture.RATE / len(samples)
+
+
+class ConvertTest(unittest.TestCase):
+    def check_tone(self, pcm, freq=440, seconds=1.0):
+        self.assertAlmostEqual(
+            seconds * AudioCapture.RATE * AudioCapture.SAMPLE_WIDTH, len(pcm), delta=8
+        )
+        self.assertAlmostEqual(freq, peak_frequency(pcm), delta=2)
+
+    def test_capture_format_is_unchanged(self):
+        pcm = tone(440, 16000)
+        self.assertEqual(pcm, AudioCapture.convert(pcm, 16000, 1, 2))
+
+    def test_resample_stereo(self):
+        for rate in (8000, 22050, 44100, 48000):
+            self.check_tone(AudioCapture.convert(tone(440, rate, channels=2), rate, 2, 2))
+
+    @unittest.skipIf(scipy is None, "需要 scipy")
+    def test_anti_aliasing(self):
+        # 12kHz 超出 16k 采样率的奈奎斯特频率，应被滤掉而不是折叠成 4kHz
+        pcm = AudioCapture.convert(tone(12000, 48000), 48000, 1, 2)
+        rms = np.sqrt(np.mean(np.frombuffer(pcm, dtype=np.int16).astype(np.float32) ** 2))
+        self.assertLess(rms, 100)
+
+    def test_without_scipy(self):
+        with mock.patch.dict(sys.modules, {"scipy.signal": None}):
+            self.check_tone(AudioCapture.convert(tone(440, 48000, channels=2), 48000, 2, 2))
+
+    def test_partial_frame_is_dropped(self):
+        pcm = AudioCapture.convert(tone(440, 48000, channels=2) + b"\x01", 48000, 2, 2)
+        self.check_tone(pcm)
+
+
+class DecodeTest(unittest.TestCase):
+    def test_wav(self):
+        pcm = AudioCapture.decode(wav_bytes(tone(440, 44100, channels=2), 44100, 2))
+        self.assertAlmostEqual(32000, len(pcm), delta=8)
+        self.assertAlmostEqual(440, peak_frequency(pcm), delta=2)
+
+    def test_other_formats_use_pydub(self):
+        from pydub import AudioSegment
+
+        segment = AudioSegment(tone(440, 48000), frame_rate=48000, sample_width=2, channels=1)
+        with mock.patch.object(AudioSegment, "from_file", return_value=segment) as from_file:
+            pcm = AudioCapture.decode(b"not a wav file")
+        from_file.assert_called_once()
+        self.assertAlmostEqual(32000, len(pcm), delta=8)
+
+    def test_to_wav_round_trip(self):
+        pcm = tone(440, 16000)
+        data = AudioCapture.to_wav(pcm)
+        with wave.open(io.BytesIO(data), "rb") as w:
+            self.assertEqual((1, 2, 16000), (w.getnchannels(), w.getsampwidth(), w.getframerate()))
+        self.assertEqual(pcm, AudioCapture.decode(data))
+
+    def test_load_pcm(self):
+        pcm = tone(440, 16000)
+        with tempfile.TemporaryDirectory() as tmp:
+            raw = os.path.join(tmp, "a.pcm")
+            with open(raw, "wb") as f:
+                f.write(pcm)
+            self.assertEqual(pcm, AudioCapture.load_pcm(raw))
+            path = os.path.join(tmp, "a.wav")
+            with open(path, "wb") as f:
+                f.write(wav_bytes(tone(440, 48000), 48000, 1))
+            self.assertAlmostEqual(32000, len(AudioCapture.load_pcm(path)), delta=8)
+
+
+if __name__ == "__main__":
+    unittest.main()
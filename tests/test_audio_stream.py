@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import threading
+import unittest
+import wave
+
+from robot import constants
+from robot.AudioStream import PCMStream, parse_wav_header
+
+
+def wav_bytes(pcm, rate=16000, channels=1, width=2):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def split(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class BlockingResponse(object):
+    """模拟流式 HTTP 响应：发完给定的数据块后阻塞，直到被关闭"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = threading.Event()
+        self.sent = threading.Event()
+
+    def iter_content(self):
+        for chunk in self.chunks:
+            yield chunk
+        self.sent.set()
+        self.closed.wait(5)
+        raise ConnectionError("response closed")
+
+    def close(self):
+        self.closed.set()
+
+
+class ParseWavHeaderTest(unittest.TestCase):
+    def test_header(self):
+        data = wav_bytes(b"\0" * 100, 24000, 2, 2)
+        self.assertEqual(((24000, 2, 2), 44), parse_wav_header(data))
+        self.assertEqual((None, None), parse_wav_header(data[:30]))
+        with self.assertRaises(ValueError):
+            parse_wav_header(b"ID3" + b"\0" * 20)
+
+
+class PCMStreamTest(unittest.TestCase):
+    def test_stream(self):
+        pcm = bytes(range(256)) * 40
+        closed = []
+        # 数据块很小，WAV 头要跨块拼接
+        stream = PCMStream(iter(split(wav_bytes(pcm, 22050), 7)), close=lambda: closed.append(1))
+        self.assertEqual((22050, 1, 2), stream.wait_format(5))
+        self.assertEqual(pcm, b"".join(stream))
+        path = stream.wait(5)
+        try:
+            self.assertEqual(os.path.abspath(constants.TEMP_PATH), os.path.dirname(path))
+            with wave.open(path, "rb") as w:
+                self.assertEqual(22050, w.getframerate())
+                self.assertEqual(pcm, w.readframes(w.getnframes()))
+        finally:
+            os.remove(path)
+        self.assertEqual([1], closed)
+
+    def test_invalid_stream(self):
+        stream = PCMStream(iter([b"ID3" + b"\0" * 100]))
+        self.assertIsNone(stream.wait_format(5))
+        self.assertIsNone(stream.wait(5))
+        self.assertIsInstance(stream.error, ValueError)
+        self.assertEqual([], list(stream))
+
+    def test_cancel_closes_the_response(self):
+        data = wav_bytes(b"\1" * 3200)
+        response = BlockingResponse(split(data, 1024))
+        stream = PCMStream(response.iter_content(), close=response.close)
+        self.assertTrue(response.sent.wait(5))
+        before = set(os.listdir(constants.TEMP_PATH))
+        stream.cancel()
+        # 不用等下一个数据块，响应立即关闭，下载线程随之结束
+        self.assertTrue(response.closed.is_set())
+        self.assertIsNone(stream.wait(5))
+        self.assertTrue(stream.done)
+        self.assertIsNone(stream.error)
+        self.assertEqual([], list(stream))
+        # 不完整的音频不保留
+        self.assertFalse(set(os.listdir(constants.TEMP_PATH)) - before)
+
+
+if __name__ == "__main__":
+    unittest.main()
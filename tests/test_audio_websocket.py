@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from robot import RemoteAudio
+from server import server
+
+
+class ImmediateLoop(object):
+    def add_callback(self, fn, *args):
+        fn(*args)
+
+
+class ImmediateExecutor(object):
+    """在调用线程里立即执行，测试不用等连接线程"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class FakeListener(object):
+    endpointing = True
+
+    def __init__(self):
+        self.frames = []
+        self.cancelled = False
+
+    def write(self, data):
+        self.frames.append(data)
+        return []
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def make_handler():
+    handler = object.__new__(server.AudioWebSocketHandler)
+    handler.loop = ImmediateLoop()
+    handler.executor = ImmediateExecutor()
+    handler.session_key = "remote:test"
+    handler.sent = []
+    handler.close_codes = []
+    handler.write_message = lambda message: handler.sent.append(json.loads(message))
+    handler.close = lambda code=None, reason=None: handler.close_codes.append(code)
+    return handler
+
+
+class AudioWebSocketHandlerTest(unittest.TestCase):
+    def test_start_creates_listener(self):
+        handler = make_handler()
+        listener = FakeListener()
+        with mock.patch.object(RemoteAudio, "create", return_value=listener) as create:
+            handler.on_message(json.dumps({"action": "start", "rate": 48000}))
+        self.assertEqual(48000, create.call_args.kwargs["rate"])
+        self.assertIs(listener, handler.listener)
+        self.assertEqual([{"action": "listening", "endpointing": True}], handler.sent)
+        handler.on_message(b"\x00\x00")
+        self.assertEqual([b"\x00\x00"], listener.frames)
+        self.assertEqual([], handler.close_codes)
+
+    def test_illegal_start_is_rejected(self):
+        for start in (
+            {"action": "start", "rate": "abc"},
+            {"action": "start", "rate": None},
+            {"action": "start", "rate": 16000.5},
+            {"action": "start", "rate": True},
+            {"action": "start", "rate": 0},
+            {"action": "start", "rate": 10 ** 9},
+            {"action": "start", "endpointing": "no"},
+        ):
+            handler = make_handler()
+            with mock.patch.object(RemoteAudio, "create") as create:
+                handler.on_message(json.dumps(start))
+            create.assert_not_called()
+            self.assertEqual("error", handler.sent[0]["action"], start)
+            self.assertEqual(400, handler.sent[0]["code"])
+            self.assertEqual([1007], handler.close_codes)
+
+    def test_non_object_message_is_ignored(self):
+        handler = make_handler()
+        handler.on_message(json.dumps([1, 2]))
+        handler.on_message("not json")
+        self.assertEqual(["error"], [m["action"] for m in handler.sent])
+        self.assertEqual([], handler.close_codes)
+
+    def test_failed_create_closes_and_drops_audio(self):
+        handler = make_handler()
+        old = FakeListener()
+        handler.listener = old
+        with mock.patch.object(RemoteAudio, "create", side_effect=RuntimeError("boom")):
+            handler.on_message(json.dumps({"action": "start"}))
+        self.assertTrue(old.cancelled)
+        self.assertIsNone(handler.listener)
+        self.assertEqual("error", handler.sent[-1]["action"])
+        self.assertEqual([1007], handler.close_codes)
+        # 收音没有开始，之后的音频和控制消息都不再出错
+        with mock.patch.object(server.logger, "error") as error:
+            handler.on_message(b"\x00\x00")
+            handler.on_message(json.dumps({"action": "end"}))
+            handler.on_message(json.dumps({"action": "cancel"}))
+        error.assert_not_called()
+
+    def test_failed_conversation_is_reported(self):
+        handler = make_handler()
+        listener = FakeListener()
+        listener.finish = lambda: (b"\x00\x00", None)
+        handler.listener = listener
+        handler._run = mock.Mock(side_effect=IOError("disk full"))
+        with mock.patch.object(server, "chat_executor", ImmediateExecutor()):
+            with mock.patch.object(server.logger, "error") as error:
+                handler.on_message(json.dumps({"action": "end"}))
+        error.assert_called_once()
+        self.assertEqual(
+            {"action": "error", "code": 500, "message": "conversation failed"},
+            handler.sent[-1],
+        )
+
+    def test_closed_before_run_drops_utterance(self):
+        handler = make_handler()
+        handler.closed = True
+        asr_stream = mock.Mock()
+        with mock.patch.object(server, "conversation") as conversation:
+            handler._run(b"\x00\x00", asr_stream)
+        asr_stream.cancel.assert_called_once()
+        conversation.get_session.assert_not_called()
+        conversation.doConverse.assert_not_called()
+
+    def test_closed_during_run_closes_session(self):
+        handler = make_handler()
+
+        def doConverse(fp, **kwargs):
+            # 对话期间断开连接，_close 已经先关闭过会话
+            handler.closed = True
+            os.remove(fp)
+
+        with mock.patch.object(server, "conversation") as conversation:
+            conversation.doConverse.side_effect = doConverse
+            handler._run(b"\x00\x00", None)
+        conversation.close_session.assert_called_once_with("remote:test")
+
+
+if __name__ == "__main__":
+    unittest.main()
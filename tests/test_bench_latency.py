@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench")
+)
+import latency  # noqa: E402
+
+
+def result(p50, failed=0):
+    stats = {"count": 3, "p50": p50, "p95": p50, "p99": p50}
+    res = {metric: dict(stats) for metric in latency.METRICS}
+    res["failed"] = failed
+    return res
+
+
+class ScenarioTest(unittest.TestCase):
+    def test_all_scenarios_parse(self):
+        names = latency.all_scenarios()
+        self.assertEqual(8, len(set(names)))
+        self.assertEqual(("voice", True, False), latency.parse_scenario("voice/robot-stream/tts"))
+        for name in names:
+            latency.parse_scenario(name)
+
+    def test_unknown_scenario(self):
+        for name in ("text/robot", "audio/robot/tts", "text/robot/tts-fast"):
+            with self.assertRaises(ValueError):
+                latency.parse_scenario(name)
+
+
+class OptionsTest(unittest.TestCase):
+    def test_defaults_match_run(self):
+        self.assertEqual(latency.DEFAULTS, latency.parse_args([]))
+
+    def test_flags(self):
+        opts = latency.parse_args(
+            ["--repeat", "3", "--scenarios", "text/robot/tts", "--tts-char-latency", "0"]
+        )
+        self.assertEqual(3, opts["repeat"])
+        self.assertEqual("text/robot/tts", opts["scenarios"])
+        self.assertEqual(0.0, opts["tts_char_latency"])
+
+    def test_run_rejects_bad_options_before_starting(self):
+        with mock.patch.object(latency.stubs, "load_config") as load_config:
+            with self.assertRaises(ValueError):
+                latency.run(repeats=3)
+            with self.assertRaises(ValueError):
+                latency.run(scenarios="text/robot/tts,voice/bot/tts")
+        load_config.assert_not_called()
+
+
+class PrintResultsTest(unittest.TestCase):
+    def render(self, results, baseline=None):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            latency.print_results(results, baseline)
+        return out.getvalue().splitlines()
+
+    def test_compare_with_baseline(self):
+        lines = self.render(
+            {"scenarios": {"text/robot/tts": result(110.0)}},
+            {"scenarios": {"text/robot/tts": result(100.0)}},
+        )
+        self.assertEqual(1 + len(latency.METRICS), len(lines))
+        self.assertTrue(lines[1].endswith("p50 +10.0%"))
+
+    def test_missing_values_and_failures(self):
+        lines = self.render({"scenarios": {"voice/robot/tts": result(None, failed=2)}})
+        self.assertIn("-", lines[1].split())
+        self.assertNotIn("%", lines[1])
+        self.assertIn("失败 2 次", lines[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import json
+import threading
+import unittest
+from unittest import mock
+from urllib.parse import urlencode
+
+import tornado.web
+from tornado.testing import AsyncHTTPTestCase
+
+from robot import config
+from server import server
+
+
+class FakeConversation(object):
+    """doResponse 先回复一句，然后等 release 才结束"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def get_session(self, key):
+        return key
+
+    @contextlib.contextmanager
+    def use_session(self, session):
+        yield session
+
+    def doResponse(self, query, uuid, onSay=None, onStream=None):
+        self.started.set()
+        onSay(f"re: {query}", None, "")
+        self.release.wait(5)
+
+
+class ChatHandlerTest(AsyncHTTPTestCase):
+    def get_app(self):
+        return tornado.web.Application([(r"/chat", server.ChatHandler)])
+
+    def setUp(self):
+        super(ChatHandlerTest, self).setUp()
+        self.conversation = FakeConversation()
+        patches = [
+            mock.patch.object(server, "conversation", self.conversation),
+            mock.patch.object(
+                server, "chat_executor", server.ChatExecutor(workers=1, queue_size=0)
+            ),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self.conversation.release.set)
+
+    def chat(self, **args):
+        body = {
+            "type": "text",
+            "query": "hi",
+            "uuid": "u1",
+            "validate": config.get("/server/validate", ""),
+        }
+        body.update(args)
+        return self.fetch("/chat", method="POST", body=urlencode(body))
+
+    def test_returns_once_queued(self):
+        resp = self.chat()
+        self.assertEqual(200, resp.code)
+        self.assertEqual({"code": 0, "message": "queued"}, json.loads(resp.body))
+        self.assertTrue(self.conversation.started.wait(5))
+        # 对话还没结束，队列已满
+        resp = self.chat()
+        self.assertEqual(429, resp.code)
+
+    def test_wait_returns_replies(self):
+        self.conversation.release.set()
+        resp = self.chat(wait="true")
+        self.assertEqual(200, resp.code)
+        res = json.loads(resp.body)
+        self.assertEqual(0, res["code"])
+        self.assertEqual("re: hi", res["resp"])
+
+
+if __name__ == "__main__":
+    unittest.main()
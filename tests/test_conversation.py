@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import queue
+import random
+import threading
+import time
+import unittest
+from unittest import mock
+
+from robot.LatencyMonitor import LatencyMonitor
+from robot.Session import Session
+from robot.TTSPool import TTSEnginePool
+
+try:
+    from robot.Conversation import Conversation
+except Exception:  # 缺少 snowboy 等依赖
+    Conversation = None
+
+
+class FakeTTS(object):
+    """随机耗时的合成，failures 中的句子合成失败"""
+
+    SLUG = "fake-tts"
+
+    def __init__(self, failures=()):
+        self.failures = set(failures)
+
+    def get_speech(self, phrase):
+        time.sleep(random.uniform(0, 0.02))
+        return None if phrase in self.failures else phrase
+
+
+class FakeStream(object):
+    """已经下载完的音频流，error 不为空表示中途断流"""
+
+    def __init__(self, phrase, error=None):
+        self.phrase = phrase
+        self.error = error
+
+    def wait(self):
+        return None if self.error else self.phrase
+
+
+class FakeStreamingTTS(FakeTTS):
+    """流式合成，failures 中的句子下载中途失败"""
+
+    streaming = True
+
+    def get_speech_stream(self, phrase):
+        time.sleep(random.uniform(0, 0.02))
+        if phrase in self.failures:
+            return FakeStream(phrase, error=IOError("连接中断"))
+        return FakeStream(phrase)
+
+
+class FakePlayer(object):
+    """按提交顺序逐个“播放”，播完调用 onCompleted"""
+
+    def __init__(self):
+        self.played = []
+        self.changed = threading.Condition()
+        self.queue = queue.Queue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            voice, onCompleted = self.queue.get()
+            with self.changed:
+                self.played.append(voice)
+                self.changed.notify_all()
+            onCompleted and onCompleted()
+            self.queue.task_done()
+
+    def play(self, voice, delete=False, onCompleted=None):
+        self.queue.put((voice, onCompleted))
+
+    def is_playing(self):
+        return self.queue.unfinished_tasks > 0
+
+
+def make_conversation(tts):
+    """只带分段合成和播放所需状态的 Conversation"""
+    conversation = object.__new__(Conversation)
+    conversation.local = threading.local()
+    conversation.latency_monitor = LatencyMonitor()
+    conversation.tts_cache = mock.Mock(get=mock.Mock(return_value=None))
+    conversation.tts_pool = TTSEnginePool(lambda voice_config: tts)
+    conversation.default_session = Session(
+        tts=tts, player=FakePlayer(), play_segment=conversation._playSegment
+    )
+    return conversation
+
+
+@unittest.skipIf(Conversation is None, "需要 snowboy")
+class SayTest(unittest.TestCase):
+    def say(self, conversation, msg):
+        done = threading.Event()
+        conversation.say(msg, append_history=False, onCompleted=done.set)
+        return done
+
+    def test_segments_play_in_order(self):
+        conversation = make_conversation(FakeTTS())
+        done = self.say(conversation, "一。二。三。四。五")
+        self.assertTrue(done.wait(5))
+        self.assertEqual(["一", "二", "三", "四", "五"], conversation.session.player.played)
+
+    def test_overlapping_says_on_one_session(self):
+        conversation = make_conversation(FakeTTS())
+        replies = {
+            "A": [f"A{i}" for i in range(8)],
+            "B": [f"B{i}" for i in range(8)],
+        }
+        events = {}
+        start = threading.Barrier(2)
+
+        def say(key):
+            start.wait()
+            events[key] = self.say(conversation, "。".join(replies[key]))
+
+        threads = [threading.Thread(target=say, args=(key,)) for key in replies]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        for event in events.values():
+            self.assertTrue(event.wait(5))
+        conversation.session.player.queue.join()
+        played = conversation.session.player.played
+        # 每段恰好播放一次，两次回复各自按顺序、不交错
+        first = played[0][0]
+        second = "B" if first == "A" else "A"
+        self.assertEqual(replies[first] + replies[second], played)
+
+    def test_completed_when_last_segment_fails(self):
+        conversation = make_conversation(FakeTTS(failures={"三"}))
+        done = self.say(conversation, "一。二。三")
+        self.assertTrue(done.wait(5))
+        self.assertEqual(["一", "二"], conversation.session.player.played)
+
+    def test_failed_engine_leaves_the_pool(self):
+        tts = FakeTTS(failures={"二"})
+        conversation = make_conversation(tts)
+        self.assertIs(tts, conversation.tts_pool.get("a", {"engine": "fake"}))
+        done = self.say(conversation, "一。二")
+        self.assertTrue(done.wait(5))
+        self.assertEqual({"a": 1}, conversation.tts_pool.stats()["evictions"])
+
+    def test_streamed_segments_play_in_order(self):
+        tts = FakeStreamingTTS(failures={"二"})
+        conversation = make_conversation(tts)
+        self.assertIs(tts, conversation.tts_pool.get("a", {"engine": "fake"}))
+        done = self.say(conversation, "一。二。三")
+        self.assertTrue(done.wait(5))
+        # 断流的分段照样交给播放器，播放器只放出已经收到的部分
+        self.assertEqual(
+            ["一", "二", "三"],
+            [stream.phrase for stream in conversation.session.player.played],
+        )
+        self.assertEqual({"a": 1}, conversation.tts_pool.stats()["evictions"])
+        self.assertEqual(
+            {("tts", "fake-tts"): 1}, conversation.latency_monitor.get_error_counts()
+        )
+
+    def test_completed_when_nothing_to_play(self):
+        conversation = make_conversation(FakeTTS(failures={"一", "二"}))
+        done = self.say(conversation, "一。二")
+        self.assertTrue(done.wait(5))
+        self.assertEqual([], conversation.session.player.played)
+
+
+@unittest.skipIf(Conversation is None, "需要 snowboy")
+class StreamSayTest(unittest.TestCase):
+    def test_plays_while_stream_continues(self):
+        conversation = make_conversation(FakeTTS())
+        conversation.appendHistory = mock.Mock()
+        conversation._after_play = mock.Mock()
+        player = conversation.session.player
+        waited = []
+
+        def stream():
+            yield "第一句"
+            yield "。"
+            # 后面的文字还没到，第一句已经合成并开始播放
+            with player.changed:
+                player.changed.wait_for(lambda: player.played, 5)
+                waited.append(list(player.played))
+            yield "第二句。"
+
+        done = threading.Event()
+        conversation.stream_say(stream, onCompleted=done.set)
+        self.assertEqual([["第一句。"]], waited)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(["第一句。", "第二句。"], player.played)
+        conversation.appendHistory.assert_called_once()
+        self.assertEqual("第一句。第二句。", conversation.appendHistory.call_args.args[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
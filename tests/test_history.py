@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from robot import config, constants
+from robot.sdk import History as history_module
+
+real_get = config.get
+
+
+def make_history(persist, data_dir=None, cache_size=5):
+    """绕过单例，用指定的配置构建一个新的 History"""
+
+    def get(item="", default=None, warn=False):
+        if item == "/history/persist":
+            return persist
+        return real_get(item, default, warn)
+
+    with mock.patch.object(config, "get", get), mock.patch.object(
+        constants, "getConfigData", lambda *fname: os.path.join(data_dir or "", *fname)
+    ):
+        cls = type(history_module.History())
+        return cls(cache_size=cache_size)
+
+
+def message(text, uuid=None):
+    return {"type": 0, "text": text, "uuid": uuid or text, "plugin": "", "time": ""}
+
+
+class HistoryTest(unittest.TestCase):
+    def texts(self, messages):
+        return [m["text"] for m in messages]
+
+    def test_seq_cursor(self):
+        history = make_history(False)
+        for i in range(1, 4):
+            history.add_message(message(f"m{i}"))
+        self.assertEqual([1, 2, 3], [m["seq"] for m in history.get_messages()])
+        self.assertEqual(["m1", "m2", "m3"], self.texts(history.get_messages_since(None)))
+        self.assertEqual(["m3"], self.texts(history.get_messages_since(2)))
+        self.assertEqual(["m2", "m3"], self.texts(history.get_messages_since("1")))
+        self.assertEqual([], history.get_messages_since(3))
+        # 兼容旧的 uuid 游标
+        self.assertEqual(["m3"], self.texts(history.get_messages_since("m2")))
+        # 未知游标、来自重启之前的游标都返回全部
+        self.assertEqual(3, len(history.get_messages_since("unknown")))
+        self.assertEqual(3, len(history.get_messages_since(99)))
+
+    def test_cursor_after_eviction(self):
+        history = make_history(False, cache_size=3)
+        for i in range(1, 7):
+            history.add_message(message(f"m{i}"))
+        self.assertEqual(["m4", "m5", "m6"], self.texts(history.get_messages()))
+        # 游标对应的消息已经被挤出缓存时返回缓存中的全部
+        self.assertEqual(["m4", "m5", "m6"], self.texts(history.get_messages_since(1)))
+        self.assertEqual(["m6"], self.texts(history.get_messages_since(5)))
+        self.assertNotIn("m1", history.uuids)
+
+    def test_page_and_search_in_memory(self):
+        history = make_history(False)
+        for i in range(1, 6):
+            history.add_message(message(f"消息{i}"))
+        self.assertEqual(["消息4", "消息5"], self.texts(history.page(limit=2)))
+        self.assertEqual(["消息2", "消息3"], self.texts(history.page(before=4, limit=2)))
+        self.assertEqual(["消息1", "消息2"], self.texts(history.search("消息", before=3)))
+        self.assertEqual(["消息5"], self.texts(history.search("消息", limit=1)))
+
+    def test_persist_and_restore(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            history = make_history(True, tmp, cache_size=3)
+            self.assertIsNotNone(history.store)
+            for i in range(1, 8):
+                history.add_message(message(f"第{i}条消息"))
+            history.close()
+
+            history = make_history(True, tmp, cache_size=3)
+            try:
+                self.assertEqual(7, history.seq)
+                self.assertEqual([5, 6, 7], [m["seq"] for m in history.get_messages()])
+                self.assertEqual(["第6条消息", "第7条消息"], self.texts(history.get_messages_since(5)))
+                # 缓存之外的更早记录从存储里分页读取
+                self.assertEqual([3, 4, 5, 6, 7], [m["seq"] for m in history.page(limit=5)])
+                self.assertEqual([2, 3, 4], [m["seq"] for m in history.page(before=5, limit=3)])
+                self.assertEqual([1], [m["seq"] for m in history.search("第1条")])
+                # 新消息接着原来的序号
+                history.add_message(message("新消息"))
+                self.assertEqual(8, history.get_messages()[-1]["seq"])
+            finally:
+                history.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import time
+import unittest
+
+from robot.sdk.HistoryStore import HistoryStore
+
+
+def message(seq, text):
+    return {"seq": seq, "uuid": f"u{seq}", "type": 0, "text": text, "plugin": "", "time": ""}
+
+
+class HistoryStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.tmp.cleanup()
+
+    def open(self, **kwargs):
+        store = HistoryStore(os.path.join(self.tmp.name, "history.db"), **kwargs)
+        self.stores.append(store)
+        return store
+
+    def fill(self, store, texts, start=1):
+        for i, text in enumerate(texts, start):
+            store.append(message(i, text))
+        self.assertTrue(store.flush(5))
+
+    def seqs(self, rows):
+        return [row["seq"] for row in rows]
+
+    def test_page(self):
+        store = self.open()
+        self.fill(store, [f"消息{i}" for i in range(1, 11)])
+        self.assertEqual(10, store.last_seq())
+        self.assertEqual([8, 9, 10], self.seqs(store.page(limit=3)))
+        self.assertEqual([5, 6, 7], self.seqs(store.page(before=8, limit=3)))
+        self.assertEqual([1, 2], self.seqs(store.page(before=3, limit=3)))
+        self.assertEqual("消息10", store.page(limit=1)[0]["text"])
+
+    def test_reopen_keeps_messages(self):
+        store = self.open()
+        self.fill(store, ["你好", "今天天气怎么样"])
+        store.close()
+        store = self.open()
+        self.assertEqual(2, store.last_seq())
+        self.assertEqual(["你好", "今天天气怎么样"], [m["text"] for m in store.page()])
+
+    def test_search(self):
+        store = self.open()
+        self.fill(store, ["今天天气怎么样", "明天天气不错", "播放音乐", "100%_的把握"])
+        # 三个字以上走全文检索
+        self.assertEqual([1, 2], self.seqs(store.search("天天气")))
+        self.assertEqual([1], self.seqs(store.search("天天气", before=2)))
+        self.assertEqual([2], self.seqs(store.search("天天气", limit=1)))
+        # 更短的关键词走 LIKE
+        self.assertEqual([3], self.seqs(store.search("音乐")))
+        self.assertEqual([4], self.seqs(store.search("%_")))
+        self.assertEqual([], self.seqs(store.search("%x")))
+
+    def test_search_without_fts(self):
+        store = self.open()
+        store.fts = False
+        self.fill(store, ["今天天气怎么样", "播放音乐"])
+        self.assertEqual([1], self.seqs(store.search("天天气")))
+
+    def test_replace_updates_index(self):
+        store = self.open()
+        self.fill(store, ["今天天气怎么样", "播放音乐"])
+        # 重启前没写完时序号会重复使用
+        store.append(message(2, "明天天气不错"))
+        self.assertTrue(store.flush(5))
+        self.assertEqual([], store.search("播放音乐"))
+        self.assertEqual([2], self.seqs(store.search("明天天气")))
+        conn = store._connect()
+        conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('integrity-check')")
+
+    def test_compact_max_messages(self):
+        store = self.open(max_messages=3)
+        self.fill(store, [f"第{i}条消息" for i in range(1, 8)])
+        store.compact()
+        self.assertEqual([5, 6, 7], self.seqs(store.page()))
+        self.assertEqual([5, 6, 7], self.seqs(store.search("条消息")))
+        self.assertEqual(7, store.last_seq())
+
+    def test_compact_max_days(self):
+        store = self.open(max_messages=0, max_days=1)
+        self.fill(store, ["很久以前的消息", "昨天的消息", "刚刚的消息"])
+        conn = store._connect()
+        with conn:
+            conn.execute("UPDATE messages SET created = ? WHERE seq = 1", (time.time() - 3 * 86400,))
+        store.compact()
+        self.assertEqual([2, 3], self.seqs(store.page()))
+        self.assertEqual([2, 3], self.seqs(store.search("的消息")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+HotwordDetector 从共享采集服务的订阅中阻塞读取：没有录音时不跑检测，
+回调执行期间采集到的录音留在缓冲区里，不会丢失
+"""
+import os
+import threading
+import time
+import unittest
+import wave
+
+from robot import AudioCapture
+from tests.test_preroll import (
+    KEYWORD_END,
+    SPEECH,
+    FakeDetector,
+    frame,
+    silence,
+    snowboydecoder,
+    speech,
+    value,
+)
+
+
+class CountingDetector(FakeDetector):
+    def __init__(self):
+        self.frames = []
+
+    def RunDetection(self, data):
+        self.frames.append(value(data))
+        return super(CountingDetector, self).RunDetection(data)
+
+
+class ObservedCapture(AudioCapture.AudioCapture):
+    """订阅时通知测试，之后写入的录音才会被读到"""
+
+    def __init__(self):
+        super(ObservedCapture, self).__init__(buffer_seconds=5)
+        self.subscribed = threading.Event()
+
+    def subscribe(self, preroll=0, since=None):
+        sub = super(ObservedCapture, self).subscribe(preroll, since)
+        self.subscribed.set()
+        return sub
+
+
+@unittest.skipIf(snowboydecoder is None, "需要 snowboy")
+class HotwordDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.capture = ObservedCapture()
+        self.previous = AudioCapture.set_capture(self.capture)
+        self.detector = object.__new__(snowboydecoder.HotwordDetector)
+        self.detector.detector = CountingDetector()
+        self.detector.num_hotwords = 1
+        self.detector.frame_bytes = AudioCapture.FRAME_BYTES
+        self.detector.detected_at = None
+        self.files = []
+
+    def tearDown(self):
+        AudioCapture.set_capture(self.previous)
+        for fp in self.files:
+            os.remove(fp)
+
+    def start(self, **kwargs):
+        kwargs.setdefault("sleep_time", 0.05)
+        thread = threading.Thread(target=self.detector.start, kwargs=kwargs)
+        thread.start()
+        self.assertTrue(self.capture.subscribed.wait(5))
+        return thread
+
+    def test_frames_during_callback_are_recorded(self):
+        recorded = threading.Event()
+        detected = []
+
+        def onDetected():
+            detected.append(self.detector.detected_at)
+            # 回调执行期间用户已经开口
+            self.capture.write(speech(0, 4) + silence(4))
+
+        def onRecorded(fp):
+            self.files.append(fp)
+            recorded.set()
+
+        before = time.perf_counter()
+        thread = self.start(
+            detected_callback=onDetected,
+            interrupt_check=recorded.is_set,
+            audio_recorder_callback=onRecorded,
+            silent_count_threshold=0,
+        )
+        self.capture.write(silence(2) + frame(KEYWORD_END))
+        self.assertTrue(recorded.wait(5))
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(1, len(detected))
+        self.assertGreaterEqual(detected[0], before)
+        with wave.open(self.files[0], "rb") as f:
+            pcm = f.readframes(f.getnframes())
+        frames = [
+            value(pcm[i : i + AudioCapture.FRAME_BYTES])
+            for i in range(0, len(pcm), AudioCapture.FRAME_BYTES)
+        ]
+        self.assertEqual([SPEECH + i for i in range(4)] + [0], frames)
+
+    def test_no_detection_without_audio(self):
+        interrupted = threading.Event()
+        thread = self.start(
+            detected_callback=None, interrupt_check=interrupted.is_set
+        )
+        interrupted.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([], self.detector.detector.frames)
+
+    def test_terminate_unblocks_read(self):
+        thread = self.start(detected_callback=None, sleep_time=None)
+        self.capture.write(silence(3))
+        self.detector.terminate()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertLessEqual(len(self.detector.detector.frames), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from robot.sdk import HttpClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    def respond(self):
+        self.server.requests.append(self.command)
+        length = int(self.headers.get("Content-Length") or 0)
+        length and self.rfile.read(length)
+        if self.path == "/slow":
+            time.sleep(0.5)
+        self.send_response(503 if self.path == "/busy" else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_POST = respond
+
+    def log_message(self, *args):
+        pass
+
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        options = dict(HttpClient.DEFAULT_OPTIONS, backoff_factor=0)
+        self.session = HttpClient.build_session(options)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_retries_on_status(self):
+        self.session.get(self.url + "/busy")
+        self.assertEqual(["GET"] * 3, self.server.requests)
+
+    def test_post_not_retried_on_status(self):
+        self.session.post(self.url + "/busy", data=b"{}")
+        self.assertEqual(["POST"], self.server.requests)
+
+    def test_post_not_retried_on_read_timeout(self):
+        # 重试过的请求会抛出 ConnectionError（Max retries exceeded）
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.session.post(self.url + "/slow", data=b"{}", timeout=0.1)
+        time.sleep(0.5)
+        self.assertEqual(["POST"], self.server.requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+from robot.LatencyMonitor import (
+    HISTOGRAM_BUCKETS,
+    HISTOGRAM_MIN,
+    LatencyHistogram,
+    LatencyMonitor,
+    RollingHistogram,
+    bucket_of,
+    bucket_value,
+    summarize,
+)
+
+# 桶的几何中点相对误差的上限
+TOLERANCE = 0.022
+
+
+class SummarizeTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        stats = summarize(range(1, 101))
+        self.assertEqual({"count": 100, "p50": 50, "p95": 95, "p99": 99}, stats)
+        self.assertEqual(3, summarize([3, 1, 2], (100,))["p100"])
+        self.assertEqual(1, summarize([3, 1, 2], (1,))["p1"])
+
+    def test_empty(self):
+        self.assertEqual({"count": 0, "p50": None}, summarize([], (50,)))
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_bucket_error(self):
+        for value in (0.15, 1, 7.3, 42, 999, 123456):
+            self.assertLessEqual(abs(bucket_value(bucket_of(value)) - value) / value, TOLERANCE)
+        self.assertEqual(0, bucket_of(0))
+        self.assertEqual(0, bucket_of(HISTOGRAM_MIN))
+        self.assertEqual(HISTOGRAM_BUCKETS - 1, bucket_of(1e12))
+
+    def test_percentile_close_to_exact(self):
+        rng = random.Random(1)
+        values = [rng.lognormvariate(5, 1) for _ in range(5000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+        exact = summarize(values, (50, 90, 99))
+        for p in (50, 90, 99):
+            estimate = histogram.percentile(p)
+            self.assertLessEqual(abs(estimate - exact[f"p{p}"]) / exact[f"p{p}"], TOLERANCE)
+        stats = histogram.summary()
+        self.assertEqual(5000, stats["count"])
+        self.assertEqual(round(min(values), 2), stats["min"])
+        self.assertEqual(round(max(values), 2), stats["max"])
+        self.assertAlmostEqual(sum(values) / len(values), stats["avg"], places=1)
+
+    def test_clamped_to_min_max(self):
+        histogram = LatencyHistogram()
+        histogram.record(100)
+        self.assertEqual(100, histogram.percentile(50, 100, 100))
+        self.assertEqual({"count": 1, "avg": 100, "min": 100, "max": 100, "p50": 100},
+                         histogram.summary((50,)))
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        self.assertEqual({"count": 0, "avg": None, "min": None, "max": None, "p99": None},
+                         histogram.summary((99,)))
+
+    def test_remove(self):
+        a, b = LatencyHistogram(), LatencyHistogram()
+        for value in (1, 10, 100):
+            a.record(value)
+        b.record(10)
+        a.remove(b)
+        self.assertEqual(2, a.count)
+        self.assertEqual(101, a.sum)
+        self.assertEqual([bucket_of(1), bucket_of(100)], sorted(a.counts))
+        a.remove(a.copy())
+        self.assertEqual((0, 0.0), (a.count, a.sum))
+        self.assertEqual([], a.buckets())
+
+
+class RollingHistogramTest(unittest.TestCase):
+    def test_expire(self):
+        rolling = RollingHistogram(60, 6)
+        rolling.record(5, now=0)
+        rolling.record(50, now=30)
+        histogram, low, high = rolling.snapshot(now=59)
+        self.assertEqual((2, 5, 50), (histogram.count, low, high))
+        # 第一个分片 [0, 10) 已经滑出窗口
+        histogram, low, high = rolling.snapshot(now=65)
+        self.assertEqual((1, 50, 50), (histogram.count, low, high))
+        histogram, low, high = rolling.snapshot(now=1000)
+        self.assertEqual((0, None, None), (histogram.count, low, high))
+        self.assertIsNone(histogram.percentile(50))
+
+    def test_snapshot_is_a_copy(self):
+        rolling = RollingHistogram(60, 6)
+        rolling.record(5, now=0)
+        histogram, _, _ = rolling.snapshot(now=0)
+        rolling.record(6, now=1)
+        self.assertEqual(1, histogram.count)
+
+
+class LatencyMonitorTest(unittest.TestCase):
+    def test_sessions_and_percentiles(self):
+        monitor = LatencyMonitor(max_sessions=2)
+        for i in range(3):
+            tracker = monitor.start_session(f"s{i}")
+            tracker.timestamps["asr_start"] = 0
+            tracker.timestamps["asr_end"] = 0.1 * (i + 1)
+            monitor.end_session(f"s{i}")
+        self.assertIsNone(monitor.get_session("s0"))
+        self.assertIsNotNone(monitor.get_session("s2"))
+        self.assertEqual(3, monitor.get_counts()["sessions"])
+        stats = monitor.get_percentiles((50, 100))["asr_latency"]
+        self.assertEqual(3, stats["count"])
+        self.assertEqual((100, 300), (stats["min"], stats["max"]))
+        # 估算值不会超出实际的最小、最大值
+        self.assertLessEqual(stats["p100"], 300)
+        self.assertLessEqual(abs(stats["p100"] - 300) / 300, TOLERANCE)
+        self.assertLessEqual(abs(stats["p50"] - 200) / 200, TOLERANCE)
+        self.assertEqual(3, monitor.get_window_stats()["1m"]["asr_latency"]["count"])
+
+    def test_end_session_twice(self):
+        monitor = LatencyMonitor()
+        tracker = monitor.start_session("s")
+        tracker.timestamps["asr_start"] = 0
+        tracker.timestamps["asr_end"] = 0.1
+        self.assertIs(tracker, monitor.end_session("s"))
+        self.assertIs(tracker, monitor.end_session("s"))
+        self.assertEqual(1, monitor.get_counts()["sessions"])
+        self.assertEqual(1, monitor.get_percentiles()["asr_latency"]["count"])
+
+    def test_record_latency_without_session(self):
+        monitor = LatencyMonitor()
+        monitor.record_latency("beep_latency", 20)
+        monitor.record_latency("beep_latency", 150)
+        self.assertEqual(0, monitor.get_counts()["sessions"])
+        self.assertEqual({"beep_latency": 1}, monitor.get_counts()["over_threshold"])
+        self.assertEqual(2, monitor.get_percentiles(window="1h")["beep_latency"]["count"])
+
+    def test_unknown_window(self):
+        with self.assertRaises(ValueError):
+            LatencyMonitor().get_percentiles(window="7d")
+
+
+if __name__ == "__main__":
+    unittest.main()
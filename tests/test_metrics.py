@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import re
+import threading
+import unittest
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from robot import Metrics
+from robot.LatencyMonitor import LatencyMonitor
+
+SAMPLE = re.compile(
+    r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)'
+    r'(?:\{(?P<labels>(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*",?)*)\})?'
+    r' (?P<value>[-+]?(?:[0-9.e+-]+|Inf)|NaN)$'
+)
+
+
+def parse(text):
+    """解析文本格式，返回 ({指标名: 类型}, [(指标名, {标签}, 值)])"""
+    types, samples = {}, []
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ", 3)
+            types[name] = kind
+            continue
+        if line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        if not match:
+            raise AssertionError(f"格式错误：{line!r}")
+        labels = dict(re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"', match["labels"] or ""))
+        samples.append((match["name"], labels, float(match["value"])))
+    return types, samples
+
+
+class ExpositionTest(unittest.TestCase):
+    def test_format(self):
+        out = Metrics.Exposition()
+        out.family("demo_total", "counter", "示例")
+        out.sample("demo_total", 3, engine='a"b\\c\nd')
+        out.sample("demo_total", None, engine="skipped")
+        out.sample("demo_total", 0.1 + 0.2)
+        out.sample("demo_total", float("inf"))
+        self.assertEqual(
+            "# HELP demo_total 示例\n"
+            "# TYPE demo_total counter\n"
+            'demo_total{engine="a\\"b\\\\c\\nd"} 3\n'
+            "demo_total 0.3\n"
+            "demo_total +Inf\n",
+            out.render(),
+        )
+        parse(out.render())
+
+
+class LatencyMetricsTest(unittest.TestCase):
+    def render(self, monitor):
+        out = Metrics.Exposition()
+        Metrics._latency_metrics(out, monitor)
+        return parse(out.render())
+
+    def test_histogram(self):
+        monitor = LatencyMonitor()
+        for ms in (5, 40, 40, 300, 20000, 100000):
+            monitor.record_latency("asr_latency", ms)
+        monitor.record_latency("beep_latency", 150)
+        monitor.record_error("tts", "edge-tts")
+        types, samples = self.render(monitor)
+        self.assertEqual("histogram", types["wukong_stage_latency_seconds"])
+
+        buckets = [
+            (labels["le"], value)
+            for name, labels, value in samples
+            if name == "wukong_stage_latency_seconds_bucket" and labels["stage"] == "asr"
+        ]
+        self.assertEqual(len(Metrics.LATENCY_BUCKETS) + 1, len(buckets))
+        self.assertEqual(("+Inf", 6), buckets[-1])
+        counts = [value for _, value in buckets]
+        self.assertEqual(sorted(counts), counts)
+        by_le = dict(buckets)
+        self.assertEqual(1, by_le["0.01"])
+        self.assertEqual(3, by_le["0.05"])
+        self.assertEqual(4, by_le["0.5"])
+        self.assertEqual(5, by_le["30.0"])
+        self.assertEqual(5, by_le["60.0"])
+
+        values = {(name, tuple(sorted(labels.items()))): value for name, labels, value in samples}
+        self.assertAlmostEqual(
+            120.385, values[("wukong_stage_latency_seconds_sum", (("stage", "asr"),))], places=3
+        )
+        self.assertEqual(6, values[("wukong_stage_latency_seconds_count", (("stage", "asr"),))])
+        self.assertEqual(0, values[("wukong_sessions_total", ())])
+        self.assertEqual(1, values[("wukong_stage_over_threshold_total", (("stage", "beep"),))])
+        self.assertEqual(
+            1,
+            values[("wukong_engine_errors_total", (("component", "tts"), ("engine", "edge-tts")))],
+        )
+        quantiles = [
+            labels
+            for name, labels, _ in samples
+            if name == "wukong_stage_latency_window_seconds" and labels["stage"] == "asr"
+        ]
+        self.assertEqual(9, len(quantiles))
+        self.assertEqual({"1m", "1h", "24h"}, {labels["window"] for labels in quantiles})
+
+    def test_player_queue_depth_covers_all_sessions(self):
+        def session(depth):
+            return SimpleNamespace(player=SimpleNamespace(queue_depth=lambda: depth))
+
+        shared = session(4)
+        conversation = SimpleNamespace(
+            default_session=session(1),
+            sessions=OrderedDict([("a", session(2)), ("b", shared), ("c", shared),
+                                  ("d", SimpleNamespace(player=None))]),
+            sessions_lock=threading.Lock(),
+        )
+        out = Metrics.Exposition()
+        Metrics._player_metrics(out, conversation)
+        _, samples = parse(out.render())
+        values = {name: value for name, _, value in samples}
+        self.assertEqual(7, values["wukong_player_queue_depth"])
+        self.assertEqual(4, values["wukong_client_sessions"])
+
+    def test_render_parses(self):
+        types, samples = parse(Metrics.render())
+        names = {name for name, _, _ in samples}
+        for family in ("wukong_sessions_total", "wukong_tts_cache_hit_ratio",
+                       "wukong_player_queue_depth", "process_cpu_seconds_total"):
+            self.assertIn(family, types)
+            self.assertIn(family, names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+import wave
+from unittest import mock
+
+from robot import AudioEngine, Player, constants
+from robot.AudioStream import PCMStream
+
+
+class AudioPlayerDeleteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = AudioEngine.AudioEngine(rate=16000, channels=1)
+        self.engine.start_virtual()
+        self.player = Player.AudioPlayer(self.engine)
+
+    def tearDown(self):
+        self.engine.close()
+        self.tmp.cleanup()
+
+    def wav(self, name, seconds):
+        path = os.path.join(self.tmp.name, name)
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            w.writeframes(b"\0" * int(32000 * seconds))
+        return path
+
+    def watch_writes(self):
+        """
+        :returns: (第一次写入声道后设置的 Event, 写入因 stop() 被丢弃后设置的 Event)
+        """
+        started, dropped = threading.Event(), threading.Event()
+        write = self.player.channel.write
+
+        def watched(data, generation):
+            ok = write(data, generation)
+            started.set()
+            ok or dropped.set()
+            return ok
+
+        self.player.channel.write = watched
+        return started, dropped
+
+    def test_stop_keeps_cached_file(self):
+        # 正在播放的是缓存文件，排在后面的临时文件播放后要删除
+        cached = self.wav("cached.wav", 5)  # 比输出缓冲长，停止时还在解码
+        temp = self.wav("temp.wav", 1)
+        started, dropped = self.watch_writes()
+        self.player.play(cached, delete=False)
+        self.player.play(temp, delete=True)
+        self.assertTrue(started.wait(5))
+        self.player.stop()
+        # 解码线程发现声道已清空，放弃了这一段
+        self.assertTrue(dropped.wait(5))
+        self.assertTrue(os.path.exists(cached))
+
+    def test_stop_deletes_unplayed_temp_files(self):
+        # 已写入声道和还在排队的临时文件都不会再有完成回调，由 stop() 删除
+        fed = self.wav("fed.wav", 1)  # 比输出缓冲短，一次写完
+        queued = self.wav("queued.wav", 1)
+        started, _ = self.watch_writes()
+        self.player.play(fed, delete=True)
+        self.player.play(queued, delete=True)
+        self.assertTrue(started.wait(5))
+        self.player.stop()
+        for path in (fed, queued):
+            for _ in range(50):
+                if not os.path.exists(path):
+                    break
+                time.sleep(0.1)
+            self.assertFalse(os.path.exists(path))
+
+    def test_delete_after_play(self):
+        temp = self.wav("temp.wav", 0.1)
+        done = threading.Event()
+        self.player.play(temp, delete=True, onCompleted=done.set)
+        # 删除在完成回调之前
+        self.assertTrue(done.wait(5))
+        self.player.join()
+        self.assertFalse(os.path.exists(temp))
+
+
+class SoxPlayerAfplayTest(unittest.TestCase):
+    """没有安装 sox 的 macOS 上用 afplay 播放下载完的音频流"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(constants, "TEMP_PATH", self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # 不启动播放线程
+        self.player = object.__new__(Player.SoxPlayer)
+        self.player.proc = None
+        self.player.delete = False
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def stream(self, pcm):
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            w.writeframes(pcm)
+        stream = PCMStream(iter([buf.getvalue()]))
+        stream.wait(5)
+        return stream
+
+    @mock.patch.object(Player.platform, "system", return_value="Darwin")
+    @mock.patch.object(Player.shutil, "which", return_value=None)
+    def test_plays_a_copy_of_the_stream(self, *_):
+        pcm = b"\x01\x02" * 1600
+        stream = self.stream(pcm)
+        # 下载完成后文件被移进 TTS 缓存
+        os.rename(stream.path, os.path.join(self.tmp.name, "cached.wav"))
+        played = []
+
+        def popen(cmd, **kwargs):
+            with wave.open(cmd[1], "rb") as w:
+                played.append(w.readframes(w.getnframes()))
+            return mock.Mock(returncode=0)
+
+        with mock.patch.object(Player.subprocess, "Popen", side_effect=popen):
+            self.assertTrue(self.player.doPlay(stream))
+        self.assertEqual([pcm], played)
+        # 播放用的副本播完即删
+        for _ in range(50):
+            if os.listdir(self.tmp.name) == ["cached.wav"]:
+                break
+            time.sleep(0.1)
+        self.assertEqual(["cached.wav"], os.listdir(self.tmp.name))
+
+
+if __name__ == "__main__":
+    unittest.main()
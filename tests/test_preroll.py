@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+预录音：用 ReplaySource 回放录音，检查唤醒词和机器人自己的声音不会
+被送进 ASR，而用户在录音开始前说的话会被补进录音
+"""
+import os
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from robot import AudioCapture, VAD
+
+try:
+    from snowboy import snowboydecoder
+except Exception:  # 没有 snowboy 的原生库或 PyAudio
+    snowboydecoder = None
+
+FRAME_SAMPLES = AudioCapture.FRAMES_PER_BUFFER
+
+# 每一帧填满同一个采样值，方便认出送进 ASR 的是哪一帧
+KEYWORD = 100
+KEYWORD_END = 101  # 唤醒词的最后一帧，在这一帧检测到唤醒词
+ECHO = 300
+SPEECH = 1000  # 用户说的第 i 帧为 SPEECH + i
+
+
+def frame(value):
+    return np.full(FRAME_SAMPLES, value, dtype=np.int16).tobytes()
+
+
+def value(data):
+    return int(np.frombuffer(data, dtype=np.int16)[0])
+
+
+def speech(start, count):
+    return b"".join(frame(SPEECH + i) for i in range(start, start + count))
+
+
+def silence(count):
+    return frame(0) * count
+
+
+class FakeDetector(object):
+    """代替 snowboy：静音帧返回 -2，唤醒词的最后一帧返回 1，其他返回 0"""
+
+    def Reset(self):
+        pass
+
+    def SampleRate(self):
+        return AudioCapture.RATE
+
+    def NumChannels(self):
+        return AudioCapture.CHANNELS
+
+    def BitsPerSample(self):
+        return AudioCapture.SAMPLE_WIDTH * 8
+
+    def RunDetection(self, data):
+        v = value(data)
+        if v == 0:
+            return -2
+        return 1 if v == KEYWORD_END else 0
+
+
+class FakeStream(object):
+    """代替 ASRStream，记录送进来的帧"""
+
+    def __init__(self):
+        self.frames = []
+
+    def feed(self, data):
+        self.frames.append(value(data))
+
+    def cancel(self):
+        pass
+
+
+@unittest.skipIf(snowboydecoder is None, "需要 snowboy")
+class PrerollTest(unittest.TestCase):
+    def setUp(self):
+        self.capture = AudioCapture.AudioCapture(buffer_seconds=5)
+        self.previous = AudioCapture.set_capture(self.capture)
+        self.source = AudioCapture.ReplaySource(speed=20)
+        self.files = []
+
+    def tearDown(self):
+        self.capture.close()
+        AudioCapture.set_capture(self.previous)
+        for fp in self.files:
+            os.remove(fp)
+
+    def start_replay(self, consumer):
+        """等 consumer 订阅了采集服务再开始回放"""
+        while not hasattr(consumer, "mic"):
+            time.sleep(0.01)
+        self.capture.start(self.source)
+
+    def listen(self, echo, before, after, mark=True, preroll_ms=400):
+        """
+        机器人说完（echo）之后用户开口，开始录音时已经说了 before，
+        之后的 after 在录音过程中回放
+
+        :returns: 送进 ASR 的帧
+        """
+        listener = object.__new__(snowboydecoder.ActiveListener)
+        listener.detector = FakeDetector()
+        listener.frame_bytes = AudioCapture.FRAME_BYTES
+        self.capture.write(echo)
+        since = self.capture.position if mark else None
+        self.capture.write(before)
+        done = self.source.play(after)
+        stream = FakeStream()
+        threading.Thread(target=self.start_replay, args=(listener,)).start()
+        fp = listener.listen(
+            interrupt_check=done.is_set,
+            sleep_time=0.05,
+            asr_stream=stream,
+            endpointer=VAD.Endpointer(
+                VAD.SnowboyVAD(), hangover_ms=200, min_speech_ms=60
+            ),
+            preroll_ms=preroll_ms,
+            since=since,
+        )
+        self.assertIsNotNone(fp)
+        self.files.append(fp)
+        return stream.frames
+
+    def test_active_listen_skips_echo(self):
+        # 机器人的声音刚结束用户就开口了，开始录音时已经说了 3 帧
+        fed = self.listen(frame(ECHO) * 8, speech(0, 3), speech(3, 5) + silence(20))
+        self.assertNotIn(ECHO, fed)
+        self.assertEqual([SPEECH + i for i in range(8)], fed[:8])
+
+    def test_active_listen_without_mark_has_no_preroll(self):
+        fed = self.listen(
+            frame(ECHO) * 8, speech(0, 3), speech(3, 5) + silence(20), mark=False
+        )
+        self.assertNotIn(ECHO, fed)
+        self.assertEqual(SPEECH + 3, fed[0])
+
+    def test_hotword_skips_keyword(self):
+        detector = object.__new__(snowboydecoder.HotwordDetector)
+        detector.detector = FakeDetector()
+        detector.num_hotwords = 1
+        detector.frame_bytes = AudioCapture.FRAME_BYTES
+        stream = FakeStream()
+        recorded = threading.Event()
+
+        def onRecorded(fp, asr_stream=None):
+            self.files.append(fp)
+            self.assertIs(stream, asr_stream)
+            recorded.set()
+
+        # 紧接着唤醒词说话，检测到唤醒词时提示音还在播放
+        self.source.play(
+            frame(KEYWORD) * 10 + frame(KEYWORD_END) + speech(0, 8) + silence(30)
+        )
+        thread = threading.Thread(
+            target=detector.start,
+            kwargs={
+                "detected_callback": lambda: time.sleep(0.05),
+                "interrupt_check": recorded.is_set,
+                "sleep_time": 0.05,
+                "audio_recorder_callback": onRecorded,
+                "silent_count_threshold": 2,
+                "stream_callback": lambda: stream,
+            },
+        )
+        thread.start()
+        self.start_replay(detector)
+        self.assertTrue(recorded.wait(10))
+        thread.join(5)
+        self.assertNotIn(KEYWORD, stream.frames)
+        self.assertNotIn(KEYWORD_END, stream.frames)
+        self.assertEqual([SPEECH + i for i in range(8)], stream.frames[:8])
+
+
+if __name__ == "__main__":
+    unittest.main()
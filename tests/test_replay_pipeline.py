@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+回放测试工具：bench/pipeline.py 的回放输入加上 bench/stubs.py 的桩 ASR，
+把一小段录音从采集服务一直送到识别结果
+"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+import wave
+
+from robot import AudioCapture, AudioEngine, VAD
+from tests.test_preroll import (
+    SPEECH,
+    FakeDetector,
+    silence,
+    snowboydecoder,
+    speech,
+    value,
+)
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench")
+)
+import pipeline  # noqa: E402
+import stubs  # noqa: E402
+
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.capture = AudioCapture.AudioCapture(buffer_seconds=5)
+        self.previous = AudioCapture.set_capture(self.capture)
+
+    def tearDown(self):
+        self.capture.close()
+        AudioCapture.set_capture(self.previous)
+
+    def test_clip_reaches_subscriber(self):
+        source = AudioCapture.ReplaySource(speed=20)
+        clip = speech(0, 3) + b"\1\0" * 100  # 最后一帧不满，用静音补齐
+        done = source.play(clip)
+        mic = self.capture.subscribe()
+        self.capture.start(source)
+        self.assertTrue(done.wait(5))
+        data = mic.read(4 * AudioCapture.FRAME_BYTES, timeout=5)
+        self.assertEqual(clip, data[: len(clip)])
+        self.assertEqual(b"\0" * (len(data) - len(clip)), data[len(clip) :])
+        self.assertTrue(source.idle())
+
+    def test_load_script(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with wave.open(os.path.join(directory, "001.wav"), "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(AudioCapture.RATE)
+                w.writeframes(speech(0, 2))
+            with open(os.path.join(directory, "script.csv"), "w", encoding="utf-8") as f:
+                f.write("# 录音,识别结果\n001.wav,今天天气怎么样\n")
+            script = pipeline.load_script(directory)
+        self.assertEqual([("001.wav", speech(0, 2), "今天天气怎么样")], script)
+
+
+@unittest.skipIf(snowboydecoder is None, "需要 snowboy")
+class ReplayPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.previous_capture = AudioCapture._audio_capture
+        self.previous_engine = AudioEngine.set_engine(None)
+        self.source, self.listening = pipeline.start_audio(speed=20)
+        self.files = []
+
+    def tearDown(self):
+        AudioCapture.set_capture(self.previous_capture).close()
+        AudioEngine.set_engine(self.previous_engine).close()
+        for fp in self.files:
+            os.remove(fp)
+
+    def test_clip_is_recognized(self):
+        asr = stubs.StubASR(latency=0, stream_latency=0)
+        asr.expect("今天天气怎么样")
+        asr_stream = asr.stream()
+        listener = object.__new__(snowboydecoder.ActiveListener)
+        listener.detector = FakeDetector()
+        listener.frame_bytes = AudioCapture.FRAME_BYTES
+        result = {}
+
+        def listen():
+            result["fp"] = listener.listen(
+                sleep_time=0.05,
+                asr_stream=asr_stream,
+                endpointer=VAD.Endpointer(
+                    VAD.SnowboyVAD(), hangover_ms=200, min_speech_ms=60
+                ),
+            )
+
+        thread = threading.Thread(target=listen)
+        thread.start()
+        self.assertTrue(self.listening.wait(5))
+        self.source.play(silence(2) + speech(0, 8) + silence(20))
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.files.append(result["fp"])
+        self.assertEqual("今天天气怎么样", asr_stream.finish())
+        with wave.open(result["fp"], "rb") as w:
+            pcm = w.readframes(w.getnframes())
+        frames = [
+            value(pcm[i : i + AudioCapture.FRAME_BYTES])
+            for i in range(0, len(pcm), AudioCapture.FRAME_BYTES)
+        ]
+        self.assertEqual([SPEECH + i for i in range(8)], [v for v in frames if v])
+
+
+if __name__ == "__main__":
+    unittest.main()
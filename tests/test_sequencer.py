@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+import unittest
+
+from robot.Sequencer import OrderedSequencer
+
+
+class OrderedSequencerTest(unittest.TestCase):
+    def setUp(self):
+        self.delivered = []
+        self.sequencer = OrderedSequencer(
+            lambda index, item: self.delivered.append((index, item))
+        )
+
+    def test_reorders(self):
+        self.sequencer.put(2, "c")
+        self.sequencer.put(1, "b")
+        self.assertEqual([], self.delivered)
+        self.sequencer.put(0, "a")
+        self.assertEqual([(0, "a"), (1, "b"), (2, "c")], self.delivered)
+
+    def test_none_only_takes_the_slot(self):
+        self.sequencer.put(1, "b")
+        self.sequencer.put(0, None)
+        self.assertEqual([(1, "b")], self.delivered)
+        self.sequencer.put(2, "c")
+        self.assertEqual([(1, "b"), (2, "c")], self.delivered)
+
+    def test_duplicate_is_ignored(self):
+        self.sequencer.put(1, "b")
+        self.sequencer.put(1, "x")
+        self.sequencer.put(0, "a")
+        self.sequencer.put(0, "y")
+        self.assertEqual([(0, "a"), (1, "b")], self.delivered)
+
+    def test_sink_error_does_not_stall(self):
+        def sink(index, item):
+            if index == 0:
+                raise RuntimeError("boom")
+            self.delivered.append((index, item))
+
+        sequencer = OrderedSequencer(sink)
+        sequencer.put(1, "b")
+        sequencer.put(0, "a")
+        self.assertEqual([(1, "b")], self.delivered)
+        sequencer.put(2, "c")
+        self.assertEqual([(1, "b"), (2, "c")], self.delivered)
+
+    def test_reset(self):
+        self.sequencer.put(0, "a")
+        self.sequencer.put(2, "c")
+        self.sequencer.reset()
+        self.sequencer.put(0, "x")
+        self.sequencer.put(1, "y")
+        self.assertEqual([(0, "a"), (0, "x"), (1, "y")], self.delivered)
+
+    def test_sink_runs_outside_the_lock(self):
+        entered, release, done = threading.Event(), threading.Event(), threading.Event()
+
+        def sink(index, item):
+            if index == 0:
+                entered.set()
+                release.wait(5)
+            self.delivered.append((index, item))
+            index == 1 and done.set()
+
+        sequencer = OrderedSequencer(sink)
+        deliverer = threading.Thread(target=sequencer.put, args=(0, "a"))
+        deliverer.start()
+        self.assertTrue(entered.wait(5))
+        # sink 阻塞时，其他线程提交不会被卡住，分段由正在交付的线程交给 sink
+        putter = threading.Thread(target=sequencer.put, args=(1, "b"))
+        putter.start()
+        putter.join(1)
+        self.assertFalse(putter.is_alive())
+        self.assertEqual([], self.delivered)
+        release.set()
+        self.assertTrue(done.wait(5))
+        deliverer.join(5)
+        self.assertEqual([(0, "a"), (1, "b")], self.delivered)
+
+    def test_concurrent_puts_deliver_in_order(self):
+        indexes = list(range(200))
+        random.shuffle(indexes)
+        threads = [
+            threading.Thread(target=self.sequencer.put, args=(i, str(i))) for i in indexes
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual([(i, str(i)) for i in range(200)], self.delivered)
+
+
+if __name__ == "__main__":
+    unittest.main()
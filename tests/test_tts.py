@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from robot import TTS
+
+
+class MixedCaseTTS(TTS.AbstractTTS):
+    SLUG = "Mixed-Case-TTS"
+
+    def __init__(self, voice=None):
+        self.voice = voice
+
+    def get_speech(self, phrase):
+        return None
+
+
+class GetEngineByVoiceTest(unittest.TestCase):
+    def test_slug_is_case_insensitive(self):
+        for slug in ("Mixed-Case-TTS", "mixed-case-tts", "MIXED-CASE-TTS"):
+            engine = TTS.get_engine_by_voice(
+                {"engine": slug, "voice": "a", "description": "忽略"}
+            )
+            self.assertIsInstance(engine, MixedCaseTTS)
+            self.assertEqual("a", engine.voice)
+
+    def test_vits_character_uses_engine_config(self):
+        # CharacterVoice 里的 VITS 示例只写了 server_url 和 speaker_id
+        engine = TTS.get_engine_by_voice(
+            {"engine": "vits", "server_url": "http://127.0.0.1:7860", "speaker_id": 3}
+        )
+        self.assertIsInstance(engine, TTS.VITS)
+        self.assertEqual(("http://127.0.0.1:7860", 3), (engine.server_url, engine.speaker_id))
+        defaults = TTS.VITS.get_config()
+        self.assertEqual(defaults["length"], engine.length)
+        self.assertEqual(defaults["timeout"], engine.timeout)
+
+    def test_gpt_sovits_character_uses_engine_config(self):
+        engine = TTS.get_engine_by_voice(
+            {"engine": "gpt-sovits", "prompt_lang": "en", "description": "忽略"}
+        )
+        self.assertIsInstance(engine, TTS.GPTSoVITS)
+        self.assertEqual("en", engine.prompt_lang)
+        defaults = TTS.GPTSoVITS.get_config()
+        self.assertEqual(defaults["server_url"].rstrip("/"), engine.server_url)
+        self.assertEqual(defaults["ref_audio_path"], engine.ref_audio_path)
+
+    def test_unknown_slug(self):
+        with self.assertRaises(ValueError):
+            TTS.get_engine_by_voice({"engine": "no-such-tts"})
+        with self.assertRaises(ValueError):
+            TTS.get_engine_by_voice({})
+
+
+if __name__ == "__main__":
+    unittest.main()
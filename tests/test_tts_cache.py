@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from robot.TTSCache import TTSCache, make_key
+
+
+class FakeTTS(object):
+    SLUG = "fake-tts"
+
+    def __init__(self, voice):
+        self.voice = voice
+
+
+class TTSCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def voice(self, size=10):
+        fd, path = tempfile.mkstemp(suffix=".wav", dir=self.tmp.name)
+        os.write(fd, b"\0" * size)
+        os.close(fd)
+        return path
+
+    def test_hit_and_miss(self):
+        cache = TTSCache(self.path)
+        self.assertIsNone(cache.get("你好"))
+        voice = self.voice()
+        target = cache.put(voice, "你好")
+        self.assertFalse(os.path.exists(voice))
+        self.assertEqual(target, cache.get("你好"))
+        stats = cache.stats()
+        self.assertEqual((1, 1, 1), (stats["hits"], stats["misses"], stats["entries"]))
+        self.assertEqual(0.5, stats["hit_ratio"])
+
+    def test_copy(self):
+        cache = TTSCache(self.path)
+        voice = self.voice()
+        cache.put(voice, "你好", move=False)
+        self.assertTrue(os.path.exists(voice))
+
+    def test_key_includes_engine_identity(self):
+        cache = TTSCache(self.path)
+        cache.put(self.voice(), "你好", FakeTTS("a"))
+        self.assertIsNotNone(cache.get("你好", FakeTTS("a")))
+        self.assertIsNone(cache.get("你好", FakeTTS("b")))
+        self.assertNotEqual(make_key("你好"), make_key("你好", FakeTTS("a")))
+
+    def test_lru_eviction_by_entries(self):
+        cache = TTSCache(self.path, max_entries=2)
+        first = cache.put(self.voice(), "一")
+        cache.put(self.voice(), "二")
+        cache.get("一")  # “一”变成最近使用
+        cache.put(self.voice(), "三")
+        self.assertIsNotNone(cache.get("一"))
+        self.assertIsNone(cache.get("二"))
+        self.assertTrue(os.path.exists(first))
+        self.assertEqual(1, cache.stats()["evictions"])
+
+    def test_eviction_by_bytes(self):
+        cache = TTSCache(self.path, max_entries=0, max_bytes=25)
+        cache.put(self.voice(10), "一")
+        second = cache.put(self.voice(10), "二")
+        cache.put(self.voice(10), "三")
+        self.assertIsNone(cache.get("一"))
+        self.assertEqual(second, cache.get("二"))
+        self.assertEqual(20, cache.stats()["bytes"])
+
+    def test_replace_keeps_byte_count(self):
+        cache = TTSCache(self.path)
+        cache.put(self.voice(10), "一")
+        cache.put(self.voice(30), "一")
+        self.assertEqual((1, 30), (cache.stats()["entries"], cache.stats()["bytes"]))
+
+    def test_missing_file_is_a_miss(self):
+        cache = TTSCache(self.path)
+        target = cache.put(self.voice(10), "一")
+        os.remove(target)
+        self.assertIsNone(cache.get("一"))
+        stats = cache.stats()
+        self.assertEqual((0, 1, 0, 0), (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]))
+
+    def test_reload_index(self):
+        cache = TTSCache(self.path)
+        target = cache.put(self.voice(), "一")
+        cache.put(self.voice(), "二")
+        os.utime(target, (0, 0))
+        # 重建索引时按修改时间淘汰最旧的
+        cache = TTSCache(self.path, max_entries=1)
+        self.assertEqual(1, cache.stats()["entries"])
+        self.assertIsNone(cache.get("一"))
+        self.assertFalse(os.path.exists(target))
+        self.assertIsNotNone(cache.get("二"))
+
+    def test_clear(self):
+        cache = TTSCache(self.path)
+        target = cache.put(self.voice(), "一")
+        cache.clear()
+        self.assertFalse(os.path.exists(target))
+        self.assertIsNone(cache.get("一"))
+
+
+if __name__ == "__main__":
+    unittest.main()
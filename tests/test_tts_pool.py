@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+
+from robot.TTSPool import TTSEnginePool
+
+
+class BlockingFactory(object):
+    """
+    记录构建次数的引擎工厂
+
+    :param blocking: 为 True 时每次构建都阻塞到 release 被设置
+    """
+
+    def __init__(self, blocking=False, fail=False):
+        self.release = threading.Event()
+        blocking or self.release.set()
+        self.fail = fail
+        self.calls = []
+        self.started = threading.Semaphore(0)
+
+    def __call__(self, voice_config):
+        self.calls.append(voice_config["engine"])
+        self.started.release()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("build failed")
+        return object()
+
+    def wait_started(self, n=1):
+        """等待 n 次构建开始"""
+        return all(self.started.acquire(timeout=5) for _ in range(n))
+
+
+class TTSEnginePoolTest(unittest.TestCase):
+    def test_reuse_and_rebuild_on_change(self):
+        factory = BlockingFactory()
+        pool = TTSEnginePool(factory)
+        engine = pool.get("a", {"engine": "x"})
+        self.assertIs(engine, pool.get("a", {"engine": "x"}))
+        self.assertIsNot(engine, pool.get("a", {"engine": "y"}))
+        stats = pool.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(2, stats["total_constructions"])
+
+    def test_concurrent_same_key_builds_once(self):
+        factory = BlockingFactory(blocking=True)
+        pool = TTSEnginePool(factory)
+        results = []
+        get = lambda: results.append(pool.get("a", {"engine": "x"}))
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for t in threads:
+            t.start()
+        self.assertTrue(factory.wait_started())
+        factory.release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(["x"], factory.calls)
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_different_keys_do_not_block(self):
+        factory = BlockingFactory(blocking=True)
+        pool = TTSEnginePool(factory)
+        threads = [
+            threading.Thread(target=pool.get, args=(key, {"engine": engine}))
+            for key, engine in (("a", "x"), ("b", "y"))
+        ]
+        for t in threads:
+            t.start()
+        # 两个构建同时在进行，没有互相等待
+        self.assertTrue(factory.wait_started(2))
+        factory.release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(["x", "y"], sorted(factory.calls))
+
+    def test_hit_while_other_key_builds(self):
+        factory = BlockingFactory()
+        pool = TTSEnginePool(factory)
+        pool.get("a", {"engine": "x"})
+        self.assertTrue(factory.wait_started())
+        factory.release.clear()
+        builder = threading.Thread(target=pool.get, args=("b", {"engine": "y"}))
+        builder.start()
+        self.assertTrue(factory.wait_started())
+        hit = threading.Thread(target=pool.get, args=("a", {"engine": "x"}))
+        hit.start()
+        hit.join(5)
+        # 命中在构建仍然阻塞时就已返回
+        self.assertFalse(hit.is_alive())
+        self.assertTrue(builder.is_alive())
+        factory.release.set()
+        builder.join(5)
+        self.assertEqual(1, pool.stats()["hits"])
+
+    def test_failure_is_counted_and_retried(self):
+        factory = BlockingFactory(fail=True)
+        pool = TTSEnginePool(factory)
+        with self.assertRaises(RuntimeError):
+            pool.get("a", {"engine": "x"})
+        self.assertEqual({"a": 1}, pool.stats()["failures"])
+        factory.fail = False
+        self.assertIsNotNone(pool.get("a", {"engine": "x"}))
+        self.assertEqual(2, len(factory.calls))
+
+    def test_discard_rebuilds_on_next_get(self):
+        factory = BlockingFactory()
+        pool = TTSEnginePool(factory)
+        broken = pool.get("a", {"engine": "x"})
+        other = pool.get("b", {"engine": "y"})
+        self.assertEqual(["a"], pool.discard(broken))
+        self.assertEqual([], pool.discard(broken))
+        fresh = pool.get("a", {"engine": "x"})
+        self.assertIsNot(broken, fresh)
+        self.assertIs(other, pool.get("b", {"engine": "y"}))
+        self.assertEqual({"a": 1}, pool.stats()["evictions"])
+
+
+if __name__ == "__main__":
+    unittest.main()
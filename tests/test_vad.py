@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import numpy as np
+
+from robot import VAD, constants
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+FRAME_BYTES = 512 * VAD.SAMPLE_WIDTH  # 32ms
+
+
+class MarkedVAD(VAD.AbstractVAD):
+    """按帧的第一个字节判断：非零即为语音"""
+
+    def __init__(self):
+        self.resets = 0
+
+    def reset(self):
+        self.resets += 1
+
+    def is_speech(self, data, status=None):
+        return data[0] != 0
+
+
+def frames(pattern):
+    """'.' 为静音帧，'x' 为语音帧"""
+    return [(b"\1" if c == "x" else b"\0") * FRAME_BYTES for c in pattern]
+
+
+class SpeechOnsetTest(unittest.TestCase):
+    def onset(self, pattern, **kwargs):
+        return VAD.speech_onset(frames(pattern), MarkedVAD(), **kwargs)
+
+    def test_empty(self):
+        self.assertEqual(0, VAD.speech_onset([], MarkedVAD()))
+
+    def test_no_recent_speech(self):
+        self.assertEqual(10, self.onset("xxx......."))
+
+    def test_keeps_one_frame_before_onset(self):
+        self.assertEqual(5, self.onset("......xxxx"))
+
+    def test_bridges_short_pauses(self):
+        # 200ms 以内（6 帧以内）的停顿不算断开
+        self.assertEqual(1, self.onset("..xxx.....xx"))
+        self.assertEqual(1, self.onset("..xx...xx.x"))
+
+    def test_long_pause_splits(self):
+        self.assertEqual(8, self.onset("xxx......xx"))
+
+    def test_min_gap(self):
+        self.assertEqual(4, self.onset("xxx..xx", min_gap_ms=64))
+        self.assertEqual(0, self.onset("xxx..xx", min_gap_ms=100))
+
+    def test_statuses_passed_to_vad(self):
+        vad = VAD.SnowboyVAD()
+        onset = VAD.speech_onset(frames("...."), vad, statuses=[-2, -2, 0, 0])
+        self.assertEqual(1, onset)
+
+    def test_resets_vad(self):
+        vad = MarkedVAD()
+        VAD.speech_onset(frames("..x"), vad)
+        self.assertEqual(2, vad.resets)
+
+
+class AbstractVADTest(unittest.TestCase):
+    def test_missing_method_fails_on_instantiation(self):
+        class Incomplete(VAD.FramedVAD):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete(512)
+
+
+class RecordingModel(object):
+    """记录每次推理的输入，状态为已推理的帧数"""
+
+    def __init__(self, probs):
+        self.probs = list(probs)
+        self.calls = []
+
+    def initial_state(self, batch=1):
+        return 0
+
+    def run(self, frames, state):
+        self.calls.append((frames.shape, state))
+        return np.array([self.probs.pop(0)]), state + 1
+
+
+class SileroVADTest(unittest.TestCase):
+    def test_pending_frames_run_in_order(self):
+        model = RecordingModel([0.1, 0.9, 0.2])
+        vad = VAD.SileroVAD(model)
+        self.assertFalse(vad.is_speech(b"\0" * (FRAME_BYTES // 2)))
+        self.assertEqual([], model.calls)
+        # 积压的三帧依次推理，状态逐帧传递
+        self.assertTrue(vad.is_speech(b"\0" * (FRAME_BYTES * 5 // 2)))
+        self.assertEqual([((1, 512), 0), ((1, 512), 1), ((1, 512), 2)], model.calls)
+        vad.reset()
+        self.assertEqual(0, vad.state)
+
+
+@unittest.skipIf(onnxruntime is None, "需要 onnxruntime")
+class SileroModelTest(unittest.TestCase):
+    def setUp(self):
+        path = constants.getData("silero_vad.onnx")
+        if not os.path.exists(path):
+            self.skipTest("没有 silero_vad.onnx")
+        self.model = VAD.SileroModel(path)
+
+    def test_batch_matches_separate_streams(self):
+        rng = np.random.default_rng(0)
+        audio = rng.uniform(-0.3, 0.3, (3, 4, 512)).astype(np.float32)
+        batch_state = self.model.initial_state(3)
+        batched = []
+        for i in range(4):
+            probs, batch_state = self.model.run(audio[:, i], batch_state)
+            batched.append(probs)
+        for stream in range(3):
+            state = self.model.initial_state()
+            for i in range(4):
+                prob, state = self.model.run(audio[stream : stream + 1, i], state)
+                self.assertAlmostEqual(batched[i][stream], prob[0], places=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
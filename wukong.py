@@ -10,6 +10,7 @@ import urllib3
 from robot.Updater import Updater
 from robot.Conversation import Conversation
 from robot.LifeCycleHandler import LifeCycleHandler
+from robot.sdk.History import History
 
 from robot import config, utils, constants, logging, detector
 
@@ -60,7 +61,7 @@ class Wukong(object):
         utils.clean()
         self.lifeCycleHandler.onKilled()
 
-    def _detected_callback(self, is_snowboy=True):
+    def _detected_callback(self, is_snowboy=True, detected_at=None):
         def _start_record():
             logger.info("开始录音")
             self.conversation.isRecording = True
@@ -75,7 +76,7 @@ class Wukong(object):
         if is_snowboy:
             self.conversation.interrupt()
             utils.setRecordable(False)
-        self.lifeCycleHandler.onWakeup()
+        self.lifeCycleHandler.onWakeup(detected_at=detected_at)
         if is_snowboy:
             _start_record()
 
@@ -105,6 +106,8 @@ class Wukong(object):
       upload [thredNum]        - 手动上传 QA 集语料，重建 solr 索引。
                                  threadNum 表示上传时开启的线程数（可选。默认值为 10）
       profiling                - 运行过程中打印耗时数据
+      warmup                   - 为所有角色语音预先合成插件的固定话术，写入 TTS 缓存
+      bench [--repeat 10]      - 使用本地桩引擎测试对话链路延迟，结果保存为 JSON
     如需更多帮助，请访问：https://wukong.hahack.com/#/run
 ====================================================================================="""
         )
@@ -151,6 +154,22 @@ class Wukong(object):
         except Exception as e:
             logger.error(f"上传失败：{e}", stack_info=True)
 
+    def warmup(self):
+        """
+        预热 TTS 缓存
+        """
+        from robot import CacheWarmup
+
+        return CacheWarmup.warmup()
+
+    def bench(self, **options):
+        """
+        使用本地桩引擎运行对话链路延迟基准测试
+        """
+        from bench import latency
+
+        latency.run(**options)
+
     def restart(self):
         """
         重启 wukong-robot
@@ -160,6 +179,8 @@ class Wukong(object):
             self.detector.terminate()
         except AttributeError:
             pass
+        # execl 不会执行 atexit，先把聊天记录写完
+        History().close()
         python = sys.executable
         os.execl(python, python, *sys.argv)
 